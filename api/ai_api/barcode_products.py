@@ -0,0 +1,104 @@
+"""
+Поиск упакованных продуктов по штрихкоду в таблице product_barcode
+(Open Food Facts, импорт - database/off_import.py).
+
+Запрос к БД - по первичному ключу, найденные и ненайденные штрихкоды
+держатся в LRU в памяти процесса: повторные сканирования популярных
+продуктов не доходят до БД.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from utils.barcode import format_barcode
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MAX_ITEMS = int(os.getenv('BARCODE_CACHE_SIZE', 20000))
+# Импорт нового дампа попадает в кэш не позже чем через FOUND_TTL
+FOUND_TTL = int(os.getenv('BARCODE_CACHE_TTL', 24 * 3600))
+# Ненайденный штрихкод может появиться после импорта, поэтому храним недолго
+NOT_FOUND_TTL = int(os.getenv('BARCODE_CACHE_NEGATIVE_TTL', 600))
+LOOKUP_TIMEOUT = 5.0
+
+LOOKUP_SQL = """
+    SELECT ean, name, brand, kcal, protein, fat, carbs, fiber, sugar, sodium
+    FROM product_barcode
+    WHERE ean = :ean
+"""
+
+NUTRIENT_FIELDS = ('protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')
+
+
+def _row_to_product(row) -> Dict:
+    mapping = row._mapping
+    product = {
+        'ean': format_barcode(int(mapping['ean'])),
+        'name': mapping['name'],
+        'brand': mapping['brand'],
+        'calories': float(mapping['kcal']),
+    }
+    for field in NUTRIENT_FIELDS:
+        value = mapping[field]
+        product[field] = float(value) if value is not None else None
+    return product
+
+
+class BarcodeProducts:
+    """
+    Продукты по штрихкоду с кэшем в памяти.
+    Значения на 100г в полях calories/protein/... (совместимы с scale_nutrition).
+    """
+
+    def __init__(self, max_items: int = LOCAL_MAX_ITEMS):
+        self.max_items = max_items
+        # ean -> (продукт или None, хранить_до)
+        self._local: "OrderedDict[int, Tuple[Optional[Dict], float]]" = OrderedDict()
+        self._flights = SingleFlight()
+        self.stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'errors': 0}
+
+    def _remember(self, ean: int, product: Optional[Dict]) -> None:
+        ttl = FOUND_TTL if product is not None else NOT_FOUND_TTL
+        self._local[ean] = (product, time.monotonic() + ttl)
+        self._local.move_to_end(ean)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+
+    async def _fetch(self, ean: int) -> Optional[Dict]:
+        from database.init_database import engine
+
+        async with engine.connect() as conn:
+            row = (await conn.execute(text(LOOKUP_SQL), {'ean': ean})).first()
+        product = _row_to_product(row) if row is not None else None
+        self._remember(ean, product)
+        return product
+
+    async def get(self, ean: int) -> Optional[Dict]:
+        """Продукт по штрихкоду (число из normalize_barcode) или None"""
+        entry = self._local.get(ean)
+        if entry is not None:
+            product, keep_until = entry
+            if time.monotonic() < keep_until:
+                self._local.move_to_end(ean)
+                self.stats['hits' if product is not None else 'negative_hits'] += 1
+                return product
+            del self._local[ean]
+
+        # Одновременные сканирования одного штрихкода - один запрос к БД
+        self.stats['misses'] += 1
+        try:
+            return await self._flights.do(ean, lambda: self._fetch(ean), timeout=LOOKUP_TIMEOUT)
+        except Exception as e:
+            # Ошибку БД не кэшируем: следующий запрос попробует снова
+            self.stats['errors'] += 1
+            logger.error(f"Ошибка поиска продукта по штрихкоду {format_barcode(ean)}: {e!r}")
+            return None
+
+
+# Глобальный экземпляр
+barcode_products = BarcodeProducts()
@@ -0,0 +1,263 @@
+"""
+Пищевая ценность составных блюд (борщ, плов, оливье, шаурма...) по рецептам.
+
+Рецепт - доли ингредиентов FoodData Central в весе готового блюда
+(таблица dish_recipe). Значения на 100г для всех блюд считаются разом как
+произведение матрицы долей (блюда x ингредиенты) на матрицу нутриентов
+ингредиентов и хранятся в памяти до следующей пересборки.
+
+Пересборка после обновления справочника: python -m api.ai_api.dish_nutrition
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from api.ai_api.local_nutrition import MACRO_COLUMNS, local_nutrition
+from utils.food_normalizer import normalize_food_name
+
+logger = logging.getLogger(__name__)
+
+# Ингредиент без пищевой ценности (вода, бульон из воды)
+WATER = 'water'
+
+# Исходные рецепты: граммы ингредиентов (английские названия FDC) на одну
+# порцию или кастрюлю готового блюда. Доли считаются нормировкой по сумме.
+DEFAULT_RECIPES: Dict[str, Sequence[Tuple[str, float]]] = {
+    'борщ': (
+        ('beets', 80), ('cabbage', 60), ('potatoes', 60), ('carrots', 30), ('onions', 25),
+        ('beef, ground', 50), ('tomato products, canned, paste', 10), ('oil, sunflower', 6), (WATER, 380),
+    ),
+    'щи': (
+        ('cabbage', 120), ('potatoes', 60), ('carrots', 25), ('onions', 20),
+        ('beef, ground', 50), ('oil, sunflower', 5), (WATER, 420),
+    ),
+    'плов': (
+        ('rice, white, long-grain, regular, raw', 200), ('lamb, ground', 250), ('carrots', 200),
+        ('onions', 100), ('oil, sunflower', 50), (WATER, 300),
+    ),
+    'оливье': (
+        ('potatoes', 200), ('carrots', 60), ('egg, whole, raw', 150), ('pickles', 100),
+        ('peas, green, canned', 100), ('bologna', 150), ('salad dressing, mayonnaise', 120),
+    ),
+    'винегрет': (
+        ('beets', 200), ('potatoes', 150), ('carrots', 100), ('pickles', 100),
+        ('sauerkraut', 100), ('peas, green, canned', 50), ('oil, sunflower', 30),
+    ),
+    'шаурма': (
+        ('bread, pita', 90), ('chicken, broilers or fryers, breast, meat only, cooked, roasted', 120),
+        ('cabbage', 40), ('tomatoes', 40), ('cucumber', 30), ('salad dressing, mayonnaise', 30),
+    ),
+    'солянка': (
+        ('beef, ground', 60), ('frankfurter', 40), ('bologna', 30), ('pickles', 40), ('onions', 20),
+        ('tomato products, canned, paste', 15), ('olives', 10), ('oil, sunflower', 5), (WATER, 380),
+    ),
+    'окрошка': (
+        ('potatoes', 80), ('cucumber', 80), ('egg, whole, raw', 50), ('bologna', 60),
+        ('radishes', 40), ('onions, spring', 10), ('kefir', 300),
+    ),
+    'харчо': (
+        ('beef, ground', 80), ('rice, white, long-grain, regular, raw', 30), ('onions', 30),
+        ('tomato products, canned, paste', 15), ('nuts, walnuts', 10), (WATER, 400),
+    ),
+    'голубцы': (
+        ('cabbage', 150), ('beef, ground', 80), ('rice, white, long-grain, regular, raw', 25),
+        ('onions', 20), ('carrots', 20), ('tomato products, canned, paste', 10), (WATER, 60),
+    ),
+    'гуляш': (
+        ('beef, ground', 250), ('onions', 80), ('tomato products, canned, paste', 20),
+        ('wheat flour, white, all-purpose, enriched', 10), ('oil, sunflower', 15), (WATER, 120),
+    ),
+    'пельмени': (
+        ('wheat flour, white, all-purpose, enriched', 180), ('egg, whole, raw', 25),
+        ('pork, ground', 120), ('beef, ground', 120), ('onions', 40), (WATER, 80),
+    ),
+    'сырники': (
+        ('cheese, cottage', 300), ('egg, whole, raw', 50), ('wheat flour, white, all-purpose, enriched', 50),
+        ('sugar', 25), ('oil, sunflower', 15),
+    ),
+}
+
+
+class DishNutritionEngine:
+    """
+    Значения на 100г для блюд из рецептов: матрица (блюда x нутриенты),
+    посчитанная одним умножением матриц при пересборке.
+    """
+
+    def __init__(self):
+        self.dishes: List[str] = []
+        self.keys: Dict[str, int] = {}
+        self.values = np.empty((0, len(MACRO_COLUMNS)), dtype=np.float32)
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.dishes)
+
+    def build(self, recipes: Dict[str, List[Tuple[Optional[int], float]]], nutrients: Dict[int, np.ndarray]) -> None:
+        """
+        recipes: блюдо -> [(fdc_id или None для воды, доля)];
+        nutrients: fdc_id -> вектор значений на 100г в порядке MACRO_COLUMNS.
+        Ингредиенты без данных учитываются как вода.
+        """
+        dishes = sorted(recipes)
+        ingredient_ids = sorted({fdc_id for parts in recipes.values() for fdc_id, _ in parts if fdc_id in nutrients})
+        columns = {fdc_id: i for i, fdc_id in enumerate(ingredient_ids)}
+
+        fractions = np.zeros((len(dishes), len(ingredient_ids)), dtype=np.float64)
+        for row, dish in enumerate(dishes):
+            parts = recipes[dish]
+            total = sum(fraction for _, fraction in parts) or 1.0
+            for fdc_id, fraction in parts:
+                if fdc_id in columns:
+                    fractions[row, columns[fdc_id]] += fraction / total
+
+        matrix = np.zeros((len(ingredient_ids), len(MACRO_COLUMNS)), dtype=np.float64)
+        for fdc_id, column in columns.items():
+            matrix[column] = nutrients[fdc_id]
+
+        values = (fractions @ matrix).astype(np.float32)
+        keys = {normalize_food_name(dish) or dish: row for row, dish in enumerate(dishes)}
+        # Атомарная замена: читатели видят либо старые, либо новые значения
+        self.dishes, self.keys, self.values = dishes, keys, values
+        self.loaded = True
+
+    def get(self, food_name: str) -> Optional[Dict]:
+        """Значения на 100г для блюда (с точностью до формы слов и порядка), иначе None"""
+        if not food_name or not self.loaded:
+            return None
+        row = self.keys.get(normalize_food_name(food_name))
+        if row is None:
+            return None
+        result = {column: round(float(value), 2) for column, value in zip(MACRO_COLUMNS, self.values[row])}
+        result['dish'] = self.dishes[row]
+        return result
+
+
+# Глобальный экземпляр
+dish_nutrition = DishNutritionEngine()
+
+
+async def resolve_ingredients(names: List[str]) -> List[Optional[int]]:
+    """fdc_id ингредиентов: локальный справочник, а если его нет в процессе - food_macros"""
+    if local_nutrition.loaded:
+        found = [local_nutrition.lookup(name) for name in names]
+    else:
+        from database.food_macros import find_macros_by_names
+        found = await find_macros_by_names(names)
+    return [item['fdc_id'] if item else None for item in found]
+
+
+async def ensure_recipes(conn) -> List[Tuple[int, str, str, Optional[int], float]]:
+    """
+    Строки dish_recipe (id, блюдо, ингредиент, fdc_id, доля). Блюда из
+    DEFAULT_RECIPES, которых ещё нет в таблице, добавляются.
+    """
+    from database.init_database import DishRecipe
+
+    await conn.run_sync(lambda sync_conn: DishRecipe.__table__.create(sync_conn, checkfirst=True))
+    existing = {dish for (dish,) in await conn.execute(text("SELECT DISTINCT dish FROM dish_recipe"))}
+    rows = []
+    for dish, parts in DEFAULT_RECIPES.items():
+        if dish in existing:
+            continue
+        total = sum(grams for _, grams in parts)
+        rows.extend({'dish': dish, 'ingredient': name, 'fraction': grams / total} for name, grams in parts)
+    if rows:
+        await conn.execute(
+            text("INSERT INTO dish_recipe (dish, ingredient, fraction) VALUES (:dish, :ingredient, :fraction)"),
+            rows,
+        )
+    result = await conn.execute(text("SELECT id, dish, ingredient, fdc_id, fraction FROM dish_recipe ORDER BY id"))
+    return [tuple(row) for row in result]
+
+
+async def load_nutrients(fdc_ids: List[int]) -> Dict[int, np.ndarray]:
+    """Векторы значений на 100г для ингредиентов: из матрицы в памяти или из food_macros"""
+    if local_nutrition.loaded:
+        index = np.asarray(local_nutrition.fdc_ids)
+        ids = np.asarray(fdc_ids, dtype=np.int64)
+        if not len(index) or not len(ids):
+            return {}
+        rows = np.minimum(np.searchsorted(index, ids), len(index) - 1)
+        found = index[rows] == ids
+        matrix = np.asarray(local_nutrition.macros[rows[found]], dtype=np.float64)
+        return dict(zip(ids[found].tolist(), matrix))
+
+    from database.food_macros import get_macros_by_fdc_ids
+    macros = await get_macros_by_fdc_ids(fdc_ids)
+    fields = ['kcal' if column == 'calories' else column for column in MACRO_COLUMNS]
+    return {
+        fdc_id: np.array([values.get(field) or 0.0 for field in fields], dtype=np.float64)
+        for fdc_id, values in macros.items()
+    }
+
+
+async def rebuild_dish_nutrition() -> int:
+    """
+    Пересобирает значения блюд. Ингредиенты без fdc_id или с fdc_id,
+    исчезнувшим из справочника после обновления, ищутся заново по названию.
+    """
+    from database.init_database import engine
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        rows = await ensure_recipes(conn)
+        nutrients = await load_nutrients(sorted({fdc_id for _, _, _, fdc_id, _ in rows if fdc_id is not None}))
+
+        stale = [row for row in rows if row[2] != WATER and row[3] not in nutrients]
+        if stale:
+            resolved = await resolve_ingredients([row[2] for row in stale])
+            missing = sorted({row[2] for row, fdc_id in zip(stale, resolved) if fdc_id is None})
+            if missing:
+                logger.warning(f"Ингредиенты рецептов не найдены в справочнике: {missing}")
+            changed = {row[0]: fdc_id for row, fdc_id in zip(stale, resolved) if fdc_id != row[3]}
+            if changed:
+                await conn.execute(
+                    text("UPDATE dish_recipe SET fdc_id = :fdc_id WHERE id = :id"),
+                    [{'id': row_id, 'fdc_id': fdc_id} for row_id, fdc_id in changed.items()],
+                )
+                rows = [
+                    (row_id, dish, ingredient, changed.get(row_id, fdc_id), fraction)
+                    for row_id, dish, ingredient, fdc_id, fraction in rows
+                ]
+                nutrients.update(await load_nutrients([fdc_id for fdc_id in changed.values() if fdc_id is not None]))
+
+    recipes: Dict[str, List[Tuple[Optional[int], float]]] = {}
+    for _, dish, ingredient, fdc_id, fraction in rows:
+        recipes.setdefault(dish, []).append((None if ingredient == WATER else fdc_id, fraction))
+    dish_nutrition.build(recipes, nutrients)
+    logger.info(f"Блюда по рецептам пересчитаны: {len(dish_nutrition):,} за {time.perf_counter() - started:.2f} с")
+    return len(dish_nutrition)
+
+
+async def init_dish_nutrition() -> bool:
+    """Пересборка при старте; ошибки БД не мешают запуску процесса"""
+    try:
+        await rebuild_dish_nutrition()
+    except Exception as e:
+        logger.error(f"Ошибка пересборки блюд по рецептам: {e}")
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    async def main():
+        from database.init_database import engine
+
+        count = await rebuild_dish_nutrition()
+        for dish in dish_nutrition.dishes:
+            per_100g = dish_nutrition.get(dish)
+            print(f"  {dish}: {per_100g['calories']:.0f} ккал, Б {per_100g['protein']:.1f}, "
+                  f"Ж {per_100g['fat']:.1f}, У {per_100g['carbs']:.1f}")
+        await engine.dispose()
+        print(f"✅ Пересчитано блюд: {count}")
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
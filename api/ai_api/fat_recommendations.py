@@ -1,7 +1,8 @@
 import os
 import asyncio
 from typing import Dict, Any, Optional
-from api.ai_api.generate_text import answer_to_text_prompt
+from api.ai_api.llm_router import generate_text
+from api.ai_api.llm_scheduler import PRIORITY_BACKGROUND
 
 async def generate_fat_recommendations(
     fat_percent: float,
@@ -100,7 +101,7 @@ async def generate_fat_recommendations(
 """
 
         # Получаем ответ от Mistral
-        response_text = await answer_to_text_prompt(prompt, 0)
+        response_text = await generate_text(prompt, task='recommendations', priority=PRIORITY_BACKGROUND)
         response = {"text": response_text}
         
         if not response or 'error' in response:
@@ -186,7 +187,7 @@ async def generate_quick_tip(fat_percent: float, gender: str) -> str:
 - С эмодзи
 - Мотивирующий"""
         
-        response_text = await answer_to_text_prompt(prompt, 0)
+        response_text = await generate_text(prompt, task='recommendations', priority=PRIORITY_BACKGROUND)
         response = {"text": response_text}
         
         if response and 'text' in response:
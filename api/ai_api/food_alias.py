@@ -0,0 +1,407 @@
+"""
+Выученные соответствия "название продукта -> fdc_id" (таблица food_alias).
+
+Каждое успешно определённое название запоминается с уверенностью, зависящей
+от источника, и при следующем запросе в любом написании (ключ - морфологическая
+нормализация, как в кэше питания) продукт берётся из FoodData Central без LLM.
+Соответствия держатся в памяти процесса, новые записи и счётчики обращений
+сбрасываются в БД пачками. Неуверенные соответствия проверяет администратор.
+
+Сжатие вручную: python -m api.ai_api.food_alias
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from api.ai_api.nutrition_cache import normalize_food_key
+
+logger = logging.getLogger(__name__)
+
+# Уверенность соответствия в зависимости от того, как оно получено
+SOURCE_CONFIDENCE = {
+    'admin': 1.0,
+    'local': 0.9,     # точное название в локальном справочнике FDC
+    'database': 0.75, # совпадение по началу описания в food_macros
+    'llm': 0.5,       # перевод от LLM, найденный в справочнике
+}
+# Соответствия ниже этой уверенности не используются для ответа
+MIN_USE_CONFIDENCE = 0.5
+# Соответствия ниже этой уверенности попадают в список на проверку
+REVIEW_CONFIDENCE = 0.8
+
+FLUSH_INTERVAL = 60
+RELOAD_INTERVAL = 600
+COMPACT_INTERVAL = 24 * 3600
+# При сжатии удаляем неуверенные соответствия, которыми давно не пользовались
+STALE_DAYS = 90
+STALE_MAX_HITS = 2
+# Сжатие выполняет только один процесс (воркер API или бот)
+COMPACT_LOCK_ID = 715_001
+
+UPSERT_SQL = """
+    INSERT INTO food_alias AS a
+        (normalized_text, sample_text, fdc_id, confidence, hits, source, created_at, last_seen_at)
+    SELECT u.normalized_text, u.sample_text, u.fdc_id, u.confidence, u.hits, u.source, now(), now()
+    FROM unnest(
+        CAST(:keys AS text[]), CAST(:samples AS text[]), CAST(:fdc_ids AS bigint[]),
+        CAST(:confidences AS float8[]), CAST(:hits AS int[]), CAST(:sources AS text[])
+    ) AS u(normalized_text, sample_text, fdc_id, confidence, hits, source)
+    ON CONFLICT (normalized_text) DO UPDATE
+    SET fdc_id = CASE WHEN EXCLUDED.confidence >= a.confidence THEN EXCLUDED.fdc_id ELSE a.fdc_id END,
+        source = CASE WHEN EXCLUDED.confidence >= a.confidence THEN EXCLUDED.source ELSE a.source END,
+        confidence = GREATEST(a.confidence, EXCLUDED.confidence),
+        hits = a.hits + EXCLUDED.hits,
+        last_seen_at = now()
+"""
+
+ADD_HITS_SQL = """
+    UPDATE food_alias AS a
+    SET hits = a.hits + h.hits, last_seen_at = now()
+    FROM unnest(CAST(:keys AS text[]), CAST(:hits AS int[])) AS h(normalized_text, hits)
+    WHERE a.normalized_text = h.normalized_text
+"""
+
+REVIEW_SQL = """
+    SELECT a.normalized_text, a.sample_text, a.fdc_id, f.description, a.confidence,
+           a.hits, a.source, a.last_seen_at
+    FROM food_alias a
+    LEFT JOIN food f ON f.fdc_id = a.fdc_id
+    WHERE a.confidence < :max_confidence
+    ORDER BY a.hits DESC, a.normalized_text
+    LIMIT :limit OFFSET :offset
+"""
+
+
+class FoodAliasStore:
+    """
+    Соответствия названий и fdc_id: словарь в памяти процесса плюс таблица
+    food_alias. Чтение - только из памяти, запись - отложенная, пачками.
+    """
+
+    def __init__(self):
+        # normalized_text -> (fdc_id, confidence)
+        self._aliases: Dict[str, Tuple[int, float]] = {}
+        # Ещё не записанные в БД соответствия и счётчики обращений
+        self._pending: Dict[str, Tuple[str, int, float, str]] = {}
+        self._pending_hits: Dict[str, int] = {}
+        self.loaded = False
+        self.stats = {'hits': 0, 'misses': 0, 'learned': 0}
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def lookup(self, food_name: str, count_hit: bool = True) -> Optional[int]:
+        """
+        fdc_id для названия, если соответствие достаточно уверенное.
+        count_hit=False - для пакетных задач, чтобы не искажать счётчик обращений.
+        """
+        if not food_name:
+            return None
+        key = normalize_food_key(food_name)
+        entry = self._aliases.get(key)
+        if entry is None or entry[1] < MIN_USE_CONFIDENCE:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        if count_hit:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+        return entry[0]
+
+    def remember(self, food_name: str, fdc_id: Optional[int], source: str, confidence: Optional[float] = None) -> None:
+        """
+        Запоминает соответствие после успешного определения продукта.
+        Менее уверенное соответствие не вытесняет уже известное.
+        """
+        if not food_name or fdc_id is None:
+            return
+        key = normalize_food_key(food_name)
+        if not key:
+            return
+        confidence = SOURCE_CONFIDENCE.get(source, MIN_USE_CONFIDENCE) if confidence is None else confidence
+        current = self._aliases.get(key)
+        if current is not None and (current[1] > confidence or current == (fdc_id, confidence)):
+            return
+        self._aliases[key] = (int(fdc_id), confidence)
+        self._pending[key] = (food_name, int(fdc_id), confidence, source)
+        self.stats['learned'] += 1
+
+    async def load(self) -> bool:
+        """Загружает все соответствия из БД (таблица создаётся при необходимости)"""
+        from database.init_database import FoodAlias, engine
+
+        started = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda sync_conn: FoodAlias.__table__.create(sync_conn, checkfirst=True))
+                result = await conn.execute(text("SELECT normalized_text, fdc_id, confidence FROM food_alias"))
+                aliases = {key: (int(fdc_id), float(confidence)) for key, fdc_id, confidence in result}
+        except Exception as e:
+            logger.error(f"Ошибка загрузки соответствий названий: {e}")
+            return False
+
+        # Ещё не записанные соответствия этого процесса не теряем
+        for key, (_, fdc_id, confidence, _) in self._pending.items():
+            if key not in aliases or aliases[key][1] <= confidence:
+                aliases[key] = (fdc_id, confidence)
+        self._aliases = aliases
+        self.loaded = True
+        logger.info(f"Соответствия названий загружены: {len(aliases):,} за {time.perf_counter() - started:.2f} с")
+        return True
+
+    async def flush(self) -> int:
+        """Записывает накопленные соответствия и счётчики обращений пачкой"""
+        from database.init_database import engine
+
+        pending, hits = self._pending, self._pending_hits
+        if not pending and not hits:
+            return 0
+        self._pending, self._pending_hits = {}, {}
+
+        keys = list(pending)
+        hit_keys = [key for key in hits if key not in pending]
+        try:
+            async with engine.begin() as conn:
+                if keys:
+                    await conn.execute(text(UPSERT_SQL), {
+                        'keys': keys,
+                        'samples': [pending[key][0] for key in keys],
+                        'fdc_ids': [pending[key][1] for key in keys],
+                        'confidences': [pending[key][2] for key in keys],
+                        'hits': [hits.get(key, 0) for key in keys],
+                        'sources': [pending[key][3] for key in keys],
+                    })
+                if hit_keys:
+                    await conn.execute(text(ADD_HITS_SQL), {
+                        'keys': hit_keys,
+                        'hits': [hits[key] for key in hit_keys],
+                    })
+        except Exception as e:
+            logger.error(f"Ошибка записи соответствий названий: {e}")
+            # Возвращаем несохранённое, чтобы записать при следующей попытке
+            for key, value in pending.items():
+                self._pending.setdefault(key, value)
+            for key, count in hits.items():
+                self._pending_hits[key] = self._pending_hits.get(key, 0) + count
+            return 0
+        return len(keys) + len(hit_keys)
+
+    async def compact(self) -> Optional[Dict[str, int]]:
+        """
+        Сжатие таблицы: удаляет соответствия удалённым продуктам и давно
+        не используемые неуверенные, а записи, ключ которых изменился после
+        правок нормализатора, переносит на новый ключ. Возвращает None,
+        если сжатие уже выполняет другой процесс.
+        """
+        from database.init_database import engine
+
+        await self.flush()
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            locked = await conn.scalar(text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {'lock_id': COMPACT_LOCK_ID})
+            if not locked:
+                return None
+
+            # Пустая таблица food (справочник ещё не импортирован) - не повод удалять всё
+            orphaned = await conn.execute(text("""
+                DELETE FROM food_alias a
+                WHERE EXISTS (SELECT 1 FROM food)
+                  AND NOT EXISTS (SELECT 1 FROM food f WHERE f.fdc_id = a.fdc_id)
+            """))
+            stale = await conn.execute(text(f"""
+                DELETE FROM food_alias
+                WHERE confidence < :review_confidence AND hits <= :max_hits
+                  AND last_seen_at < now() - interval '{int(STALE_DAYS)} days'
+            """), {'review_confidence': REVIEW_CONFIDENCE, 'max_hits': STALE_MAX_HITS})
+
+            rows = (await conn.execute(text("SELECT normalized_text, sample_text FROM food_alias"))).fetchall()
+            moved = [(key, normalize_food_key(sample)) for key, sample in rows if normalize_food_key(sample) != key]
+            if moved:
+                await conn.execute(text("""
+                    CREATE TEMP TABLE food_alias_rekey (old_key text PRIMARY KEY, new_key text) ON COMMIT DROP
+                """))
+                await conn.execute(
+                    text("INSERT INTO food_alias_rekey SELECT * FROM unnest(CAST(:old AS text[]), CAST(:new AS text[]))"),
+                    {'old': [old for old, _ in moved], 'new': [new for _, new in moved]},
+                )
+                # Для нового ключа берём самое уверенное соответствие, обращения складываем
+                await conn.execute(text("""
+                    INSERT INTO food_alias AS a
+                        (normalized_text, sample_text, fdc_id, confidence, hits, source, created_at, last_seen_at)
+                    SELECT DISTINCT ON (r.new_key) r.new_key, o.sample_text, o.fdc_id, o.confidence,
+                           SUM(o.hits) OVER (PARTITION BY r.new_key), o.source, o.created_at,
+                           MAX(o.last_seen_at) OVER (PARTITION BY r.new_key)
+                    FROM food_alias_rekey r
+                    JOIN food_alias o ON o.normalized_text = r.old_key
+                    ORDER BY r.new_key, o.confidence DESC, o.hits DESC
+                    ON CONFLICT (normalized_text) DO UPDATE
+                    SET fdc_id = CASE WHEN EXCLUDED.confidence > a.confidence THEN EXCLUDED.fdc_id ELSE a.fdc_id END,
+                        source = CASE WHEN EXCLUDED.confidence > a.confidence THEN EXCLUDED.source ELSE a.source END,
+                        confidence = GREATEST(a.confidence, EXCLUDED.confidence),
+                        hits = a.hits + EXCLUDED.hits,
+                        last_seen_at = GREATEST(a.last_seen_at, EXCLUDED.last_seen_at)
+                """))
+                await conn.execute(text("""
+                    DELETE FROM food_alias
+                    WHERE normalized_text IN (SELECT old_key FROM food_alias_rekey)
+                      AND normalized_text NOT IN (SELECT new_key FROM food_alias_rekey)
+                """))
+
+        counts = {'orphaned': orphaned.rowcount, 'stale': stale.rowcount, 'rekeyed': len(moved)}
+        await self.load()
+        logger.info(f"Соответствия названий сжаты за {time.perf_counter() - started:.1f} с: {counts}")
+        return counts
+
+    async def list_for_review(self, max_confidence: float = REVIEW_CONFIDENCE, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Неуверенные соответствия, самые востребованные первыми"""
+        from database.init_database import engine
+
+        async with engine.connect() as conn:
+            result = await conn.execute(text(REVIEW_SQL), {
+                'max_confidence': max_confidence, 'limit': limit, 'offset': offset,
+            })
+            return [
+                {
+                    'normalized_text': row.normalized_text,
+                    'sample_text': row.sample_text,
+                    'fdc_id': int(row.fdc_id),
+                    'description': row.description,
+                    'confidence': round(float(row.confidence), 2),
+                    'hits': int(row.hits),
+                    'source': row.source,
+                    'last_seen_at': row.last_seen_at.isoformat() if row.last_seen_at else None,
+                }
+                for row in result
+            ]
+
+    async def review(self, decisions: List[Dict]) -> Dict[str, int]:
+        """
+        Применяет решения администратора: {'normalized_text', 'action': 'approve' | 'delete',
+        'fdc_id': новый fdc_id для approve (необязательно)}
+        """
+        from database.init_database import engine
+
+        approved, deleted = [], []
+        for decision in decisions:
+            if not isinstance(decision, dict):
+                continue
+            key = decision.get('normalized_text')
+            if not key:
+                continue
+            if decision.get('action') == 'delete':
+                deleted.append(key)
+            elif decision.get('action') == 'approve':
+                fdc_id = decision.get('fdc_id')
+                approved.append((key, int(fdc_id) if fdc_id is not None else None))
+
+        async with engine.begin() as conn:
+            for key, fdc_id in approved:
+                await conn.execute(text("""
+                    UPDATE food_alias
+                    SET confidence = :confidence, source = 'admin', fdc_id = COALESCE(:fdc_id, fdc_id)
+                    WHERE normalized_text = :key
+                """), {'confidence': SOURCE_CONFIDENCE['admin'], 'fdc_id': fdc_id, 'key': key})
+            if deleted:
+                await conn.execute(
+                    text("DELETE FROM food_alias WHERE normalized_text = ANY(CAST(:keys AS text[]))"),
+                    {'keys': deleted},
+                )
+
+        # Решения видны этому процессу сразу, остальным - после перезагрузки
+        for key, fdc_id in approved:
+            current = self._aliases.get(key)
+            if current is not None or fdc_id is not None:
+                self._aliases[key] = (fdc_id if fdc_id is not None else current[0], SOURCE_CONFIDENCE['admin'])
+        for key in deleted:
+            self._aliases.pop(key, None)
+            self._pending.pop(key, None)
+        return {'approved': len(approved), 'deleted': len(deleted)}
+
+
+# Глобальный экземпляр
+food_aliases = FoodAliasStore()
+
+
+async def get_alias_per_100g(food_name: str) -> Optional[Dict]:
+    """
+    Значения на 100г по выученному соответствию: из справочника в памяти,
+    а если он не загружен в этот процесс - из food_macros по первичному ключу
+    """
+    return (await get_alias_per_100g_many([food_name]))[0]
+
+
+async def get_alias_per_100g_many(food_names: List[str]) -> List[Optional[Dict]]:
+    """
+    Значения на 100г по выученным соответствиям для списка названий (в том же
+    порядке, None без соответствия). Без справочника в памяти - один запрос
+    к food_macros на все названия.
+    """
+    from api.ai_api.local_nutrition import local_nutrition
+    from database.food_macros import get_macros_by_fdc_ids
+
+    fdc_ids = [food_aliases.lookup(food_name) for food_name in food_names]
+    if local_nutrition.loaded:
+        return [None if fdc_id is None else local_nutrition.get_by_fdc_id(fdc_id) for fdc_id in fdc_ids]
+    wanted = [fdc_id for fdc_id in fdc_ids if fdc_id is not None]
+    if not wanted:
+        return [None] * len(food_names)
+    try:
+        found = await get_macros_by_fdc_ids(wanted)
+    except Exception as e:
+        logger.error(f"Ошибка запроса к food_macros: {e}")
+        return [None] * len(food_names)
+
+    results: List[Optional[Dict]] = []
+    for food_name, fdc_id in zip(food_names, fdc_ids):
+        macros = found.get(fdc_id) if fdc_id is not None else None
+        results.append(
+            dict(macros, calories=macros['kcal'], description=macros.get('description', food_name))
+            if macros else None
+        )
+    return results
+
+
+async def food_alias_task(stop_event: asyncio.Event) -> None:
+    """
+    Фоновая задача: пачками записывает соответствия, периодически подгружает
+    выученные другими процессами и раз в сутки сжимает таблицу
+    """
+    last_reload = last_compact = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await food_aliases.flush()
+                now = time.monotonic()
+                if now - last_compact >= COMPACT_INTERVAL:
+                    last_compact = last_reload = now
+                    await food_aliases.compact()
+                elif now - last_reload >= RELOAD_INTERVAL:
+                    last_reload = now
+                    await food_aliases.load()
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания соответствий названий: {e}")
+    finally:
+        # Накопленное не теряем и при отмене задачи
+        await food_aliases.flush()
+
+
+if __name__ == '__main__':
+    async def main():
+        from database.init_database import engine
+
+        await food_aliases.load()
+        counts = await food_aliases.compact()
+        await engine.dispose()
+        if counts is None:
+            print("⏭️ Сжатие уже выполняется другим процессом")
+        else:
+            print(f"✅ Соответствия сжаты: {counts}, осталось {len(food_aliases):,}")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
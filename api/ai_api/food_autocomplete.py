@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from food_search_helper import FOOD_TRANSLATIONS, translate_food_name
+from utils.food_normalizer import normalize_food_name
+from utils.keyword_matcher import fold_text
+from utils.reference_nutrition import reference_nutrition
+
+logger = logging.getLogger(__name__)
+
+# Как часто пересчитывать популярность по таблице meals
+REFRESH_INTERVAL = 3600
+# Названия из дневников пользователей попадают в подсказки, только если
+# их записали несколько разных людей (личные названия не утекают другим)
+MIN_DISTINCT_USERS = 2
+MAX_LOGGED_NAMES = 5000
+
+POPULAR_MEALS_SQL = """
+    SELECT lower(food_name) AS name, COUNT(*) AS meals, COUNT(DISTINCT user_id) AS users
+    FROM meals
+    GROUP BY lower(food_name)
+    ORDER BY meals DESC
+    LIMIT :limit
+"""
+
+
+class FoodAutocomplete:
+    """
+    Автодополнение названий продуктов по префиксу.
+
+    Ключи - начала каждого слова названия ("куриная грудка" находится и по
+    "кур", и по "груд") в отсортированном списке; диапазон префикса ищется
+    через bisect, лучшие по популярности - через np.argpartition по срезу весов.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.names_en: List[str] = []
+        self.popularity = np.empty(0, dtype=np.int64)
+        self.keys: List[str] = []
+        self.key_names = np.empty(0, dtype=np.int32)
+        self.key_scores = np.empty(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def build(self, entries: Iterable[Tuple[str, str]], popularity: Optional[Dict[str, int]] = None) -> None:
+        """
+        Строит индекс из (название, название_en).
+        popularity - число записей в дневниках по нормализованному названию.
+        """
+        popularity = popularity or {}
+        names, names_en, counts, seen = [], [], [], set()
+        for name, name_en in entries:
+            name = ' '.join(name.split())
+            folded = fold_text(name)
+            if not name or folded in seen:
+                continue
+            seen.add(folded)
+            names.append(name)
+            names_en.append(name_en)
+            counts.append(popularity.get(normalize_food_name(name), 0))
+
+        keyed = []
+        for name_id, name in enumerate(names):
+            folded = fold_text(name)
+            # Популярность важнее всего, при равной - короче и с начала названия
+            base_score = math.log1p(counts[name_id]) - len(folded) / 1000
+            start = 0
+            for word in folded.split(' '):
+                keyed.append((folded[start:], name_id, base_score if start == 0 else base_score - 0.5))
+                start += len(word) + 1
+        keyed.sort()
+
+        self._swap(
+            names, names_en,
+            np.asarray(counts, dtype=np.int64),
+            [key for key, _, _ in keyed],
+            np.asarray([name_id for _, name_id, _ in keyed], dtype=np.int32),
+            np.asarray([score for _, _, score in keyed], dtype=np.float64),
+        )
+
+    def _swap(self, names, names_en, popularity, keys, key_names, key_scores) -> None:
+        # Все поля заменяются разом, чтобы запрос не увидел полусобранный индекс
+        self.names, self.names_en, self.popularity = names, names_en, popularity
+        self.keys, self.key_names, self.key_scores = keys, key_names, key_scores
+
+    def complete(self, query: str, limit: int = 10) -> List[Dict]:
+        """Подсказки для введённого префикса, самые популярные первыми"""
+        prefix = ' '.join(fold_text(query).split())
+        keys = self.keys
+        if not prefix or not keys:
+            return []
+
+        low = bisect_left(keys, prefix)
+        high = bisect_left(keys, prefix + '\uffff', low)
+        if low == high:
+            return []
+
+        # Берём с запасом: одно название может совпасть несколькими словами
+        scores = self.key_scores[low:high]
+        take = min(len(scores), limit * 3)
+        if take < len(scores):
+            top = np.argpartition(-scores, take - 1)[:take]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        names, names_en, popularity = self.names, self.names_en, self.popularity
+        suggestions, used = [], set()
+        for name_id in self.key_names[low:high][top].tolist():
+            if name_id in used:
+                continue
+            used.add(name_id)
+            suggestions.append({
+                'name': names[name_id],
+                'name_en': names_en[name_id],
+                'popularity': int(popularity[name_id]),
+            })
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+# Глобальный экземпляр
+food_autocomplete = FoodAutocomplete()
+
+
+def _canonical_entries() -> List[Tuple[str, str]]:
+    """Канонические русские и английские названия из справочников"""
+    entries = [(ru_name, en_name) for ru_name, en_name in FOOD_TRANSLATIONS.items()]
+    entries.extend((food.name, translate_food_name(food.name)) for food in reference_nutrition.foods)
+    entries.extend((en_name, en_name) for en_name in FOOD_TRANSLATIONS.values())
+    return entries
+
+
+async def load_meal_popularity(limit: int = MAX_LOGGED_NAMES) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Популярность продуктов по таблице meals.
+    Возвращает (нормализованное название -> число записей, названия для подсказок).
+    """
+    from database.init_database import engine
+
+    popularity: Dict[str, int] = {}
+    shared_names: List[str] = []
+    async with engine.connect() as conn:
+        result = await conn.execute(text(POPULAR_MEALS_SQL), {'limit': limit})
+        for name, meals, users in result:
+            if not name:
+                continue
+            key = normalize_food_name(name)
+            popularity[key] = popularity.get(key, 0) + meals
+            if users >= MIN_DISTINCT_USERS:
+                shared_names.append(name)
+    return popularity, shared_names
+
+
+async def refresh_food_autocomplete() -> None:
+    """Пересобирает автодополнение с актуальной популярностью из meals"""
+    started = time.perf_counter()
+    entries = _canonical_entries()
+    try:
+        popularity, shared_names = await load_meal_popularity()
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить популярность продуктов, строим без неё: {e}")
+        popularity, shared_names = {}, []
+    entries.extend((name, translate_food_name(name)) for name in shared_names)
+
+    food_autocomplete.build(entries, popularity)
+    logger.info(
+        f"Автодополнение построено: {len(food_autocomplete):,} названий "
+        f"за {time.perf_counter() - started:.2f} с"
+    )
+
+
+async def food_autocomplete_refresh_task(stop_event: asyncio.Event, interval: float = REFRESH_INTERVAL) -> None:
+    """Фоновая задача: периодически обновляет популярность до остановки сервера"""
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            try:
+                await refresh_food_autocomplete()
+            except Exception as e:
+                logger.error(f"Ошибка обновления автодополнения: {e}")
@@ -0,0 +1,222 @@
+import logging
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from food_search_helper import FOOD_TRANSLATIONS, is_russian_text, translate_food_name
+
+logger = logging.getLogger(__name__)
+
+FOOD_SEARCH_INDEX_PATH = os.getenv('FOOD_SEARCH_INDEX_PATH', 'data/food_search_index.npz')
+
+# Минимальная доля общих триграмм, при которой кандидат попадает в выдачу
+MIN_SCORE = 0.2
+
+_NON_WORD = re.compile(r'[^0-9a-zа-я]+')
+
+
+def normalize_for_trigrams(text: str) -> str:
+    """Приводит строку к виду для нарезки на триграммы"""
+    text = text.lower().replace('ё', 'е')
+    return ' ' + _NON_WORD.sub(' ', text).strip() + ' '
+
+
+def trigrams(text: str) -> set:
+    """Множество символьных триграмм строки"""
+    normalized = normalize_for_trigrams(text)
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+class FoodSearchIndex:
+    """
+    Инвертированный индекс символьных триграмм по названиям продуктов.
+
+    Постинги хранятся в формате CSR: один массив id документов и смещения
+    для каждой триграммы. Поиск - подсчёт общих триграмм через np.bincount
+    и ранжирование по коэффициенту Дайса.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.names_en: List[str] = []
+        self.fdc_ids = np.empty(0, dtype=np.int64)  # -1, если у записи нет fdc_id
+        self.doc_sizes = np.empty(0, dtype=np.int32)
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        self.postings = np.empty(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def build(self, documents: Iterable[Tuple[str, str, int]]) -> None:
+        """Строит индекс из (название, название_en, fdc_id)"""
+        names, names_en, fdc_ids, doc_sizes = [], [], [], []
+        buckets: Dict[str, List[int]] = {}
+        for doc_id, (name, name_en, fdc_id) in enumerate(documents):
+            doc_trigrams = trigrams(name)
+            names.append(name)
+            names_en.append(name_en)
+            fdc_ids.append(fdc_id)
+            doc_sizes.append(len(doc_trigrams))
+            for trigram in doc_trigrams:
+                buckets.setdefault(trigram, []).append(doc_id)
+
+        spans, chunks, offset = {}, [], 0
+        for trigram, doc_ids in buckets.items():
+            spans[trigram] = (offset, offset + len(doc_ids))
+            chunks.append(np.asarray(doc_ids, dtype=np.int32))
+            offset += len(doc_ids)
+
+        self._swap(
+            names, names_en,
+            np.asarray(fdc_ids, dtype=np.int64),
+            np.asarray(doc_sizes, dtype=np.int32),
+            spans,
+            np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32),
+        )
+
+    def build_from_engine(self, engine) -> None:
+        """Строит индекс по описаниям FoodData Central и русским названиям FOOD_TRANSLATIONS"""
+        def documents():
+            for ru_name, en_name in FOOD_TRANSLATIONS.items():
+                per_100g = engine.lookup(ru_name)
+                yield ru_name, en_name, per_100g['fdc_id'] if per_100g else -1
+            for row, description in enumerate(engine.descriptions):
+                if description:
+                    yield description, description, int(engine.fdc_ids[row])
+
+        started = time.perf_counter()
+        self.build(documents())
+        logger.info(f"Поисковый индекс построен: {len(self):,} записей за {time.perf_counter() - started:.1f} с")
+
+    def _swap(self, names, names_en, fdc_ids, doc_sizes, spans, postings) -> None:
+        # Все поля заменяются разом, чтобы поиск не увидел полусобранный индекс
+        self.names, self.names_en, self.fdc_ids = names, names_en, fdc_ids
+        self.doc_sizes, self.spans, self.postings = doc_sizes, spans, postings
+
+    def install_snapshot(self, snapshot) -> None:
+        """Подключает индекс из офлайн-снимка (api/ai_api/nutrition_snapshot.py) без копирования"""
+        self._swap(
+            snapshot.strings('search_names'),
+            snapshot.strings('search_names_en'),
+            snapshot.arrays['search_fdc_ids'],
+            snapshot.arrays['search_doc_sizes'],
+            snapshot.key_index('trigram_keys', 'trigram_spans'),
+            snapshot.arrays['search_postings'],
+        )
+        logger.info(f"Поисковый индекс подключён из снимка {snapshot.path}: {len(self):,} записей")
+
+    def save(self, path: str = FOOD_SEARCH_INDEX_PATH) -> None:
+        """Сохраняет индекс в .npz для быстрого старта"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        keys = list(self.spans)
+        np.savez(
+            path,
+            names=np.asarray(self.names, dtype=object),
+            names_en=np.asarray(self.names_en, dtype=object),
+            fdc_ids=self.fdc_ids,
+            doc_sizes=self.doc_sizes,
+            trigram_keys=np.asarray(keys, dtype=object),
+            trigram_spans=np.asarray([self.spans[key] for key in keys], dtype=np.int64).reshape(-1, 2),
+            postings=self.postings,
+        )
+
+    def load(self, path: str = FOOD_SEARCH_INDEX_PATH) -> bool:
+        """Загружает заранее построенный индекс"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=True) as data:
+                spans = {
+                    key: (int(start), int(end))
+                    for key, (start, end) in zip(data['trigram_keys'].tolist(), data['trigram_spans'])
+                }
+                self._swap(
+                    data['names'].tolist(),
+                    data['names_en'].tolist(),
+                    data['fdc_ids'],
+                    data['doc_sizes'],
+                    spans,
+                    data['postings'],
+                )
+        except Exception as e:
+            logger.error(f"Ошибка загрузки поискового индекса {path}: {e}")
+            return False
+        logger.info(f"Поисковый индекс загружен из {path}: {len(self):,} записей")
+        return True
+
+    def _score(self, query: str) -> Dict[int, float]:
+        query_trigrams = trigrams(query)
+        blocks = [
+            self.postings[span[0]:span[1]]
+            for span in (self.spans.get(t) for t in query_trigrams)
+            if span is not None
+        ]
+        if not blocks:
+            return {}
+        hits = np.bincount(np.concatenate(blocks))
+        candidates = np.flatnonzero(hits)
+        scores = 2.0 * hits[candidates] / (len(query_trigrams) + self.doc_sizes[candidates])
+        keep = scores >= MIN_SCORE
+        return dict(zip(candidates[keep].tolist(), scores[keep].tolist()))
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Ранжированный список кандидатов с оценкой схожести от 0 до 1"""
+        if not query or not self.names:
+            return []
+
+        scores = self._score(query)
+        # Русский запрос дополнительно ищем по английскому переводу
+        if is_russian_text(query):
+            translated = translate_food_name(query)
+            if translated != query:
+                for doc_id, score in self._score(translated).items():
+                    if score > scores.get(doc_id, 0.0):
+                        scores[doc_id] = score
+        if not scores:
+            return []
+
+        doc_ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+        if len(doc_ids) > limit:
+            top = np.argpartition(-values, limit)[:limit]
+            doc_ids, values = doc_ids[top], values[top]
+        order = np.lexsort((self.doc_sizes[doc_ids], -values))
+
+        return [
+            {
+                'name': self.names[doc_id],
+                'name_en': self.names_en[doc_id],
+                'fdc_id': int(self.fdc_ids[doc_id]) if self.fdc_ids[doc_id] >= 0 else None,
+                'score': round(float(values[i]), 3),
+            }
+            for i, doc_id in ((i, int(doc_ids[i])) for i in order)
+        ]
+
+
+# Глобальный экземпляр
+food_search_index = FoodSearchIndex()
+
+
+async def init_food_search_index(engine, path: Optional[str] = FOOD_SEARCH_INDEX_PATH) -> None:
+    """Загружает индекс из файла, а если файла нет - строит по локальному справочнику"""
+    if path and food_search_index.load(path):
+        return
+    food_search_index.build_from_engine(engine)
+
+
+if __name__ == '__main__':
+    import asyncio
+    from api.ai_api.local_nutrition import local_nutrition
+
+    async def build_index_file():
+        await local_nutrition.load()
+        food_search_index.build_from_engine(local_nutrition)
+        food_search_index.save()
+        print(f"✅ Индекс сохранён в {FOOD_SEARCH_INDEX_PATH}: {len(food_search_index):,} записей")
+
+    asyncio.run(build_index_file())
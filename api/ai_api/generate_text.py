@@ -1,20 +1,20 @@
-from mistralai import Mistral
 from aiogram.types import Message
 from dotenv import load_dotenv
 
 import os
 import base64
+from typing import AsyncIterator
 
 from core.init_bot import bot
 from database.crud import get_context, update_context
 from api.ai_api.gigachat_api import generate_text_gigachat
+from api.ai_api.llm_scheduler import PRIORITY_PREMIUM_CHAT, llm_scheduler
+from api.ai_api.mistral_api import client, stream_completion
 
 load_dotenv()
 
-api_key = os.getenv('MISTRAL_API_KEY')
 model = 'codestral-latest'
-
-client = Mistral(api_key=api_key)
+vision_model = 'pixtral-large-latest'
 
 def encode_image(image_path):
     try:
@@ -45,15 +45,16 @@ async def generate_prompt(tg_id: int, main_prompt: str):
         messages_list.append({'role':'user', 'content':main_prompt})
     return messages_list
 
-async def answer_to_text_prompt(main_prompt: str, tg_id: int):
+async def answer_to_text_prompt(main_prompt: str, tg_id: int, priority: int = None):
     prompt = await generate_prompt(tg_id=tg_id, main_prompt=main_prompt)
     try:
-        chat_response = await client.chat.complete_async(
+        # Очередь llm_scheduler: при перегрузке запрос отклоняется сразу
+        chat_response = await llm_scheduler.run('mistral', lambda: client.chat.complete_async(
             model = model,
             messages = prompt,
             max_tokens=1600,
             temperature=0.1
-        )
+        ), priority=priority)
     except:
         return 'Слишком много запросов на сервер. Попробуйте позже.'
     response = chat_response.choices[0].message.content
@@ -63,7 +64,7 @@ async def answer_to_text_prompt(main_prompt: str, tg_id: int):
     await update_context(tg_id=tg_id, context=new_context)
     return response
 
-async def answer_to_view_prompt(message: Message):
+async def build_view_prompt(message: Message):
     file_id = message.photo[-1].file_id
     file = await bot.get_file(file_id=file_id)
     file_path = file.file_path
@@ -71,7 +72,6 @@ async def answer_to_view_prompt(message: Message):
     
     image_path = f'images/image_{message.from_user.id}.jpg'
     base64_image = encode_image(image_path)
-    model = 'pixtral-large-latest'
     
     message_text = message.text if message.text is not None else 'Изображение.'
     main_prompt = {
@@ -94,14 +94,18 @@ async def answer_to_view_prompt(message: Message):
     else:
         prompt = context
         prompt.append(main_prompt)
+    return prompt
+
+async def answer_to_view_prompt(message: Message):
+    prompt = await build_view_prompt(message)
 
     try:
-        chat_response = await client.chat.complete_async(
-            model=model,
+        chat_response = await llm_scheduler.run('mistral', lambda: client.chat.complete_async(
+            model=vision_model,
             messages=prompt,
             max_tokens=1600,
             temperature=0.1
-        )
+        ), priority=PRIORITY_PREMIUM_CHAT)
     except:
         return 'Слишком много запросов на сервер. Попробуйте позже.'
     
@@ -112,12 +116,30 @@ async def answer_to_view_prompt(message: Message):
     await update_context(tg_id=message.from_user.id, context=new_context)
     return response
 
+async def stream_view_prompt(message: Message) -> AsyncIterator[str]:
+    """Потоковый вариант answer_to_view_prompt: контекст сохраняется после полного ответа"""
+    prompt = await build_view_prompt(message)
+    parts = []
+    try:
+        async for delta in stream_completion(prompt, vision_model, priority=PRIORITY_PREMIUM_CHAT):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        print(f"Ошибка потокового ответа Mistral: {e}")
+    if not parts:
+        yield 'Слишком много запросов на сервер. Попробуйте позже.'
+        return
+    
+    new_context = prompt
+    new_context.append({'role':'system', 'content':''.join(parts)})
+    await update_context(tg_id=message.from_user.id, context=new_context)
+
 async def translate(text: str, source_lang: str, target_lang: str) -> str:
     """Перевод текста с помощью Mistral AI"""
     try:
         prompt = f"Переведи следующий текст с {source_lang} на {target_lang}. Переведи только текст, без дополнительных комментариев:\n\n{text}"
         
-        chat_response = await client.chat.complete_async(
+        chat_response = await llm_scheduler.run('mistral', lambda: client.chat.complete_async(
             model=model,
             messages=[{
                 'role': 'user',
@@ -125,7 +147,7 @@ async def translate(text: str, source_lang: str, target_lang: str) -> str:
             }],
             max_tokens=1000,
             temperature=0.1
-        )
+        ))
         
         return chat_response.choices[0].message.content.strip()
     except Exception as e:
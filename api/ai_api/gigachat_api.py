@@ -1,8 +1,37 @@
 import aiohttp
+import asyncio
 import json
+import logging
 import os
+import random
 import time
-from typing import Optional, List, Dict
+import uuid
+from typing import AsyncIterator, Optional, List, Dict, Tuple
+
+from api.ai_api.llm_scheduler import PRIORITY_PREMIUM_CHAT, LLMOverloaded, llm_priority, llm_scheduler
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Пул соединений к GigaChat: одно TCP+TLS соединение переиспользуется
+# между запросами вместо нового рукопожатия на каждый вызов
+POOL_SIZE = int(os.getenv('GIGACHAT_POOL_SIZE', 20))
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+TOKEN_TIMEOUT = 10
+COMPLETION_TIMEOUT = 15
+# Потоковый ответ: общее время и предельная пауза между фрагментами
+STREAM_TIMEOUT = 120
+STREAM_CHUNK_TIMEOUT = COMPLETION_TIMEOUT
+
+# Токен (живёт 30 минут) обновляется в фоне заранее, чтобы запросы
+# пользователей никогда не ждали OAuth
+TOKEN_REFRESH_MARGIN = 300
+# Запас, при котором токен ещё можно использовать в запросе
+TOKEN_MIN_TTL = 10
+TOKEN_RETRY_ATTEMPTS = 4
+TOKEN_RETRY_BASE_DELAY = 1.0
+TOKEN_RETRY_MAX_DELAY = 30.0
 
 class GigaChatAPI:
     def __init__(self):
@@ -12,82 +41,215 @@ class GigaChatAPI:
         self.auth_key = "MGFjM2JjNDMtNzlmYi00OWNmLTg2YmMtYzljODA2YThlM2Q2OmUyMGFlMDJjLTNmMjAtNGE4ZC1iMWE4LTRiMTA1YmI2OGMwZQ=="
         self.access_token = None
         self.token_expires_at = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+        # Одно обновление токена на процесс, остальные ждут его результат
+        self._token_flight = SingleFlight()
+        self._renewal_task: Optional[asyncio.Task] = None
         
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Общая сессия с пулом соединений и кэшем DNS. Создаётся при первом
+        запросе (или в startup) и пересоздаётся, если закрыта или создана
+        в другом цикле событий.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_SIZE,
+                limit_per_host=POOL_SIZE,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ssl=False
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+    
+    async def startup(self) -> None:
+        """
+        Открывает сессию и запускает фоновое получение и обновление токена
+        при старте процесса (FastAPI startup, запуск бота)
+        """
+        self.get_session()
+        # Первый токен получает сама задача, не задерживая старт
+        if self._renewal_task is None or self._renewal_task.done():
+            self._renewal_task = asyncio.create_task(self.token_renewal_loop())
+    
+    async def close(self) -> None:
+        """Останавливает обновление токена и закрывает соединения пула при остановке процесса"""
+        task, self._renewal_task = self._renewal_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        session, self._session, self._session_loop = self._session, None, None
+        if session is not None and not session.closed:
+            await session.close()
+    
+    def token_ttl(self) -> float:
+        """Сколько секунд токен ещё действует (0, если токена нет)"""
+        if not self.access_token:
+            return 0.0
+        if not self.token_expires_at:
+            return float('inf')
+        return max(0.0, self.token_expires_at / 1000 - time.time())
+    
+    async def _refresh_with_retries(self) -> Optional[str]:
+        """Запрос токена с повторами: экспоненциальная задержка со случайным разбросом"""
+        for attempt in range(TOKEN_RETRY_ATTEMPTS):
+            token = await self.get_access_token()
+            if token:
+                return token
+            if attempt < TOKEN_RETRY_ATTEMPTS - 1:
+                delay = min(TOKEN_RETRY_MAX_DELAY, TOKEN_RETRY_BASE_DELAY * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        logger.error(f"Не удалось получить токен GigaChat за {TOKEN_RETRY_ATTEMPTS} попыток")
+        return None
+    
+    async def refresh_token(self) -> Optional[str]:
+        """Обновляет токен; одновременные вызовы ждут одно общее обновление"""
+        try:
+            return await self._token_flight.do('token', self._refresh_with_retries)
+        except Exception as e:
+            logger.error(f"Ошибка обновления токена GigaChat: {e}")
+            return None
+    
+    async def token_renewal_loop(self) -> None:
+        """Фоновая задача: обновляет токен за TOKEN_REFRESH_MARGIN секунд до истечения"""
+        while True:
+            ttl = self.token_ttl()
+            if ttl == float('inf'):
+                return
+            await asyncio.sleep(max(0.0, ttl - TOKEN_REFRESH_MARGIN))
+            if not await self.refresh_token():
+                # Старый токен ещё может действовать - пробуем снова чуть позже
+                await asyncio.sleep(TOKEN_RETRY_MAX_DELAY)
+    
     async def get_access_token(self) -> Optional[str]:
         """Асинхронное получение токена доступа"""
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
             'Accept': 'application/json',
-            'RqUID': '864e65ea-7a12-41ce-b398-0809f0f30fd0',
+            'RqUID': str(uuid.uuid4()),
             'Authorization': f'Basic {self.auth_key}'
         }
         data = 'scope=GIGACHAT_API_PERS'
         
         try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(self.auth_url, headers=headers, data=data, ssl=False) as response:
-                    if response.status == 200:
-                        token_data = await response.json()
-                        self.access_token = token_data.get('access_token')
-                        self.token_expires_at = token_data.get('expires_at')
-                        return self.access_token
-                    else:
-                        print(f"Ошибка получения токена: {response.status}, {await response.text()}")
-                        return None
+            timeout = aiohttp.ClientTimeout(total=TOKEN_TIMEOUT)
+            async with self.get_session().post(self.auth_url, headers=headers, data=data, timeout=timeout) as response:
+                if response.status == 200:
+                    token_data = await response.json()
+                    self.access_token = token_data.get('access_token')
+                    self.token_expires_at = token_data.get('expires_at')
+                    return self.access_token
+                else:
+                    print(f"Ошибка получения токена: {response.status}, {await response.text()}")
+                    return None
         except Exception as e:
             print(f"Ошибка при запросе токена: {e}")
             return None
     
     async def ensure_token(self) -> bool:
-        """Проверка и обновление токена при необходимости"""
-        current_time = int(time.time() * 1000)
-        
-        if not self.access_token or (self.token_expires_at and current_time >= self.token_expires_at):
-            return await self.get_access_token() is not None
-        return True
+        """
+        Проверка токена. Обычно его заранее обновила фоновая задача; ждать
+        обновления приходится, только если она не запущена или не справилась.
+        """
+        if self.token_ttl() > TOKEN_MIN_TTL:
+            return True
+        return await self.refresh_token() is not None
     
-    async def chat_completion(self, messages: List[Dict], model: str = "GigaChat", temperature: float = 0.1) -> Optional[str]:
-        """Асинхронная отправка запроса к GigaChat API"""
-        if not await self.ensure_token():
-            return None
-            
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {self.access_token}'
-        }
-        
+    async def _post_completion(self, headers: Dict, payload: Dict) -> Tuple[int, object]:
+        """Один HTTP-запрос chat/completions: (статус, JSON при 200 или текст ошибки)"""
+        timeout = aiohttp.ClientTimeout(total=COMPLETION_TIMEOUT)
+        async with self.get_session().post(
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=timeout
+        ) as response:
+            if response.status == 200:
+                return response.status, await response.json()
+            if response.status == 429:
+                self._rate_limited(response)
+            return response.status, await response.text()
+    
+    @staticmethod
+    def _rate_limited(response: aiohttp.ClientResponse) -> None:
+        """429 от GigaChat: приостанавливаем очередь на Retry-After секунд"""
+        retry_after = response.headers.get('Retry-After', '')
+        llm_scheduler.rate_limited('gigachat', float(retry_after) if retry_after.isdigit() else None)
+    
+    @staticmethod
+    async def _iter_sse_deltas(response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        """Фрагменты текста из SSE-ответа: строки data: {...} до data: [DONE]"""
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                return
+            choices = json.loads(data).get('choices') or []
+            if choices:
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    yield delta
+    
+    async def stream_completion(self, messages: List[Dict], model: str = "GigaChat", temperature: float = 0.1,
+                                priority: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Потоковый запрос к GigaChat (stream=True): отдаёт фрагменты ответа по мере генерации.
+        Слот llm_scheduler занят до последнего фрагмента. Ошибка HTTP до начала
+        ответа завершает поток без фрагментов; обрыв соединения в середине
+        пробрасывается вызывающему.
+        """
         payload = {
             "model": model,
             "messages": messages,
             "temperature": temperature,
-            "max_tokens": 2048
+            "max_tokens": 2048,
+            "stream": True
         }
+        timeout = aiohttp.ClientTimeout(total=STREAM_TIMEOUT, sock_read=STREAM_CHUNK_TIMEOUT)
         
-        try:
-            timeout = aiohttp.ClientTimeout(total=15)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
+        for attempt in range(2):
+            if not await self.ensure_token():
+                return
+            token = self.access_token
+            headers = {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'Authorization': f'Bearer {token}'
+            }
+            
+            async with llm_scheduler.slot('gigachat', priority):
+                async with self.get_session().post(
                     f"{self.base_url}/chat/completions",
                     headers=headers,
                     json=payload,
-                    ssl=False
+                    timeout=timeout
                 ) as response:
                     if response.status == 200:
-                        data = await response.json()
-                        if 'choices' in data and len(data['choices']) > 0:
-                            return data['choices'][0]['message']['content']
-                    else:
-                        print(f"Ошибка GigaChat API: {response.status}, {await response.text()}")
-                        return None
-                
-        except Exception as e:
-            print(f"Ошибка при запросе к GigaChat: {e}")
-            return None
+                        async for delta in self._iter_sse_deltas(response):
+                            yield delta
+                        return
+                    if response.status == 401 and attempt == 0:
+                        if self.access_token == token:
+                            self.access_token = None
+                        logger.warning("GigaChat вернул 401, обновляем токен и повторяем запрос")
+                        continue
+                    if response.status == 429:
+                        self._rate_limited(response)
+                    print(f"Ошибка GigaChat API: {response.status}, {await response.text()}")
+                    return
     
-    async def simple_completion(self, prompt: str, system_prompt: str = None) -> Optional[str]:
-        """Простой асинхронный запрос к GigaChat"""
+    @staticmethod
+    def build_messages(prompt: str, system_prompt: str = None) -> List[Dict]:
+        """Сообщения для запроса: необязательный системный промпт и запрос пользователя"""
         messages = []
         
         if system_prompt:
@@ -100,18 +262,77 @@ class GigaChatAPI:
             "role": "user", 
             "content": prompt
         })
+        return messages
+    
+    async def chat_completion(self, messages: List[Dict], model: str = "GigaChat", temperature: float = 0.1,
+                              priority: Optional[int] = None) -> Optional[str]:
+        """
+        Асинхронная отправка запроса к GigaChat API.
+        При 401 (токен отозван раньше срока) токен обновляется один раз и запрос повторяется.
+        Запрос проходит через llm_scheduler с приоритетом priority (по умолчанию
+        из llm_priority); если очередь перегружена, бросает LLMOverloaded.
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": 2048
+        }
         
-        return await self.chat_completion(messages)
+        for attempt in range(2):
+            if not await self.ensure_token():
+                return None
+            token = self.access_token
+            headers = {
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+                'Authorization': f'Bearer {token}'
+            }
+            
+            try:
+                status, data = await llm_scheduler.run('gigachat', lambda: self._post_completion(headers, payload), priority)
+            except LLMOverloaded:
+                raise
+            except Exception as e:
+                print(f"Ошибка при запросе к GigaChat: {e}")
+                return None
+            
+            if status == 200:
+                if 'choices' in data and len(data['choices']) > 0:
+                    return data['choices'][0]['message']['content']
+                return None
+            if status == 401 and attempt == 0:
+                # Сбрасываем токен, только если его ещё не заменил другой запрос
+                if self.access_token == token:
+                    self.access_token = None
+                logger.warning("GigaChat вернул 401, обновляем токен и повторяем запрос")
+                continue
+            print(f"Ошибка GigaChat API: {status}, {data}")
+            return None
+        return None
+    
+    async def simple_completion(self, prompt: str, system_prompt: str = None) -> Optional[str]:
+        """Простой асинхронный запрос к GigaChat"""
+        return await self.chat_completion(self.build_messages(prompt, system_prompt))
 
-# Глобальный экземпляр
+# Глобальный экземпляр: общие сессия и токен для бота, API и NutritionAPI
 gigachat = GigaChatAPI()
 
+# Ответ пользователю, если запрос не дождался очереди к LLM
+OVERLOADED_MESSAGE = "Сейчас слишком много запросов к ИИ. Попробуйте через минуту."
+
 # Функции-обертки для совместимости с существующим кодом
-async def generate_text_gigachat(prompt: str, system_prompt: str = None) -> str:
-    """Генерация текста через GigaChat"""
+async def generate_text_gigachat(prompt: str, system_prompt: str = None, priority: Optional[int] = None) -> str:
+    """Генерация текста через GigaChat; priority - класс из llm_scheduler (по умолчанию из контекста)"""
     try:
-        result = await gigachat.simple_completion(prompt, system_prompt)
+        if priority is None:
+            result = await gigachat.simple_completion(prompt, system_prompt)
+        else:
+            with llm_priority(priority):
+                result = await gigachat.simple_completion(prompt, system_prompt)
         return result if result else "Извините, не удалось получить ответ от GigaChat."
+    except LLMOverloaded:
+        return OVERLOADED_MESSAGE
     except Exception as e:
         print(f"Ошибка в generate_text_gigachat: {e}")
         return "Произошла ошибка при обращении к GigaChat."
@@ -141,7 +362,8 @@ async def answer_to_text_prompt_gigachat(main_prompt: str, tg_id: int) -> str:
         messages.append({"role": "user", "content": main_prompt})
         
         # Получаем ответ от GigaChat
-        response = await gigachat.chat_completion(messages)
+        with llm_priority(PRIORITY_PREMIUM_CHAT):
+            response = await gigachat.chat_completion(messages)
         
         if response:
             # Сохраняем в контекст
@@ -150,6 +372,8 @@ async def answer_to_text_prompt_gigachat(main_prompt: str, tg_id: int) -> str:
         else:
             return "Извините, не удалось получить ответ от GigaChat."
             
+    except LLMOverloaded:
+        return OVERLOADED_MESSAGE
     except Exception as e:
         print(f"Ошибка в answer_to_text_prompt_gigachat: {e}")
         return "Произошла ошибка при обработке запроса." 
\ No newline at end of file
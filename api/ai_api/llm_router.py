@@ -0,0 +1,368 @@
+"""
+Маршрутизация запросов к LLM между провайдерами (GigaChat, Mistral).
+
+У каждого провайдера отслеживается здоровье: сглаженная (EWMA) задержка
+и её разброс, доля успешных ответов и автомат отключения (circuit breaker).
+После FAILURE_THRESHOLD ошибок подряд провайдер отключается на
+OPEN_SECONDS; затем пропускается один пробный запрос, и при новой ошибке
+пауза удваивается (до OPEN_MAX_SECONDS).
+
+Политика задачи (TASK_POLICIES) задаёт порядок провайдеров и хеджирование:
+если основной провайдер не ответил к своему p90 задержки, тот же запрос
+параллельно уходит второму и берётся первый успешный ответ. Так хвост
+задержек определяется лучшим из двух провайдеров, а не худшим. Без
+хеджирования ошибка одного провайдера переводит запрос на следующий.
+Потоковые ответы не хеджируются: на следующего провайдера они переходят,
+только если первый не прислал ни одного фрагмента.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from api.ai_api import mistral_api
+from api.ai_api.gigachat_api import OVERLOADED_MESSAGE, GigaChatAPI, gigachat
+from api.ai_api.llm_scheduler import LLMOverloaded
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker: ошибок подряд до отключения и длительность отключения
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = 30.0
+OPEN_MAX_SECONDS = 300.0
+
+# EWMA задержки; p90 оценивается как среднее + 1.28 стандартного отклонения
+LATENCY_SMOOTHING = 0.2
+INITIAL_LATENCY = 4.0
+P90_Z = 1.2816
+
+# Хеджирование можно выключить целиком, например при жёстких квотах
+HEDGING_ENABLED = os.getenv('LLM_HEDGING', '1') == '1'
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MAX_DELAY = 10.0
+
+# Порядок провайдеров по задачам; незнакомые и ненастроенные пропускаются
+TASK_POLICIES = {
+    'nutrition': {'providers': ('gigachat', 'mistral'), 'hedge': True},
+    'chat': {'providers': ('gigachat', 'mistral'), 'hedge': True},
+    'menu': {'providers': ('gigachat', 'mistral'), 'hedge': False},
+    'recommendations': {'providers': ('mistral', 'gigachat'), 'hedge': False},
+}
+
+
+class LLMProvider:
+    """Общий интерфейс провайдера: ответ целиком (None - неудача) и поток фрагментов"""
+
+    name = ''
+
+    async def complete(self, messages: List[Dict], priority: Optional[int] = None) -> Optional[str]:
+        raise NotImplementedError
+
+    def stream(self, messages: List[Dict], priority: Optional[int] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class GigaChatProvider(LLMProvider):
+    name = 'gigachat'
+
+    def __init__(self, api: GigaChatAPI):
+        self.api = api
+
+    async def complete(self, messages: List[Dict], priority: Optional[int] = None) -> Optional[str]:
+        return await self.api.chat_completion(messages, priority=priority)
+
+    def stream(self, messages: List[Dict], priority: Optional[int] = None) -> AsyncIterator[str]:
+        return self.api.stream_completion(messages, priority=priority)
+
+
+class MistralProvider(LLMProvider):
+    name = 'mistral'
+
+    async def complete(self, messages: List[Dict], priority: Optional[int] = None) -> Optional[str]:
+        return await mistral_api.chat_completion(messages, priority=priority)
+
+    def stream(self, messages: List[Dict], priority: Optional[int] = None) -> AsyncIterator[str]:
+        return mistral_api.stream_completion(messages, priority=priority)
+
+
+class ProviderHealth:
+    """Задержка, доля успехов и circuit breaker одного провайдера"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = INITIAL_LATENCY
+        self.latency_var = 0.0
+        self.success_rate = 1.0
+        self.failures = 0
+        self.open_until = 0.0
+        self.open_seconds = OPEN_SECONDS
+        self.probing = False
+        self.stats = {'success': 0, 'failure': 0, 'opened': 0}
+
+    def p90(self) -> float:
+        return self.latency + P90_Z * math.sqrt(self.latency_var)
+
+    def state(self) -> str:
+        if self.failures < FAILURE_THRESHOLD:
+            return 'closed'
+        if time.monotonic() < self.open_until:
+            return 'open'
+        return 'half_open'
+
+    def available(self) -> bool:
+        state = self.state()
+        # В полуоткрытом состоянии - только один пробный запрос одновременно
+        return state == 'closed' or (state == 'half_open' and not self.probing)
+
+    def begin(self) -> None:
+        if self.state() == 'half_open':
+            self.probing = True
+
+    def release_probe(self) -> None:
+        """Запрос отменён или не дошёл до провайдера - он ничего не говорит о здоровье"""
+        self.probing = False
+
+    def observe_latency(self, elapsed: float) -> None:
+        diff = elapsed - self.latency
+        self.latency += LATENCY_SMOOTHING * diff
+        self.latency_var = (1 - LATENCY_SMOOTHING) * (self.latency_var + LATENCY_SMOOTHING * diff * diff)
+
+    def record_success(self, elapsed: Optional[float] = None) -> None:
+        self.stats['success'] += 1
+        self.success_rate += LATENCY_SMOOTHING * (1.0 - self.success_rate)
+        if elapsed is not None:
+            self.observe_latency(elapsed)
+        if self.failures >= FAILURE_THRESHOLD:
+            logger.info(f"LLM-провайдер {self.name} снова доступен")
+        self.failures = 0
+        self.open_seconds = OPEN_SECONDS
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.stats['failure'] += 1
+        self.success_rate -= LATENCY_SMOOTHING * self.success_rate
+        was_open = self.failures >= FAILURE_THRESHOLD
+        self.failures += 1
+        self.probing = False
+        if was_open:
+            # Пробный запрос не удался - отключаем на вдвое больший срок
+            self.open_seconds = min(self.open_seconds * 2, OPEN_MAX_SECONDS)
+        if self.failures >= FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + self.open_seconds
+            self.stats['opened'] += 1
+            logger.warning(f"LLM-провайдер {self.name} отключён на {self.open_seconds:.0f} с после {self.failures} ошибок подряд")
+
+    def snapshot(self) -> Dict:
+        return {
+            'state': self.state(),
+            'latency_s': round(self.latency, 3),
+            'p90_s': round(self.p90(), 3),
+            'success_rate': round(self.success_rate, 3),
+            'consecutive_failures': self.failures,
+            **self.stats,
+        }
+
+
+class LLMRouter:
+    """Выбор провайдера по политике задачи, хеджирование и переключение при ошибках"""
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers = {provider.name: provider for provider in providers}
+        self.health = {provider.name: ProviderHealth(provider.name) for provider in providers}
+        self.stats = {'hedged': 0, 'hedge_wins': 0, 'failovers': 0, 'unavailable': 0}
+
+    def _candidates(self, task: str) -> List[str]:
+        """Доступные провайдеры задачи в порядке политики"""
+        policy = TASK_POLICIES[task]
+        return [
+            name for name in policy['providers']
+            if name in self.providers and self.health[name].available()
+        ]
+
+    async def _attempt(self, name: str, messages: List[Dict], priority: Optional[int]) -> Optional[str]:
+        health = self.health[name]
+        health.begin()
+        started = time.monotonic()
+        try:
+            result = await self.providers[name].complete(messages, priority)
+        except LLMOverloaded:
+            health.release_probe()
+            raise
+        except asyncio.CancelledError:
+            health.release_probe()
+            # Проигравший хедж: задержка не меньше прошедшего времени, иначе
+            # медленный провайдер никогда не узнал бы о своей медленности
+            elapsed = time.monotonic() - started
+            if elapsed > health.latency:
+                health.observe_latency(elapsed)
+            raise
+        except Exception as e:
+            logger.warning(f"Ошибка LLM-провайдера {name}: {e}")
+            result = None
+        if result:
+            health.record_success(time.monotonic() - started)
+        else:
+            health.record_failure()
+        return result
+
+    async def _hedged(self, primary: str, secondary: str, messages: List[Dict],
+                      priority: Optional[int]) -> Tuple[Optional[str], bool]:
+        """
+        Запрос основному провайдеру; если он не ответил к своему p90 или
+        ответил ошибкой - второму. Возвращает (первый успешный ответ, была ли перегрузка очереди).
+        """
+        overloaded = False
+        hedge_delay = min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, self.health[primary].p90()))
+        first = asyncio.create_task(self._attempt(primary, messages, priority))
+        pending = {first}
+        secondary_started = False
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if secondary_started else hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    try:
+                        result = task.result()
+                    except LLMOverloaded:
+                        overloaded = True
+                        continue
+                    if result:
+                        if task is not first:
+                            self.stats['hedge_wins'] += 1
+                        return result, overloaded
+                if not secondary_started:
+                    self.stats['hedged' if not done else 'failovers'] += 1
+                    pending.add(asyncio.create_task(self._attempt(secondary, messages, priority)))
+                    secondary_started = True
+            return None, overloaded
+        finally:
+            # Проигравший запрос отменяем - он освобождает слот llm_scheduler
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, task: str, messages: List[Dict], priority: Optional[int] = None) -> Optional[str]:
+        """
+        Ответ LLM для задачи task или None, если ни один провайдер не ответил.
+        Бросает LLMOverloaded, если отказали только переполненные очереди.
+        """
+        candidates = self._candidates(task)
+        if not candidates:
+            self.stats['unavailable'] += 1
+            logger.warning(f"Нет доступных LLM-провайдеров для задачи {task}")
+            return None
+
+        overloaded = False
+        if HEDGING_ENABLED and TASK_POLICIES[task]['hedge'] and len(candidates) > 1:
+            result, overloaded = await self._hedged(candidates[0], candidates[1], messages, priority)
+            if result:
+                return result
+            candidates = candidates[2:]
+
+        for i, name in enumerate(candidates):
+            if i:
+                self.stats['failovers'] += 1
+            try:
+                result = await self._attempt(name, messages, priority)
+            except LLMOverloaded:
+                overloaded = True
+                continue
+            if result:
+                return result
+        if overloaded:
+            raise LLMOverloaded(f"Очереди LLM для задачи {task} переполнены")
+        return None
+
+    async def stream(self, task: str, messages: List[Dict], priority: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Потоковый ответ для задачи task. Провайдер меняется, только пока не
+        отдан ни один фрагмент; обрыв в середине пробрасывается.
+        """
+        candidates = self._candidates(task)
+        if not candidates:
+            self.stats['unavailable'] += 1
+            logger.warning(f"Нет доступных LLM-провайдеров для задачи {task}")
+        overloaded = False
+        for i, name in enumerate(candidates):
+            if i:
+                self.stats['failovers'] += 1
+            health = self.health[name]
+            health.begin()
+            received = False
+            try:
+                async for delta in self.providers[name].stream(messages, priority):
+                    received = True
+                    yield delta
+            except LLMOverloaded:
+                health.release_probe()
+                overloaded = True
+                continue
+            except Exception as e:
+                health.record_failure()
+                if received:
+                    raise
+                logger.warning(f"Ошибка потокового ответа LLM-провайдера {name}: {e}")
+                continue
+            except BaseException:
+                # Поток закрыт читателем или отменён
+                health.release_probe()
+                raise
+            if received:
+                # Задержку потоков не учитываем: время до первого фрагмента несравнимо с полным ответом
+                health.record_success()
+                return
+            health.record_failure()
+        if overloaded:
+            raise LLMOverloaded(f"Очереди LLM для задачи {task} переполнены")
+
+    def snapshot(self) -> Dict:
+        return {
+            'providers': {name: health.snapshot() for name, health in self.health.items()},
+            **self.stats,
+        }
+
+
+def _configured_providers() -> List[LLMProvider]:
+    providers: List[LLMProvider] = [GigaChatProvider(gigachat)]
+    if mistral_api.is_configured():
+        providers.append(MistralProvider())
+    return providers
+
+
+# Глобальный экземпляр
+llm_router = LLMRouter(_configured_providers())
+
+
+async def generate_text(prompt: str, task: str, priority: Optional[int] = None, system_prompt: str = None) -> str:
+    """Текст от лучшего доступного провайдера; как generate_text_gigachat, не бросает исключений"""
+    try:
+        result = await llm_router.complete(task, GigaChatAPI.build_messages(prompt, system_prompt), priority)
+        return result if result else "Извините, не удалось получить ответ от ИИ."
+    except LLMOverloaded:
+        return OVERLOADED_MESSAGE
+    except Exception as e:
+        print(f"Ошибка в generate_text: {e}")
+        return "Произошла ошибка при обращении к ИИ."
+
+
+async def stream_text(prompt: str, task: str, priority: Optional[int] = None, system_prompt: str = None) -> AsyncIterator[str]:
+    """Потоковый вариант generate_text: текст ошибки одним фрагментом, если ответа нет совсем"""
+    received = False
+    try:
+        async for delta in llm_router.stream(task, GigaChatAPI.build_messages(prompt, system_prompt), priority):
+            received = True
+            yield delta
+    except LLMOverloaded:
+        yield OVERLOADED_MESSAGE
+        return
+    except Exception as e:
+        print(f"Ошибка в stream_text: {e}")
+        if not received:
+            yield "Произошла ошибка при обращении к ИИ."
+        return
+    if not received:
+        yield "Извините, не удалось получить ответ от ИИ."
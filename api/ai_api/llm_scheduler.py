@@ -0,0 +1,298 @@
+"""
+Общий планировщик запросов к LLM (GigaChat, Mistral).
+
+Для каждого провайдера - ограничение одновременных запросов и token bucket
+по частоте (чтобы не получать 429), а ожидающие запросы выстроены в очередь
+по классу приоритета: определение продукта пользователем идёт раньше чата
+с диетологом, тот - раньше генерации меню, а фоновые рекомендации и
+прогрев кэша - в последнюю очередь.
+
+У запроса есть предельное время ожидания в очереди. Если по текущей
+пропускной способности запрос заведомо не дождётся своей очереди, он
+отклоняется сразу (LLMOverloaded), а не висит до общего таймаута.
+
+Лимиты действуют в пределах процесса: у API и бота свои экземпляры.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Классы приоритета: меньше - важнее
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREMIUM_CHAT = 1
+PRIORITY_MENU = 2
+PRIORITY_BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_PREMIUM_CHAT: 'premium_chat',
+    PRIORITY_MENU: 'menu',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+# Сколько секунд запрос класса может ждать своей очереди
+QUEUE_DEADLINES = {
+    PRIORITY_INTERACTIVE: 10.0,
+    PRIORITY_PREMIUM_CHAT: 20.0,
+    PRIORITY_MENU: 45.0,
+    PRIORITY_BACKGROUND: 60.0,
+}
+
+# Лимиты провайдеров: одновременные запросы, запросов в секунду и всплеск
+PROVIDER_LIMITS = {
+    'gigachat': {
+        'concurrency': int(os.getenv('GIGACHAT_MAX_CONCURRENCY', 4)),
+        'rate': float(os.getenv('GIGACHAT_RATE_PER_SEC', 2)),
+        'burst': int(os.getenv('GIGACHAT_RATE_BURST', 5)),
+    },
+    'mistral': {
+        'concurrency': int(os.getenv('MISTRAL_MAX_CONCURRENCY', 2)),
+        'rate': float(os.getenv('MISTRAL_RATE_PER_SEC', 1)),
+        'burst': int(os.getenv('MISTRAL_RATE_BURST', 2)),
+    },
+}
+
+# Предел очереди на провайдера, независимо от оценки времени ожидания
+MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 200))
+# Пауза после 429 без Retry-After
+RATE_LIMIT_PAUSE = 2.0
+# Начальная оценка длительности запроса и доля нового замера в среднем
+INITIAL_LATENCY = 3.0
+LATENCY_SMOOTHING = 0.2
+
+# Приоритет запросов текущей задачи (наследуется созданными в ней задачами)
+_current_priority: ContextVar[int] = ContextVar('llm_priority', default=PRIORITY_INTERACTIVE)
+
+
+class LLMOverloaded(Exception):
+    """Запрос к LLM отклонён: очередь не успеет обработать его вовремя"""
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Задаёт приоритет всем запросам к LLM внутри блока, в т.ч. из созданных в нём задач"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+class TokenBucket:
+    """Ограничение частоты: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Берёт токен и возвращает 0, иначе - сколько секунд ждать следующего"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Провайдер ответил 429: не выдаём токены ближайшие seconds секунд"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class ProviderQueue:
+    """Очередь с приоритетами и лимитами одного провайдера"""
+
+    def __init__(self, name: str, concurrency: int, rate: float, burst: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate, max(1, burst))
+        # (приоритет, порядковый номер, future ожидающего)
+        self._heap = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.in_flight = 0
+        self.waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self.latency = INITIAL_LATENCY
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'expired': 0, 'rate_limited': 0}
+        self.wait_time = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    def throughput(self) -> float:
+        """Оценка пропускной способности, запросов в секунду"""
+        return min(self.bucket.rate, self.concurrency / max(self.latency, 0.05))
+
+    def estimated_wait(self, priority: int) -> float:
+        """Сколько ждать запросу с приоритетом priority, если встать в очередь сейчас"""
+        ahead = sum(count for level, count in self.waiting.items() if level <= priority)
+        free = self.concurrency - self.in_flight
+        if ahead < free:
+            return 0.0
+        return (ahead - free + 1) / self.throughput()
+
+    def _dispatch(self) -> None:
+        """Выдаёт свободные слоты ожидающим в порядке приоритета"""
+        self._timer = None
+        while self._heap and self.in_flight < self.concurrency:
+            waiter = self._heap[0][2]
+            if waiter.done():
+                # Ожидающий ушёл по таймауту или отмене
+                heapq.heappop(self._heap)
+                continue
+            delay = self.bucket.try_acquire()
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._heap)
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    def _reject(self, counter: str, reason: str, priority: int) -> None:
+        self.stats[counter] += 1
+        logger.warning(f"{reason} (приоритет {PRIORITY_NAMES[priority]})")
+        raise LLMOverloaded(reason)
+
+    async def _acquire(self, priority: int, deadline: float) -> None:
+        if sum(self.waiting.values()) >= MAX_QUEUE:
+            self._reject('rejected', f"Очередь {self.name} переполнена", priority)
+        estimated = self.estimated_wait(priority)
+        if estimated > deadline:
+            self._reject('rejected', f"Очередь {self.name}: ожидание ~{estimated:.0f} с больше допустимых {deadline:.0f} с", priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+        self.waiting[priority] += 1
+        started = time.monotonic()
+        try:
+            if self._timer is None:
+                self._dispatch()
+            await asyncio.wait({waiter}, timeout=deadline)
+        except asyncio.CancelledError:
+            # Слот мог быть выдан одновременно с отменой - возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            waiter.cancel()
+            raise
+        finally:
+            self.waiting[priority] -= 1
+
+        if not waiter.done():
+            waiter.cancel()
+            self._reject('expired', f"Запрос к {self.name} не дождался очереди за {deadline:.0f} с", priority)
+        waited = time.monotonic() - started
+        self.wait_time[priority] += LATENCY_SMOOTHING * (waited - self.wait_time[priority])
+
+    @asynccontextmanager
+    async def slot(self, priority: int, deadline: float):
+        """Занимает слот и токен частоты на время блока (например, всего потокового ответа)"""
+        self.stats['submitted'] += 1
+        await self._acquire(priority, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.stats['failed'] += 1
+            if getattr(e, 'status_code', None) == 429:
+                self.rate_limited()
+            raise
+        else:
+            self.stats['completed'] += 1
+        finally:
+            self.latency += LATENCY_SMOOTHING * (time.monotonic() - started - self.latency)
+            self._release()
+
+    async def run(self, func: Callable[[], Awaitable[T]], priority: int, deadline: float) -> T:
+        async with self.slot(priority, deadline):
+            return await func()
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self.stats['rate_limited'] += 1
+        self.bucket.pause(retry_after or RATE_LIMIT_PAUSE)
+
+    def snapshot(self) -> Dict:
+        return {
+            'in_flight': self.in_flight,
+            'concurrency': self.concurrency,
+            'queued': {PRIORITY_NAMES[level]: count for level, count in self.waiting.items()},
+            'avg_wait_s': {PRIORITY_NAMES[level]: round(value, 3) for level, value in self.wait_time.items()},
+            'avg_latency_s': round(self.latency, 3),
+            'tokens': round(self.bucket.tokens, 2),
+            **self.stats,
+        }
+
+
+class LLMScheduler:
+    """Планировщик запросов к LLM по провайдерам"""
+
+    def __init__(self, limits: Dict[str, Dict] = PROVIDER_LIMITS):
+        self._queues = {name: ProviderQueue(name, **params) for name, params in limits.items()}
+
+    def queue(self, provider: str) -> ProviderQueue:
+        return self._queues[provider]
+
+    @staticmethod
+    def _defaults(priority: Optional[int], deadline: Optional[float]):
+        if priority is None:
+            priority = current_priority()
+        if deadline is None:
+            deadline = QUEUE_DEADLINES[priority]
+        return priority, deadline
+
+    async def run(
+        self,
+        provider: str,
+        func: Callable[[], Awaitable[T]],
+        priority: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """
+        Выполняет func, когда у провайдера есть слот и токен частоты.
+        priority по умолчанию - из llm_priority, deadline - по классу.
+        Бросает LLMOverloaded, если запрос не дождался очереди.
+        """
+        priority, deadline = self._defaults(priority, deadline)
+        return await self._queues[provider].run(func, priority, deadline)
+
+    def slot(self, provider: str, priority: Optional[int] = None, deadline: Optional[float] = None):
+        """
+        async with: слот провайдера на время блока - для потоковых ответов,
+        которые занимают соединение до последнего фрагмента
+        """
+        priority, deadline = self._defaults(priority, deadline)
+        return self._queues[provider].slot(priority, deadline)
+
+    def rate_limited(self, provider: str, retry_after: Optional[float] = None) -> None:
+        """Провайдер ответил 429: приостанавливаем выдачу токенов"""
+        self._queues[provider].rate_limited(retry_after)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Глубина очередей и счётчики по провайдерам"""
+        return {name: queue.snapshot() for name, queue in self._queues.items()}
+
+
+# Глобальный экземпляр
+llm_scheduler = LLMScheduler()
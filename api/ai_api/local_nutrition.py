@@ -0,0 +1,244 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from database.food_macros import (
+    CARBS_ID,
+    ENERGY_ATWATER_GENERAL_ID,
+    ENERGY_ATWATER_SPECIFIC_ID,
+    ENERGY_KCAL_ID,
+    FAT_ID,
+    FIBER_ID,
+    PROTEIN_ID,
+    SODIUM_ID,
+    SUGARS_NLEA_ID,
+    SUGARS_TOTAL_ID,
+)
+from food_search_helper import translate_food_name_exact
+
+logger = logging.getLogger(__name__)
+
+# Колонки матрицы нутриентов (значения на 100г, натрий - в мг)
+MACRO_COLUMNS = ('calories', 'protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')
+
+# nutrient_id -> колонка матрицы. Для энергии и сахара порядок важен:
+# последующие id перезаписывают предыдущие, поэтому предпочтительный идёт последним.
+NUTRIENT_COLUMNS = (
+    (ENERGY_ATWATER_SPECIFIC_ID, 0),
+    (ENERGY_ATWATER_GENERAL_ID, 0),
+    (ENERGY_KCAL_ID, 0),
+    (PROTEIN_ID, 1),
+    (FAT_ID, 2),
+    (CARBS_ID, 3),
+    (FIBER_ID, 4),
+    (SUGARS_TOTAL_ID, 5),
+    (SUGARS_NLEA_ID, 5),
+    (SODIUM_ID, 6),
+)
+
+# Чем меньше число, тем надёжнее источник данных при совпадении названий
+DATA_TYPE_PRIORITY = {
+    'foundation_food': 0,
+    'sr_legacy_food': 1,
+    'survey_fndds_food': 2,
+    'branded_food': 3,
+}
+
+STREAM_PARTITION_SIZE = 100_000
+
+
+class LocalNutritionEngine:
+    """
+    Локальный справочник калорийности на основе FoodData Central.
+
+    Загружает энергию, БЖУ, клетчатку, сахар и натрий из food_macros
+    (или food_nutrient) один раз в компактную матрицу float32
+    (строка = fdc_id, значения на 100г) и отвечает на запросы
+    без обращения к БД и LLM.
+    """
+
+    def __init__(self):
+        self.fdc_ids = np.empty(0, dtype=np.int64)
+        self.macros = np.empty((0, len(MACRO_COLUMNS)), dtype=np.float32)
+        # Список и словарь или их аналоги поверх mmap из офлайн-снимка
+        self.descriptions: List[str] = []
+        self.name_index: Dict[str, int] = {}
+        self.loaded = False
+
+    async def load(self) -> bool:
+        """
+        Загружает матрицу макронутриентов и индекс названий из БД.
+        Берёт готовую таблицу food_macros, а если она пуста - собирает
+        матрицу из food_nutrient.
+        """
+        from database.init_database import engine
+
+        started = time.perf_counter()
+        try:
+            async with engine.connect() as conn:
+                macros = await self._read_food_macros(conn)
+                if macros is None:
+                    raw = await self._read_food_nutrient(conn)
+                    if raw is None:
+                        logger.warning("food_nutrient пуста, локальный справочник не загружен")
+                        return False
+
+                foods = await conn.execute(text("SELECT fdc_id, description, data_type FROM food"))
+                food_rows = foods.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки локального справочника: {e}")
+            return False
+
+        if macros is not None:
+            self._install(macros[0], macros[1], food_rows)
+        else:
+            self.build(*raw, food_rows)
+        logger.info(
+            f"Локальный справочник загружен: {len(self.fdc_ids):,} продуктов, "
+            f"{len(self.name_index):,} названий за {time.perf_counter() - started:.1f} с"
+        )
+        return True
+
+    @staticmethod
+    async def _read_food_macros(conn):
+        """(fdc_ids, macros) из food_macros или None, если таблицы нет или она пуста"""
+        try:
+            result = await conn.stream(text(
+                "SELECT fdc_id, kcal, COALESCE(protein, 0), COALESCE(fat, 0), COALESCE(carbs, 0), "
+                "COALESCE(fiber, 0), COALESCE(sugar, 0), COALESCE(sodium, 0) "
+                "FROM food_macros ORDER BY fdc_id"
+            ))
+            blocks = [np.array(rows, dtype=np.float64) async for rows in result.partitions(STREAM_PARTITION_SIZE)]
+        except Exception as e:
+            logger.info(f"food_macros недоступна, собираем справочник из food_nutrient: {e}")
+            await conn.rollback()
+            return None
+        if not blocks:
+            return None
+        block = np.concatenate(blocks)
+        return block[:, 0].astype(np.int64), block[:, 1:].astype(np.float32)
+
+    @staticmethod
+    async def _read_food_nutrient(conn):
+        """Сырые (fdc_ids, nutrient_ids, amounts) нужных нутриентов из food_nutrient"""
+        nutrient_ids = ', '.join(str(nutrient_id) for nutrient_id, _ in NUTRIENT_COLUMNS)
+        fdc_chunks, nutrient_chunks, amount_chunks = [], [], []
+        result = await conn.stream(text(
+            f"SELECT fdc_id, nutrient_id, amount FROM food_nutrient "
+            f"WHERE nutrient_id IN ({nutrient_ids}) AND amount IS NOT NULL"
+        ))
+        async for rows in result.partitions(STREAM_PARTITION_SIZE):
+            block = np.array(rows, dtype=np.float64)
+            fdc_chunks.append(block[:, 0].astype(np.int64))
+            nutrient_chunks.append(block[:, 1].astype(np.int64))
+            amount_chunks.append(block[:, 2].astype(np.float32))
+        if not fdc_chunks:
+            return None
+        return np.concatenate(fdc_chunks), np.concatenate(nutrient_chunks), np.concatenate(amount_chunks)
+
+    def build(self, fdc_ids: np.ndarray, nutrient_ids: np.ndarray, amounts: np.ndarray, food_rows) -> None:
+        """Строит матрицу и индекс названий из сырых строк food_nutrient и food"""
+        unique_ids, rows = np.unique(fdc_ids, return_inverse=True)
+        macros = np.full((len(unique_ids), len(MACRO_COLUMNS)), np.nan, dtype=np.float32)
+        for nutrient_id, column in NUTRIENT_COLUMNS:
+            mask = nutrient_ids == nutrient_id
+            macros[rows[mask], column] = amounts[mask]
+
+        # Продукты без энергии бесполезны для подсчёта калорий
+        has_energy = ~np.isnan(macros[:, 0])
+        self._install(unique_ids[has_energy], np.nan_to_num(macros[has_energy], nan=0.0), food_rows)
+
+    def _install(self, unique_ids: np.ndarray, macros: np.ndarray, food_rows) -> None:
+        """Строит индекс названий для готовой матрицы (fdc_id отсортированы) и подменяет справочник"""
+        descriptions = [''] * len(unique_ids)
+        name_index: Dict[str, int] = {}
+        ranks: Dict[str, tuple] = {}
+        for fdc_id, description, data_type in food_rows:
+            if not description:
+                continue
+            row = int(np.searchsorted(unique_ids, fdc_id))
+            if row >= len(unique_ids) or unique_ids[row] != fdc_id:
+                continue
+            descriptions[row] = description
+            rank = (DATA_TYPE_PRIORITY.get(data_type, len(DATA_TYPE_PRIORITY)), len(description))
+            for key in self._description_keys(description):
+                if key not in ranks or rank < ranks[key]:
+                    ranks[key] = rank
+                    name_index[key] = row
+
+        self._swap(unique_ids, macros, descriptions, name_index)
+
+    def install_snapshot(self, snapshot) -> None:
+        """Подключает массивы офлайн-снимка (api/ai_api/nutrition_snapshot.py) без копирования"""
+        self._swap(
+            snapshot.arrays['fdc_ids'],
+            snapshot.arrays['macros'],
+            snapshot.strings('descriptions'),
+            snapshot.key_index('name_keys', 'name_rows'),
+        )
+
+    def _swap(self, fdc_ids, macros, descriptions, name_index) -> None:
+        # Атомарная замена: читатели видят либо старый, либо новый справочник
+        self.fdc_ids, self.macros = fdc_ids, macros
+        self.descriptions, self.name_index = descriptions, name_index
+        self.loaded = True
+
+    @staticmethod
+    def _description_keys(description: str) -> List[str]:
+        """Ключи поиска для описания FDC: полное описание и первое слово до запятой"""
+        full = description.lower().strip()
+        head = full.split(',', 1)[0].strip()
+        keys = [full, head]
+        if head.endswith('s'):
+            keys.append(head[:-1])
+        return keys
+
+    def _row_for_name(self, food_name: str) -> Optional[int]:
+        """
+        Строка справочника только для названия целиком: по вхождению слова
+        ("чай с сахаром" -> sugar) продукт не определяется, это дело
+        поискового индекса или LLM
+        """
+        name = food_name.lower().strip()
+        row = self.name_index.get(name)
+        if row is None:
+            translated = translate_food_name_exact(name)
+            if translated is None:
+                return None
+            translated = translated.lower()
+            row = self.name_index.get(translated)
+            if row is None and translated.endswith('s'):
+                row = self.name_index.get(translated[:-1])
+        return None if row is None else int(row)
+
+    def _row_to_dict(self, row: int) -> Dict:
+        values = self.macros[row]
+        result = {column: round(float(values[i]), 2) for i, column in enumerate(MACRO_COLUMNS)}
+        result['fdc_id'] = int(self.fdc_ids[row])
+        result['description'] = self.descriptions[row]
+        return result
+
+    def get_by_fdc_id(self, fdc_id: int) -> Optional[Dict]:
+        """Значения на 100г по fdc_id"""
+        if not self.loaded:
+            return None
+        row = int(np.searchsorted(self.fdc_ids, fdc_id))
+        if row >= len(self.fdc_ids) or self.fdc_ids[row] != fdc_id:
+            return None
+        return self._row_to_dict(row)
+
+    def lookup(self, food_name: str) -> Optional[Dict]:
+        """Значения на 100г по названию продукта (русскому или английскому)"""
+        if not self.loaded or not food_name:
+            return None
+        row = self._row_for_name(food_name)
+        if row is None:
+            return None
+        return self._row_to_dict(row)
+
+
+# Глобальный экземпляр
+local_nutrition = LocalNutritionEngine()
@@ -0,0 +1,189 @@
+"""
+Клетчатка, сахар и натрий в приёмах пищи (таблица meals).
+
+Новые приёмы пищи получают значения при сохранении (/api/meal), старые
+заполняются пакетной задачей: записи meals связываются с продуктом FoodData
+Central по названию, затем значения считаются одной выборкой строк из матрицы
+нутриентов на 100г (NumPy) и записываются пачками UPDATE ... FROM unnest.
+
+Запуск: python -m api.ai_api.meal_nutrients [--overwrite]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from api.ai_api.food_alias import food_aliases
+from api.ai_api.local_nutrition import MACRO_COLUMNS, local_nutrition
+
+logger = logging.getLogger(__name__)
+
+MICRO_FIELDS = ('fiber', 'sugar', 'sodium')
+MICRO_COLUMNS = [MACRO_COLUMNS.index(field) for field in MICRO_FIELDS]
+
+BATCH_SIZE = 50_000
+
+LINK_SQL = """
+    UPDATE meals AS m
+    SET fdc_id = u.fdc_id
+    FROM unnest(CAST(:names AS text[]), CAST(:fdc_ids AS bigint[])) AS u(name, fdc_id)
+    WHERE m.fdc_id IS NULL AND lower(m.food_name) = u.name
+"""
+
+UPDATE_SQL = """
+    UPDATE meals AS m
+    SET fiber = u.fiber, sugar = u.sugar, sodium = u.sodium
+    FROM unnest(
+        CAST(:ids AS int[]), CAST(:fiber AS float8[]), CAST(:sugar AS float8[]), CAST(:sodium AS float8[])
+    ) AS u(id, fiber, sugar, sodium)
+    WHERE m.id = u.id
+"""
+
+
+def link_food(food_name: str, count_hit: bool = True) -> Optional[int]:
+    """fdc_id продукта по названию: выученное соответствие, затем локальный справочник"""
+    if not food_name:
+        return None
+    fdc_id = food_aliases.lookup(food_name, count_hit=count_hit)
+    if fdc_id is not None:
+        return fdc_id
+    per_100g = local_nutrition.lookup(food_name)
+    return per_100g['fdc_id'] if per_100g else None
+
+
+def micronutrients_for(fdc_id: Optional[int], weight_grams: float) -> Optional[Dict]:
+    """Клетчатка, сахар (г) и натрий (мг) на заданный вес по fdc_id"""
+    if fdc_id is None:
+        return None
+    per_100g = local_nutrition.get_by_fdc_id(fdc_id)
+    if not per_100g:
+        return None
+    multiplier = weight_grams / 100
+    return {field: round(per_100g[field] * multiplier, 1) for field in MICRO_FIELDS}
+
+
+def compute_micronutrients(
+    fdc_ids: np.ndarray,
+    matrix: np.ndarray,
+    meal_fdc_ids: np.ndarray,
+    weights: np.ndarray,
+):
+    """
+    Векторный расчёт для пачки приёмов пищи: поиск строк матрицы через
+    searchsorted (fdc_ids отсортированы), выборка строк и умножение на вес.
+    Возвращает (маска найденных продуктов, значения (k, 3)).
+    """
+    if not len(fdc_ids):
+        return np.zeros(len(meal_fdc_ids), dtype=bool), np.empty((0, matrix.shape[1]))
+    rows = np.searchsorted(fdc_ids, meal_fdc_ids)
+    rows = np.minimum(rows, len(fdc_ids) - 1)
+    found = fdc_ids[rows] == meal_fdc_ids
+    values = matrix[rows[found]] * (weights[found] / 100.0)[:, None]
+    return found, np.round(values, 1)
+
+
+async def ensure_meal_columns(conn) -> None:
+    """Колонка meals.fdc_id в уже существующих базах"""
+    await conn.execute(text("ALTER TABLE meals ADD COLUMN IF NOT EXISTS fdc_id BIGINT"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_meals_fdc_id ON meals (fdc_id)"))
+
+
+async def link_meals() -> int:
+    """Связывает записи meals без fdc_id с продуктами по различным названиям"""
+    from database.init_database import engine
+
+    async with engine.begin() as conn:
+        await ensure_meal_columns(conn)
+        result = await conn.execute(text(
+            "SELECT lower(food_name) FROM meals WHERE fdc_id IS NULL GROUP BY lower(food_name)"
+        ))
+        names: List[str] = []
+        fdc_ids: List[int] = []
+        for (name,) in result:
+            fdc_id = link_food(name, count_hit=False)
+            if fdc_id is not None:
+                names.append(name)
+                fdc_ids.append(fdc_id)
+        if not names:
+            return 0
+        linked = await conn.execute(text(LINK_SQL), {'names': names, 'fdc_ids': fdc_ids})
+        return linked.rowcount
+
+
+async def backfill_meal_nutrients(batch_size: int = BATCH_SIZE, overwrite: bool = False) -> Dict[str, int]:
+    """
+    Заполняет клетчатку, сахар и натрий у всех meals, связанных с продуктом.
+    Без overwrite трогает только записи, где все три значения пусты.
+    """
+    from database.init_database import engine
+
+    if not local_nutrition.loaded:
+        raise RuntimeError("Справочник питания не загружен")
+    started = time.perf_counter()
+    linked = await link_meals()
+
+    fdc_ids = np.asarray(local_nutrition.fdc_ids)
+    # Только нужные колонки: при выборке строк копируется втрое меньше данных
+    matrix = np.ascontiguousarray(local_nutrition.macros[:, MICRO_COLUMNS], dtype=np.float64)
+
+    condition = '' if overwrite else (
+        "AND COALESCE(fiber, 0) = 0 AND COALESCE(sugar, 0) = 0 AND COALESCE(sodium, 0) = 0"
+    )
+    scanned = updated = 0
+    async with engine.connect() as read_conn:
+        result = await read_conn.stream(text(
+            f"SELECT id, fdc_id, weight_grams FROM meals WHERE fdc_id IS NOT NULL {condition}"
+        ))
+        async for rows in result.partitions(batch_size):
+            block = np.array(rows, dtype=np.float64)
+            scanned += len(block)
+            ids = block[:, 0].astype(np.int64)
+            found, values = compute_micronutrients(
+                fdc_ids, matrix, block[:, 1].astype(np.int64), np.nan_to_num(block[:, 2]),
+            )
+            if not found.any():
+                continue
+            # Каждая пачка - своя короткая транзакция, чтобы не держать блокировки
+            async with engine.begin() as write_conn:
+                await write_conn.execute(text(UPDATE_SQL), {
+                    'ids': ids[found].tolist(),
+                    'fiber': values[:, 0].tolist(),
+                    'sugar': values[:, 1].tolist(),
+                    'sodium': values[:, 2].tolist(),
+                })
+            updated += int(found.sum())
+            logger.info(f"meals: обработано {scanned:,}, обновлено {updated:,}")
+
+    counts = {'linked': linked, 'scanned': scanned, 'updated': updated}
+    logger.info(f"Клетчатка, сахар и натрий заполнены за {time.perf_counter() - started:.1f} с: {counts}")
+    return counts
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    async def main(args):
+        from api.ai_api.nutrition_snapshot import init_nutrition_reference
+        from database.init_database import engine
+
+        started = time.time()
+        if not await init_nutrition_reference(with_search_index=False):
+            raise SystemExit("❌ Справочник питания не загружен")
+        await food_aliases.load()
+        counts = await backfill_meal_nutrients(args.batch_size, args.overwrite)
+        await engine.dispose()
+        print(
+            f"✅ Связано с продуктами: {counts['linked']:,}, обновлено приёмов пищи: {counts['updated']:,} "
+            f"из {counts['scanned']:,} за {time.time() - started:.1f} с"
+        )
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Заполнение клетчатки, сахара и натрия в meals")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--overwrite', action='store_true', help="Пересчитать и уже заполненные записи")
+    asyncio.run(main(parser.parse_args()))
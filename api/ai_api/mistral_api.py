@@ -0,0 +1,56 @@
+"""
+Клиент Mistral AI, общий для бота и API.
+
+Запросы проходят через llm_scheduler (очередь 'mistral'); без
+MISTRAL_API_KEY провайдер считается не настроенным и llm_router его не
+использует.
+"""
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from mistralai import Mistral
+
+from api.ai_api.llm_scheduler import llm_scheduler
+
+load_dotenv()
+
+api_key = os.getenv('MISTRAL_API_KEY')
+TEXT_MODEL = os.getenv('MISTRAL_TEXT_MODEL', 'codestral-latest')
+MAX_TOKENS = 1600
+
+client = Mistral(api_key=api_key)
+
+
+def is_configured() -> bool:
+    return bool(api_key)
+
+
+async def chat_completion(messages: List[Dict], model: str = TEXT_MODEL, max_tokens: int = MAX_TOKENS,
+                          temperature: float = 0.1, priority: Optional[int] = None) -> Optional[str]:
+    """Ответ Mistral целиком; ошибки SDK (в т.ч. 429) пробрасываются"""
+    chat_response = await llm_scheduler.run('mistral', lambda: client.chat.complete_async(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature
+    ), priority=priority)
+    if not chat_response.choices:
+        return None
+    return chat_response.choices[0].message.content
+
+
+async def stream_completion(messages: List[Dict], model: str = TEXT_MODEL, max_tokens: int = MAX_TOKENS,
+                            priority: Optional[int] = None) -> AsyncIterator[str]:
+    """Потоковый ответ Mistral (SSE): фрагменты текста по мере генерации, слот очереди занят до конца"""
+    async with llm_scheduler.slot('mistral', priority):
+        response = await client.chat.stream_async(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.1
+        )
+        async for event in response:
+            choices = event.data.choices
+            if choices and isinstance(choices[0].delta.content, str):
+                yield choices[0].delta.content
@@ -1,126 +1,395 @@
 import requests
 import os
-from typing import Dict, Optional
-from .gigachat_api import GigaChatAPI
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+from .gigachat_api import GigaChatAPI, gigachat
+from .llm_router import llm_router
+from .llm_scheduler import LLMOverloaded
+from .dish_nutrition import dish_nutrition
+from .food_alias import food_aliases, get_alias_per_100g, get_alias_per_100g_many
+from .local_nutrition import local_nutrition
+from .nutrition_cache import nutrition_cache, normalize_food_key, scale_nutrition, validate_per_100g
+from database.food_macros import find_macros_by_names
+from food_search_helper import is_russian_text, translate_food_name_exact
+from utils.keyword_matcher import KeywordMatcher
+from utils.reference_nutrition import reference_nutrition
+
+# Базовые переводы для частых продуктов
+BASE_TRANSLATIONS = {
+    'яблоко': 'apple',
+    'банан': 'banana',
+    'хлеб': 'bread',
+    'молоко': 'milk',
+    'мясо': 'meat',
+    'курица': 'chicken',
+    'рыба': 'fish',
+    'рис': 'rice',
+    'картофель': 'potato',
+    'морковь': 'carrot',
+    'капуста': 'cabbage',
+    'лук': 'onion',
+    'помидор': 'tomato',
+    'огурец': 'cucumber',
+    'сыр': 'cheese',
+    'яйцо': 'egg',
+    'масло': 'oil',
+    'сахар': 'sugar',
+    'соль': 'salt',
+    'вода': 'water',
+    'чай': 'tea',
+    'кофе': 'coffee',
+    'шаурма': 'shawarma',
+    'котлета': 'cutlet',
+    'индейка': 'turkey',
+    'минералка': 'mineral water',
+    'минеральная вода': 'mineral water'
+}
+
+BASE_TRANSLATIONS_MATCHER = KeywordMatcher(BASE_TRANSLATIONS)
 
 class NutritionAPI:
     def __init__(self):
         # Отключаем CalorieNinjas API
         # self.api_key = os.getenv('CALORIE_NINJAS_API_KEY')
         # self.base_url = "https://api.calorieninjas.com/v1/nutrition"
-        self.gigachat = GigaChatAPI()
+        self.gigachat = gigachat
     
     async def get_nutrition_data(self, food_name: str, weight_grams: float = 100) -> Dict:
         """
-        Получает данные о калорийности продукта через GigaChat.
+        Получает данные о калорийности продукта.
+        Сначала выученные соответствия названий, блюда по рецептам, затем
+        локальный справочник FoodData Central, GigaChat - только при промахе.
         """
-        # Используем только GigaChat
+        alias_data = await self.get_alias_nutrition(food_name, weight_grams)
+        if alias_data:
+            return alias_data
+        dish_data = self.get_dish_nutrition(food_name, weight_grams)
+        if dish_data:
+            return dish_data
+        local_data = self.get_local_nutrition(food_name, weight_grams)
+        if local_data:
+            food_aliases.remember(food_name, local_data['fdc_id'], 'local')
+            return local_data
+        # Справочник не загружен в память этого процесса - спрашиваем food_macros
+        if not local_nutrition.loaded:
+            macros = (await self.get_database_per_100g([food_name]))[0]
+            if macros:
+                food_aliases.remember(food_name, macros['fdc_id'], 'database')
+                return self._scale_database(food_name, macros, weight_grams)
         return await self.get_nutrition_from_gigachat(food_name, weight_grams)
     
+    @staticmethod
+    def get_dish_nutrition(food_name: str, weight_grams: float) -> Optional[Dict]:
+        """
+        Составное блюдо по локальному рецепту (api/ai_api/dish_nutrition.py)
+        """
+        per_100g = dish_nutrition.get(food_name)
+        if not per_100g:
+            return None
+        result = scale_nutrition(per_100g, weight_grams)
+        result.update({
+            'food_name': food_name,
+            'food_name_en': food_name,
+            'weight_grams': weight_grams,
+            'source': 'recipe'
+        })
+        return result
+    
+    async def get_alias_nutrition(self, food_name: str, weight_grams: float) -> Optional[Dict]:
+        """
+        Продукт по выученному соответствию название -> fdc_id (api/ai_api/food_alias.py)
+        """
+        per_100g = await get_alias_per_100g(food_name)
+        if not per_100g:
+            return None
+        macros = dict(per_100g, kcal=per_100g['calories'])
+        return self._scale_database(food_name, macros, weight_grams)
+    
+    def get_local_nutrition(self, food_name: str, weight_grams: float) -> Optional[Dict]:
+        """
+        Ищет продукт в локальном справочнике FoodData Central
+        """
+        per_100g = local_nutrition.lookup(food_name)
+        if not per_100g:
+            return None
+        
+        result = scale_nutrition(per_100g, weight_grams)
+        result.update({
+            'food_name': food_name,
+            'food_name_en': per_100g['description'],
+            'weight_grams': weight_grams,
+            'fdc_id': per_100g['fdc_id'],
+            'source': 'fooddata_central'
+        })
+        return result
+    
+    async def get_database_per_100g(self, food_names: List[str]) -> List[Optional[Dict]]:
+        """
+        Ищет продукты в таблице food_macros одним запросом.
+        Возвращает значения на 100г в порядке food_names (None для ненайденных).
+        Русские названия без точного перевода не ищутся: вхождение слова
+        дало бы чужой продукт, их определяет LLM.
+        """
+        names_en = [
+            (translate_food_name_exact(name) or '') if is_russian_text(name) else name
+            for name in food_names
+        ]
+        try:
+            return await find_macros_by_names(names_en)
+        except Exception as e:
+            print(f"Ошибка запроса к food_macros: {e}")
+            return [None] * len(food_names)
+    
+    @staticmethod
+    def _scale_database(food_name: str, macros: Dict, weight_grams: float) -> Dict:
+        result = scale_nutrition(dict(macros, calories=macros['kcal']), weight_grams)
+        result.update({
+            'food_name': food_name,
+            'food_name_en': macros['description'],
+            'weight_grams': weight_grams,
+            'fdc_id': macros['fdc_id'],
+            'source': 'fooddata_central'
+        })
+        return result
+    
     async def get_nutrition_from_gigachat(self, food_name: str, weight_grams: float) -> Dict:
         """
-        Получает данные о калорийности через GigaChat
+        Получает данные о калорийности через GigaChat (через общий кэш значений на 100г)
+        """
+        per_100g = await nutrition_cache.get_or_resolve(food_name, self.request_gigachat_per_100g)
+        if per_100g:
+            self.remember_llm_alias(food_name, per_100g)
+            return self._scale_gigachat(food_name, per_100g, weight_grams)
+        
+        # Возвращаем базовые данные если ничего не сработало
+        return await self.get_fallback_nutrition(food_name, weight_grams)
+    
+    @staticmethod
+    def remember_llm_alias(food_name: str, per_100g: Dict) -> None:
+        """
+        Запоминает соответствие по английскому названию от LLM, если оно есть
+        в локальном справочнике: в следующий раз LLM не понадобится
+        """
+        name_en = per_100g.get('food_name_en')
+        if not name_en or name_en == food_name:
+            return
+        found = local_nutrition.lookup(name_en)
+        if found:
+            food_aliases.remember(food_name, found['fdc_id'], 'llm')
+    
+    @staticmethod
+    def _scale_gigachat(food_name: str, per_100g: Dict, weight_grams: float) -> Dict:
+        result = scale_nutrition(per_100g, weight_grams)
+        result.update({
+            'food_name': food_name,
+            'food_name_en': per_100g.get('food_name_en', food_name),
+            'weight_grams': weight_grams,
+            'source': 'gigachat'
+        })
+        return result
+    
+    @staticmethod
+    def parse_per_100g(nutrition_data: Dict) -> Optional[Dict]:
+        """
+        Проверяет ответ LLM со значениями на 100г; None, если данные неразумные.
+        Та же проверка применяется к любому значению перед записью в кэш.
+        """
+        return validate_per_100g(nutrition_data)
+    
+    async def get_nutrition_batch(self, items: List[Tuple[str, float]]) -> List[Dict]:
+        """
+        Получает данные о калорийности для нескольких продуктов (food_name, weight_grams) сразу.
+        Выученные соответствия и кэш читаются пачкой (один запрос к food_macros
+        и один MGET в Redis), локальный справочник отвечает из памяти, промахи
+        ищутся в food_macros одним запросом, оставшиеся уходят в GigaChat одним
+        запросом. Порядок результатов совпадает с порядком items.
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        misses: Dict[str, List[int]] = {}
+        
+        aliases = await get_alias_per_100g_many([food_name for food_name, _ in items])
+        pending: List[int] = []
+        for i, ((food_name, weight_grams), per_100g) in enumerate(zip(items, aliases)):
+            if per_100g:
+                results[i] = self._scale_database(food_name, dict(per_100g, kcal=per_100g['calories']), weight_grams)
+                continue
+            dish_data = self.get_dish_nutrition(food_name, weight_grams)
+            if dish_data:
+                results[i] = dish_data
+                continue
+            local_data = self.get_local_nutrition(food_name, weight_grams)
+            if local_data:
+                food_aliases.remember(food_name, local_data['fdc_id'], 'local')
+                results[i] = local_data
+                continue
+            pending.append(i)
+        
+        cached_many = await nutrition_cache.get_many([items[i][0] for i in pending]) if pending else {}
+        for i in pending:
+            food_name, weight_grams = items[i]
+            cached = cached_many.get(food_name)
+            if cached is None:
+                misses.setdefault(normalize_food_key(food_name), []).append(i)
+                continue
+            
+            per_100g, is_fresh = cached
+            if per_100g is None:
+                results[i] = await self.get_fallback_nutrition(food_name, weight_grams)
+                continue
+            if not is_fresh:
+                nutrition_cache.refresh_in_background(food_name, self.request_gigachat_per_100g)
+            results[i] = self._scale_gigachat(food_name, per_100g, weight_grams)
+        
+        # Промахи кэша ищем в food_macros одним индексным запросом
+        if misses:
+            keys = list(misses)
+            found = await self.get_database_per_100g([items[misses[key][0]][0] for key in keys])
+            for key, macros in zip(keys, found):
+                if not macros:
+                    continue
+                food_aliases.remember(items[misses[key][0]][0], macros['fdc_id'], 'database')
+                for i in misses.pop(key):
+                    name, weight_grams = items[i]
+                    results[i] = self._scale_database(name, macros, weight_grams)
+        
+        if misses:
+            names = [items[indexes[0]][0] for indexes in misses.values()]
+            try:
+                resolved = await self.request_gigachat_batch_per_100g(names)
+                overloaded = False
+            except LLMOverloaded:
+                # Перегрузку LLM не кэшируем: продукты определятся при следующем запросе
+                resolved = [None] * len(names)
+                overloaded = True
+            for food_name, indexes, per_100g in zip(names, misses.values(), resolved):
+                if not overloaded:
+                    await nutrition_cache.set(food_name, per_100g)
+                if per_100g:
+                    self.remember_llm_alias(food_name, per_100g)
+                for i in indexes:
+                    name, weight_grams = items[i]
+                    if per_100g:
+                        results[i] = self._scale_gigachat(name, per_100g, weight_grams)
+                    else:
+                        results[i] = await self.get_fallback_nutrition(name, weight_grams)
+        
+        return results
+    
+    async def request_gigachat_batch_per_100g(self, food_names: List[str]) -> List[Optional[Dict]]:
+        """
+        Один запрос к GigaChat на список продуктов.
+        Возвращает значения на 100г в том же порядке (None для неразобранных позиций).
+        """
+        if len(food_names) == 1:
+            return [await self.request_gigachat_per_100g(food_names[0])]
+        
+        resolved: List[Optional[Dict]] = [None] * len(food_names)
+        products = "\n".join(f"{i + 1}. {name}" for i, name in enumerate(food_names))
+        try:
+            prompt = f"""
+            Определи калорийность, БЖУ, клетчатку, сахар и натрий на 100 грамм для каждого продукта из списка:
+            {products}
+            
+            Ответь JSON-массивом в том же порядке, по одному объекту на продукт:
+            [
+                {{
+                    "index": номер_продукта,
+                    "name_en": "название_на_английском",
+                    "calories": число_калорий,
+                    "protein": граммы_белка,
+                    "fat": граммы_жира,
+                    "carbs": граммы_углеводов,
+                    "fiber": граммы_клетчатки,
+                    "sugar": граммы_сахара,
+                    "sodium": миллиграммы_натрия
+                }}
+            ]
+            
+            Отвечай только JSON, без дополнительного текста.
+            """
+            
+            response = await llm_router.complete('nutrition', GigaChatAPI.build_messages(prompt))
+            json_match = re.search(r'\[.*\]', response or '', re.DOTALL)
+            if not json_match:
+                return resolved
+            
+            for position, nutrition_data in enumerate(json.loads(json_match.group())):
+                if not isinstance(nutrition_data, dict):
+                    continue
+                # Опираемся на index из ответа, если он есть, иначе на позицию
+                try:
+                    i = int(nutrition_data.get('index', position + 1)) - 1
+                except (TypeError, ValueError):
+                    i = position
+                if not 0 <= i < len(food_names) or resolved[i] is not None:
+                    continue
+                per_100g = self.parse_per_100g(nutrition_data)
+                if per_100g:
+                    per_100g['food_name_en'] = nutrition_data.get('name_en') or food_names[i]
+                    resolved[i] = per_100g
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            print(f"Ошибка GigaChat batch nutrition: {e}")
+        
+        return resolved
+    
+    async def request_gigachat_per_100g(self, food_name: str) -> Optional[Dict]:
+        """
+        Запрашивает у GigaChat калорийность и БЖУ на 100г.
+        Возвращает None, если ответ не удалось разобрать.
         """
         try:
             prompt = f"""
-            Определи калорийность и БЖУ для продукта: {food_name} весом {weight_grams} грамм.
+            Определи калорийность, БЖУ, клетчатку, сахар и натрий для продукта: {food_name} на 100 грамм.
             
             Ответь в формате JSON:
             {{
                 "calories": число_калорий,
                 "protein": граммы_белка,
                 "fat": граммы_жира,
-                "carbs": граммы_углеводов
+                "carbs": граммы_углеводов,
+                "fiber": граммы_клетчатки,
+                "sugar": граммы_сахара,
+                "sodium": миллиграммы_натрия
             }}
             
             Отвечай только JSON, без дополнительного текста.
             """
             
-            response = await self.gigachat.simple_completion(prompt)
-            
-            # Пытаемся извлечь JSON из ответа
-            import json
-            import re
+            response = await llm_router.complete('nutrition', GigaChatAPI.build_messages(prompt))
+            if not response:
+                return None
             
             # Ищем JSON в ответе
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
-                json_str = json_match.group()
-                nutrition_data = json.loads(json_str)
-                
-                # Проверяем валидность данных
-                calories = float(nutrition_data.get('calories', 0))
-                protein = float(nutrition_data.get('protein', 0))
-                fat = float(nutrition_data.get('fat', 0))
-                carbs = float(nutrition_data.get('carbs', 0))
-                
-                # Проверяем, что данные разумные
-                if calories > 0 and calories < 10000 and protein >= 0 and fat >= 0 and carbs >= 0:
-                    return {
-                        'food_name': food_name,
-                        'food_name_en': await self.translate_to_english(food_name),
-                        'weight_grams': weight_grams,
-                        'calories': calories,
-                        'protein': protein,
-                        'fat': fat,
-                        'carbs': carbs,
-                        'source': 'gigachat'
-                    }
+                per_100g = self.parse_per_100g(json.loads(json_match.group()))
+                if per_100g:
+                    per_100g['food_name_en'] = await self.translate_to_english(food_name)
+                    return per_100g
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"Ошибка GigaChat nutrition: {e}")
-        
-        # Возвращаем базовые данные если ничего не сработало
-        return await self.get_fallback_nutrition(food_name, weight_grams)
+        return None
     
     async def get_fallback_nutrition(self, food_name: str, weight_grams: float) -> Dict:
         """
         Возвращает базовые данные о питании для популярных продуктов
         """
-        # Базовые данные для популярных продуктов (на 100г)
-        base_nutrition = {
-            'яблоко': {'calories': 52, 'protein': 0.3, 'fat': 0.2, 'carbs': 14},
-            'банан': {'calories': 89, 'protein': 1.1, 'fat': 0.3, 'carbs': 23},
-            'хлеб': {'calories': 265, 'protein': 9, 'fat': 3.2, 'carbs': 49},
-            'молоко': {'calories': 42, 'protein': 3.4, 'fat': 1, 'carbs': 5},
-            'курица': {'calories': 165, 'protein': 31, 'fat': 3.6, 'carbs': 0},
-            'рис': {'calories': 130, 'protein': 2.7, 'fat': 0.3, 'carbs': 28},
-            'картофель': {'calories': 77, 'protein': 2, 'fat': 0.1, 'carbs': 17},
-            'морковь': {'calories': 41, 'protein': 0.9, 'fat': 0.2, 'carbs': 10},
-            'капуста': {'calories': 25, 'protein': 1.3, 'fat': 0.1, 'carbs': 6},
-            'лук': {'calories': 40, 'protein': 1.1, 'fat': 0.1, 'carbs': 9},
-            'помидор': {'calories': 18, 'protein': 0.9, 'fat': 0.2, 'carbs': 4},
-            'огурец': {'calories': 16, 'protein': 0.7, 'fat': 0.1, 'carbs': 4},
-            'сыр': {'calories': 113, 'protein': 25, 'fat': 0.3, 'carbs': 1.3},
-            'яйцо': {'calories': 155, 'protein': 13, 'fat': 11, 'carbs': 1.1},
-            'масло': {'calories': 717, 'protein': 0.9, 'fat': 81, 'carbs': 0.1},
-            'сахар': {'calories': 387, 'protein': 0, 'fat': 0, 'carbs': 100},
-            'соль': {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0},
-            'вода': {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0},
-            'чай': {'calories': 1, 'protein': 0, 'fat': 0, 'carbs': 0.2},
-            'кофе': {'calories': 2, 'protein': 0.3, 'fat': 0, 'carbs': 0},
-            'шаурма': {'calories': 250, 'protein': 15, 'fat': 12, 'carbs': 25},
-            'котлета': {'calories': 200, 'protein': 20, 'fat': 12, 'carbs': 5},
-            'индейка': {'calories': 135, 'protein': 29, 'fat': 1.7, 'carbs': 0},
-            'минералка': {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0},
-            'минеральная вода': {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0}
-        }
-        
-        # Ищем продукт в базовых данных
-        food_name_lower = food_name.lower()
-        for product, nutrition in base_nutrition.items():
-            if product in food_name_lower:
-                # Пересчитываем на нужный вес
-                multiplier = weight_grams / 100
-                return {
-                    'food_name': food_name,
-                    'food_name_en': food_name,
-                    'weight_grams': weight_grams,
-                    'calories': round(nutrition['calories'] * multiplier, 1),
-                    'protein': round(nutrition['protein'] * multiplier, 1),
-                    'fat': round(nutrition['fat'] * multiplier, 1),
-                    'carbs': round(nutrition['carbs'] * multiplier, 1),
-                    'source': 'fallback_database'
-                }
+        # Ищем самое специфичное вхождение продукта в общем справочнике
+        food = reference_nutrition.match(food_name)
+        if food:
+            result = food.scale(weight_grams)
+            result.update({
+                'food_name': food_name,
+                'food_name_en': food_name,
+                'weight_grams': weight_grams,
+                'source': 'fallback_database'
+            })
+            return result
         
         # Если продукт не найден, возвращаем примерные данные
         # Предполагаем, что это обычная еда с умеренной калорийностью
@@ -144,49 +413,17 @@ class NutritionAPI:
             if text.isascii():
                 return text
             
+            # Проверяем базовые переводы до обращения к GigaChat
+            translation = BASE_TRANSLATIONS_MATCHER.get(text)
+            if translation:
+                return translation
+            
             # Используем GigaChat для перевода
             prompt = f"Переведи на английский язык название продукта: {text}. Ответь только переводом, без дополнительного текста."
-            translation = await self.gigachat.simple_completion(prompt)
+            translation = await llm_router.complete('nutrition', GigaChatAPI.build_messages(prompt))
             
             # Очищаем перевод от лишнего текста
-            translation = translation.strip().lower()
-            
-            # Базовые переводы для частых продуктов
-            translations = {
-                'яблоко': 'apple',
-                'банан': 'banana',
-                'хлеб': 'bread',
-                'молоко': 'milk',
-                'мясо': 'meat',
-                'курица': 'chicken',
-                'рыба': 'fish',
-                'рис': 'rice',
-                'картофель': 'potato',
-                'морковь': 'carrot',
-                'капуста': 'cabbage',
-                'лук': 'onion',
-                'помидор': 'tomato',
-                'огурец': 'cucumber',
-                'сыр': 'cheese',
-                'яйцо': 'egg',
-                'масло': 'oil',
-                'сахар': 'sugar',
-                'соль': 'salt',
-                'вода': 'water',
-                'чай': 'tea',
-                'кофе': 'coffee',
-                'шаурма': 'shawarma',
-                'котлета': 'cutlet',
-                'индейка': 'turkey',
-                'минералка': 'mineral water',
-                'минеральная вода': 'mineral water'
-            }
-            
-            # Проверяем базовые переводы
-            text_lower = text.lower()
-            for ru, en in translations.items():
-                if ru in text_lower:
-                    return en
+            translation = (translation or '').strip().lower()
             
             return translation if translation else text
             
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from api.ai_api.llm_scheduler import PRIORITY_BACKGROUND, LLMOverloaded, llm_priority
+from utils.food_normalizer import normalize_food_name
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# v3: способ приготовления распознаётся только по прилагательным (food_normalizer)
+CACHE_PREFIX = 'nutrition:v3:'
+
+# Сколько значение считается свежим, и сколько ещё его можно отдавать
+# устаревшим, параллельно обновляя в фоне (stale-while-revalidate)
+FRESH_TTL = int(os.getenv('NUTRITION_CACHE_FRESH_TTL', 7 * 24 * 3600))
+STALE_TTL = int(os.getenv('NUTRITION_CACHE_STALE_TTL', 30 * 24 * 3600))
+# Негативный кэш для нераспознанных и неудачных ответов LLM
+NEGATIVE_TTL = int(os.getenv('NUTRITION_CACHE_NEGATIVE_TTL', 300))
+LOCAL_MAX_ITEMS = int(os.getenv('NUTRITION_CACHE_LOCAL_SIZE', 5000))
+# Предельное время одного определения продукта (общего для всех ожидающих)
+RESOLVE_TIMEOUT = float(os.getenv('NUTRITION_RESOLVE_TIMEOUT', 20))
+
+# После ошибки Redis не трогаем его это время, чтобы не тормозить запросы
+REDIS_RETRY_DELAY = 30
+
+NUTRIENT_FIELDS = ('calories', 'protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')
+
+Resolver = Callable[[str], Awaitable[Optional[Dict]]]
+
+
+def normalize_food_key(food_name: str) -> str:
+    """
+    Ключ кэша: нормальные формы слов без учёта порядка и регистра плюс способ
+    приготовления, так что "Гречка варёная" и "вареная гречка" - одна запись
+    """
+    return normalize_food_name(food_name) or ' '.join(food_name.lower().replace('ё', 'е').split())
+
+
+def validate_per_100g(nutrition_data: Optional[Dict]) -> Optional[Dict]:
+    """
+    Проверяет значения на 100г от LLM перед кэшированием; None, если данные
+    неразумные (на 100г не бывает больше ~900 ккал). Клетчатка, сахар и натрий
+    необязательны: неразобранные считаются нулём, отсутствующие не добавляются.
+    """
+    if not isinstance(nutrition_data, dict):
+        return None
+    try:
+        calories = float(nutrition_data.get('calories', 0))
+        protein = float(nutrition_data.get('protein', 0))
+        fat = float(nutrition_data.get('fat', 0))
+        carbs = float(nutrition_data.get('carbs', 0))
+    except (TypeError, ValueError):
+        return None
+
+    if not (0 < calories < 1000 and protein >= 0 and fat >= 0 and carbs >= 0):
+        return None
+    per_100g = {'calories': calories, 'protein': protein, 'fat': fat, 'carbs': carbs}
+    for field in ('fiber', 'sugar', 'sodium'):
+        if field not in nutrition_data:
+            continue
+        try:
+            value = float(nutrition_data.get(field) or 0)
+        except (TypeError, ValueError):
+            value = 0.0
+        per_100g[field] = value if value >= 0 else 0.0
+    if isinstance(nutrition_data.get('food_name_en'), str):
+        per_100g['food_name_en'] = nutrition_data['food_name_en']
+    return per_100g
+
+
+def scale_nutrition(per_100g: Dict, weight_grams: float) -> Dict:
+    """Пересчитывает значения на 100г на заданный вес (отсутствующие поля = 0)"""
+    multiplier = weight_grams / 100
+    return {
+        field: round((per_100g.get(field) or 0) * multiplier, 1)
+        for field in NUTRIENT_FIELDS
+    }
+
+
+class NutritionCache:
+    """
+    Двухуровневый кэш пищевой ценности (значения на 100г).
+
+    Первый уровень - ограниченный LRU в памяти процесса, второй - Redis,
+    общий для бота и всех воркеров API. Неудачные ответы кэшируются
+    отдельно на короткое время, устаревшие значения отдаются сразу,
+    а обновляются в фоне.
+    """
+
+    def __init__(self, redis_url: str = REDIS_URL, max_items: int = LOCAL_MAX_ITEMS):
+        self.redis_url = redis_url
+        self.max_items = max_items
+        # key -> (значение или None для негативной записи, свежо_до, хранить_до)
+        self._local: "OrderedDict[str, Tuple[Optional[Dict], float, float]]" = OrderedDict()
+        self._redis = None
+        self._redis_disabled_until = 0.0
+        self._refreshing = set()
+        self._background = set()
+        self._flights = SingleFlight()
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'stale_hits': 0, 'negative_hits': 0}
+
+    def _get_redis(self):
+        if time.monotonic() < self._redis_disabled_until:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=1,
+                    socket_timeout=1,
+                )
+            except Exception as e:
+                self._disable_redis(e)
+                return None
+        return self._redis
+
+    def _disable_redis(self, error: Exception) -> None:
+        logger.warning(f"Redis недоступен для кэша питания, работаем только с памятью: {error}")
+        self._redis_disabled_until = time.monotonic() + REDIS_RETRY_DELAY
+
+    def _remember(self, key: str, value: Optional[Dict], fresh_until: float, keep_until: float) -> None:
+        self._local[key] = (value, fresh_until, keep_until)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+
+    @staticmethod
+    def _parse_payload(raw) -> Optional[Tuple[Optional[Dict], float, float]]:
+        """
+        (значение, свежее до, хранить до) из записи Redis или None, если запись
+        повреждена: не JSON-объект, без числовых сроков или с неразумным значением
+        """
+        if raw is None:
+            return None
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+        fresh_until, keep_until = payload.get('fresh'), payload.get('keep')
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (fresh_until, keep_until)):
+            return None
+        value = payload.get('v')
+        if value is not None:
+            # Та же проверка, что и перед записью в кэш
+            value = validate_per_100g(value)
+            if value is None:
+                return None
+        return value, float(fresh_until), float(keep_until)
+
+    async def get(self, food_name: str) -> Optional[Tuple[Optional[Dict], bool]]:
+        """
+        Ищет запись в кэше.
+        Возвращает (значение, свежее ли) или None при промахе.
+        Значение None означает негативную запись.
+        """
+        key = normalize_food_key(food_name)
+        now = time.time()
+
+        entry = self._local.get(key)
+        if entry is not None:
+            value, fresh_until, keep_until = entry
+            if now < keep_until:
+                self._local.move_to_end(key)
+                self.stats['local_hits'] += 1
+                return value, now < fresh_until
+            del self._local[key]
+
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return None
+        try:
+            raw = await redis_client.get(CACHE_PREFIX + key)
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+        entry = self._parse_payload(raw)
+        if entry is None:
+            return None
+        value, fresh_until, keep_until = entry
+        self._remember(key, value, fresh_until, keep_until)
+        self.stats['redis_hits'] += 1
+        return value, now < fresh_until
+
+    async def get_many(self, food_names: List[str]) -> Dict[str, Tuple[Optional[Dict], bool]]:
+        """
+        Поиск нескольких записей: память процесса, затем один MGET в Redis.
+        Возвращает название -> (значение, свежее ли) только для найденных;
+        найденное в Redis попадает в память процесса.
+        """
+        now = time.time()
+        found: Dict[str, Tuple[Optional[Dict], bool]] = {}
+        remote: Dict[str, List[str]] = {}
+        for food_name in food_names:
+            key = normalize_food_key(food_name)
+            entry = self._local.get(key)
+            if entry is not None and now < entry[2]:
+                found[food_name] = (entry[0], now < entry[1])
+            else:
+                remote.setdefault(key, []).append(food_name)
+
+        redis_client = self._get_redis() if remote else None
+        if redis_client is None:
+            return found
+        try:
+            raws = await redis_client.mget([CACHE_PREFIX + key for key in remote])
+        except Exception as e:
+            self._disable_redis(e)
+            return found
+        for (key, names), raw in zip(remote.items(), raws):
+            entry = self._parse_payload(raw)
+            if entry is None:
+                continue
+            value, fresh_until, keep_until = entry
+            self._remember(key, value, fresh_until, keep_until)
+            self.stats['redis_hits'] += 1
+            for food_name in names:
+                found[food_name] = (value, now < fresh_until)
+        return found
+
+    async def set(self, food_name: str, per_100g: Optional[Dict]) -> Optional[Dict]:
+        """
+        Сохраняет значение на 100г; None - негативная запись. Неразумное значение
+        (validate_per_100g) сохраняется как негативная запись. Возвращает сохранённое.
+        """
+        key = normalize_food_key(food_name)
+        per_100g = validate_per_100g(per_100g)
+        now = time.time()
+        if per_100g is None:
+            fresh_until = keep_until = now + NEGATIVE_TTL
+        else:
+            fresh_until, keep_until = now + FRESH_TTL, now + STALE_TTL
+        self._remember(key, per_100g, fresh_until, keep_until)
+
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return per_100g
+        payload = json.dumps({'v': per_100g, 'fresh': fresh_until, 'keep': keep_until}, ensure_ascii=False)
+        try:
+            await redis_client.set(CACHE_PREFIX + key, payload, ex=max(1, int(keep_until - now)))
+        except Exception as e:
+            self._disable_redis(e)
+        return per_100g
+
+    async def invalidate(self, food_name: str) -> None:
+        """Удаляет запись из обоих уровней"""
+        key = normalize_food_key(food_name)
+        self._local.pop(key, None)
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return
+        try:
+            await redis_client.delete(CACHE_PREFIX + key)
+        except Exception as e:
+            self._disable_redis(e)
+
+    async def _resolve_and_store(self, food_name: str, resolver: Resolver) -> Optional[Dict]:
+        try:
+            per_100g = await resolver(food_name)
+        except LLMOverloaded:
+            # Очередь к LLM переполнена - это не повод кэшировать отсутствие значения
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка получения пищевой ценности для '{food_name}': {e}")
+            per_100g = None
+        return await self.set(food_name, per_100g)
+
+    def refresh_in_background(self, food_name: str, resolver: Resolver) -> None:
+        key = normalize_food_key(food_name)
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                with llm_priority(PRIORITY_BACKGROUND):
+                    per_100g = validate_per_100g(await resolver(food_name))
+                # Неудачное обновление не затирает устаревшее, но рабочее значение
+                if per_100g is not None:
+                    await self.set(food_name, per_100g)
+            except Exception as e:
+                logger.warning(f"Фоновое обновление кэша для '{food_name}' не удалось: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        self._refreshing.add(key)
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_resolve(self, food_name: str, resolver: Resolver) -> Optional[Dict]:
+        """
+        Значение на 100г из кэша или через resolver.
+        Возвращает None, если продукт не удалось определить (в т.ч. из негативного кэша).
+        Одновременные промахи по одному ключу объединяются в один вызов resolver.
+        """
+        cached = await self.get(food_name)
+        if cached is not None:
+            value, is_fresh = cached
+            if value is None:
+                self.stats['negative_hits'] += 1
+                return None
+            if not is_fresh:
+                self.stats['stale_hits'] += 1
+                self.refresh_in_background(food_name, resolver)
+            return value
+
+        # Одновременные промахи по одному ключу ждут один общий запрос к LLM
+        self.stats['misses'] += 1
+        try:
+            return await self._flights.do(
+                normalize_food_key(food_name),
+                lambda: self._resolve_and_store(food_name, resolver),
+                timeout=RESOLVE_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Превышено время определения продукта '{food_name}'")
+            return None
+
+
+# Глобальный экземпляр
+nutrition_cache = NutritionCache()
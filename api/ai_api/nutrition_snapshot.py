@@ -0,0 +1,322 @@
+"""
+Офлайн-снимок справочника питания для старта без обращения к БД.
+
+Снимок - папка с .npy-массивами (fdc_id, матрица БЖУ, индекс названий,
+триграммный поисковый индекс) и таблицами строк (байты UTF-8 + смещения)
+плюс manifest.json с версией формата и релизом FoodData Central.
+Процессы открывают массивы через np.load(mmap_mode='r'): страницы файла
+общие в page cache, поэтому воркеры uvicorn и бот делят одну копию данных.
+
+Сборка: python -m api.ai_api.nutrition_snapshot
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_SNAPSHOT_DIR = os.getenv('NUTRITION_SNAPSHOT_DIR', 'data/nutrition_snapshot')
+# 2: в матрице нутриентов добавлены клетчатка, сахар и натрий
+SNAPSHOT_FORMAT = 2
+# Файл с именем текущей версии; подменяется атомарно через os.replace
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+# Сколько предыдущих версий оставлять при сборке новой
+KEEP_VERSIONS = 2
+# Проверка релиза в БД не должна задерживать старт, если БД недоступна
+RELEASE_CHECK_TIMEOUT = 5.0
+
+LATEST_RELEASE_SQL = "SELECT release FROM food_release ORDER BY applied_at DESC, id DESC LIMIT 1"
+
+
+class StringTable:
+    """
+    Неизменяемый список строк в двух массивах: байты UTF-8 подряд и смещения.
+    Работает поверх mmap без распаковки в объекты Python.
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> 'StringTable':
+        encoded = [value.encode('utf-8') for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, index: int) -> bytes:
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        return self.raw(index).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.raw(index).decode('utf-8')
+
+
+class SortedKeyIndex:
+    """
+    Словарь строка -> значение поверх отсортированной StringTable.
+    Поиск - бинарный по байтам UTF-8, values - любой массив с той же длиной.
+    """
+
+    __slots__ = ('keys', 'values')
+
+    def __init__(self, keys: StringTable, values: np.ndarray):
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[str, object], dtype) -> 'SortedKeyIndex':
+        items = sorted(mapping.items(), key=lambda item: item[0].encode('utf-8'))
+        keys = StringTable.from_strings(key for key, _ in items)
+        values = np.asarray([value for _, value in items], dtype=dtype)
+        return cls(keys, values)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, key: str, default=None):
+        target = key.encode('utf-8')
+        keys = self.keys
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if keys.raw(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(keys) and keys.raw(low) == target:
+            return self.values[low]
+        return default
+
+
+class NutritionSnapshot:
+    """Открытый снимок: манифест и массивы, отображённые в память"""
+
+    def __init__(self, path: str, manifest: Dict, arrays: Dict[str, np.ndarray]):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+
+    @property
+    def release(self) -> Optional[str]:
+        return self.manifest.get('release')
+
+    def strings(self, name: str) -> StringTable:
+        return StringTable(self.arrays[f'{name}.data'], self.arrays[f'{name}.offsets'])
+
+    def key_index(self, name: str, values: str) -> SortedKeyIndex:
+        return SortedKeyIndex(self.strings(name), self.arrays[values])
+
+
+def _save_strings(arrays: Dict[str, np.ndarray], name: str, table: StringTable) -> None:
+    arrays[f'{name}.data'] = table.data
+    arrays[f'{name}.offsets'] = table.offsets
+
+
+def snapshot_arrays(nutrition, search_index) -> Dict[str, np.ndarray]:
+    """Массивы снимка из загруженных справочника и поискового индекса"""
+    arrays = {
+        'fdc_ids': np.asarray(nutrition.fdc_ids, dtype=np.int64),
+        'macros': np.asarray(nutrition.macros, dtype=np.float32),
+        'search_fdc_ids': np.asarray(search_index.fdc_ids, dtype=np.int64),
+        'search_doc_sizes': np.asarray(search_index.doc_sizes, dtype=np.int32),
+        'search_postings': np.asarray(search_index.postings, dtype=np.int32),
+    }
+    _save_strings(arrays, 'descriptions', StringTable.from_strings(nutrition.descriptions))
+    _save_strings(arrays, 'search_names', StringTable.from_strings(search_index.names))
+    _save_strings(arrays, 'search_names_en', StringTable.from_strings(search_index.names_en))
+
+    name_index = SortedKeyIndex.from_dict(dict(nutrition.name_index.items()), np.int32)
+    _save_strings(arrays, 'name_keys', name_index.keys)
+    arrays['name_rows'] = name_index.values
+
+    spans = {key: tuple(span) for key, span in search_index.spans.items()}
+    trigram_index = SortedKeyIndex.from_dict(spans, np.int64)
+    _save_strings(arrays, 'trigram_keys', trigram_index.keys)
+    arrays['trigram_spans'] = trigram_index.values.reshape(-1, 2)
+    return arrays
+
+
+def write_snapshot(arrays: Dict[str, np.ndarray], release: Optional[str], root: str = NUTRITION_SNAPSHOT_DIR) -> str:
+    """
+    Записывает новую версию снимка и переключает на неё CURRENT.
+    Версия пишется во временную папку и переименовывается целиком, поэтому
+    читатели никогда не видят недописанные файлы.
+    """
+    version = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+    target = os.path.join(root, version)
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'release': release,
+        'created_at': datetime.utcnow().isoformat(),
+        'foods': int(len(arrays['fdc_ids'])),
+        'names': int(len(arrays['name_rows'])),
+        'search_documents': int(len(arrays['search_fdc_ids'])),
+        'arrays': sorted(arrays),
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(staging, target)
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+
+    # Старые версии удаляем: уже открытые mmap остаются валидными до закрытия
+    versions = sorted(
+        name for name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, name)) and not name.endswith('.tmp')
+    )
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return target
+
+
+def open_snapshot(root: str = NUTRITION_SNAPSHOT_DIR) -> Optional[NutritionSnapshot]:
+    """Открывает текущую версию снимка через mmap или возвращает None"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f:
+            path = os.path.join(root, f.read().strip())
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        logger.warning(f"Снимок справочника {path} в устаревшем формате {manifest.get('format')}")
+        return None
+
+    try:
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+            for name in manifest['arrays']
+        }
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Ошибка открытия снимка справочника {path}: {e}")
+        return None
+    return NutritionSnapshot(path, manifest, arrays)
+
+
+async def get_latest_release() -> Optional[str]:
+    """Последний применённый релиз FoodData Central (None, если релизов нет)"""
+    from database.init_database import engine
+
+    async with engine.connect() as conn:
+        try:
+            return await conn.scalar(text(LATEST_RELEASE_SQL))
+        except Exception:
+            # Таблицы food_release нет, пока не было ни одного обновления
+            return None
+
+
+async def snapshot_is_fresh(snapshot: NutritionSnapshot) -> bool:
+    """
+    Снимок актуален, если собран из последнего релиза в БД.
+    Если БД недоступна, доверяем снимку: ради этого он и нужен.
+    """
+    try:
+        release = await asyncio.wait_for(get_latest_release(), timeout=RELEASE_CHECK_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Не удалось проверить релиз справочника в БД, используем снимок: {e}")
+        return True
+    if release != snapshot.release:
+        logger.warning(f"Снимок справочника собран из релиза {snapshot.release}, в БД - {release}")
+        return False
+    return True
+
+
+async def init_nutrition_reference(
+    with_search_index: bool = True,
+    db_fallback: bool = True,
+    root: str = NUTRITION_SNAPSHOT_DIR,
+) -> bool:
+    """
+    Загружает справочник (и поисковый индекс) из снимка, а если снимка нет
+    или он устарел - из БД. Устаревший снимок используется, когда БД
+    недоступна. Возвращает True, если справочник загружен.
+    """
+    from api.ai_api.food_search_index import food_search_index, init_food_search_index
+    from api.ai_api.local_nutrition import local_nutrition
+
+    started = time.perf_counter()
+    snapshot = open_snapshot(root)
+    if snapshot is not None and await snapshot_is_fresh(snapshot):
+        local_nutrition.install_snapshot(snapshot)
+        if with_search_index:
+            food_search_index.install_snapshot(snapshot)
+        logger.info(
+            f"Справочник открыт из снимка {snapshot.path}: {len(local_nutrition.fdc_ids):,} продуктов "
+            f"за {time.perf_counter() - started:.2f} с"
+        )
+        return True
+
+    if not db_fallback:
+        return False
+    if await local_nutrition.load():
+        if with_search_index:
+            await init_food_search_index(local_nutrition)
+        return True
+
+    if snapshot is not None:
+        logger.warning(f"Справочник из БД не загружен, используем устаревший снимок {snapshot.path}")
+        local_nutrition.install_snapshot(snapshot)
+        if with_search_index:
+            food_search_index.install_snapshot(snapshot)
+        return True
+    return False
+
+
+async def build_snapshot(root: str = NUTRITION_SNAPSHOT_DIR) -> str:
+    """Загружает справочник из БД, строит поисковый индекс и записывает снимок"""
+    from api.ai_api.food_search_index import FoodSearchIndex
+    from api.ai_api.local_nutrition import local_nutrition
+
+    if not await local_nutrition.load():
+        raise RuntimeError("Справочник не загружен из БД, снимок не собран")
+    search_index = FoodSearchIndex()
+    search_index.build_from_engine(local_nutrition)
+    release = await get_latest_release()
+    return write_snapshot(snapshot_arrays(local_nutrition, search_index), release, root)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    async def main():
+        from database.init_database import engine
+
+        started = time.time()
+        path = await build_snapshot()
+        await engine.dispose()
+        print(f"✅ Снимок справочника записан в {path} за {time.time() - started:.1f} с")
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
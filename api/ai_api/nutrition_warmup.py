@@ -0,0 +1,210 @@
+"""
+Прогрев кэша пищевой ценности при старте API и бота.
+
+Периодическая задача собирает в food_popularity самые частые продукты
+из meals (по нормализованному названию). При старте процесса верхние N
+из них, которых нет в справочниках в памяти, загружаются из Redis одним
+MGET, а оставшиеся определяются через обычный конвейер (пачками, с
+ограничением параллельности). Прогрев ограничен по времени: по истечении
+процесс стартует с тем, что успел получить.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import text
+
+from api.ai_api.dish_nutrition import dish_nutrition
+from api.ai_api.food_alias import food_aliases
+from api.ai_api.llm_scheduler import PRIORITY_BACKGROUND, llm_priority
+from api.ai_api.local_nutrition import local_nutrition
+from api.ai_api.nutrition_cache import nutrition_cache, normalize_food_key
+from utils.reference_nutrition import reference_nutrition
+
+logger = logging.getLogger(__name__)
+
+# Сколько популярных продуктов прогревать и за какое время (0 - без прогрева)
+WARMUP_TOP_N = int(os.getenv('NUTRITION_WARMUP_TOP_N', 300))
+WARMUP_TIMEOUT = float(os.getenv('NUTRITION_WARMUP_TIMEOUT', 20))
+# Одновременных пачек к LLM, чтобы прогрев не занял всю квоту GigaChat
+WARMUP_CONCURRENCY = int(os.getenv('NUTRITION_WARMUP_CONCURRENCY', 2))
+WARMUP_BATCH_SIZE = 20
+
+# Пересчёт food_popularity: окно по дате приёма пищи и размер таблицы
+POPULARITY_INTERVAL = 6 * 3600
+POPULARITY_DAYS = 30
+POPULARITY_LIMIT = 2000
+POPULARITY_LOCK_ID = 715_002
+
+POPULAR_NAMES_SQL = """
+    SELECT lower(food_name) AS name, COUNT(*) AS meals, COUNT(DISTINCT user_id) AS users
+    FROM meals
+    WHERE date >= :since
+    GROUP BY lower(food_name)
+    ORDER BY meals DESC
+    LIMIT :limit
+"""
+
+# Resolver пачки: названия -> значения попадают в nutrition_cache
+BatchResolver = Callable[[List[str]], Awaitable[object]]
+
+
+def aggregate_popularity(rows) -> List[Dict]:
+    """
+    Складывает написания одного продукта ("Гречка", "гречки") по ключу
+    normalize_food_key; название - самое частое написание
+    """
+    popular: Dict[str, Dict] = {}
+    for name, meals, users in rows:
+        key = normalize_food_key(name or '')
+        if not key:
+            continue
+        entry = popular.get(key)
+        if entry is None:
+            popular[key] = {'food_key': key, 'food_name': name, 'meals': meals, 'users': users, 'top': meals}
+            continue
+        entry['meals'] += meals
+        # Число разных пользователей по написаниям - оценка сверху
+        entry['users'] += users
+        if meals > entry['top']:
+            entry['food_name'], entry['top'] = name, meals
+    return sorted(popular.values(), key=lambda entry: entry['meals'], reverse=True)
+
+
+async def refresh_food_popularity(limit: int = POPULARITY_LIMIT) -> int:
+    """
+    Пересчитывает food_popularity одной транзакцией. Возвращает число
+    продуктов или -1, если пересчёт уже выполняет другой процесс.
+    """
+    from database.init_database import FoodPopularity, engine
+
+    started = time.perf_counter()
+    since = (datetime.now() - timedelta(days=POPULARITY_DAYS)).strftime('%Y-%m-%d')
+    async with engine.begin() as conn:
+        locked = await conn.scalar(text("SELECT pg_try_advisory_xact_lock(:lock_id)"), {'lock_id': POPULARITY_LOCK_ID})
+        if not locked:
+            return -1
+        await conn.run_sync(lambda sync_conn: FoodPopularity.__table__.create(sync_conn, checkfirst=True))
+        # Написаний больше, чем продуктов: берём с запасом до объединения
+        result = await conn.execute(text(POPULAR_NAMES_SQL), {'since': since, 'limit': limit * 3})
+        popular = aggregate_popularity(result.fetchall())[:limit]
+
+        await conn.execute(text("DELETE FROM food_popularity"))
+        if popular:
+            await conn.execute(text("""
+                INSERT INTO food_popularity (food_key, food_name, meals, users, updated_at)
+                SELECT *, now() FROM unnest(
+                    CAST(:keys AS text[]), CAST(:names AS text[]), CAST(:meals AS int[]), CAST(:users AS int[])
+                )
+            """), {
+                'keys': [entry['food_key'] for entry in popular],
+                'names': [entry['food_name'] for entry in popular],
+                'meals': [entry['meals'] for entry in popular],
+                'users': [entry['users'] for entry in popular],
+            })
+    logger.info(f"Популярность продуктов пересчитана: {len(popular):,} за {time.perf_counter() - started:.2f} с")
+    return len(popular)
+
+
+async def load_popular_foods(limit: int) -> List[str]:
+    """Верхние limit названий из food_popularity; пустая таблица пересчитывается"""
+    from database.init_database import engine
+
+    for attempt in range(2):
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    text("SELECT food_name FROM food_popularity ORDER BY meals DESC LIMIT :limit"),
+                    {'limit': limit},
+                )
+                names = [name for (name,) in result]
+        except Exception:
+            # Таблицы ещё нет - её создаст пересчёт ниже
+            names = []
+        if names or attempt:
+            return names
+        await refresh_food_popularity()
+    return []
+
+
+def resolved_in_memory(food_name: str) -> bool:
+    """Продукт определяется справочниками в памяти процесса без кэша и LLM"""
+    return bool(
+        food_aliases.lookup(food_name, count_hit=False) is not None
+        or dish_nutrition.get(food_name)
+        or local_nutrition.lookup(food_name)
+        or reference_nutrition.get(food_name)
+    )
+
+
+async def warm_up_nutrition_cache(
+    resolve_batch: BatchResolver,
+    limit: int = WARMUP_TOP_N,
+    timeout: float = WARMUP_TIMEOUT,
+    concurrency: int = WARMUP_CONCURRENCY,
+    batch_size: int = WARMUP_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Прогревает nutrition_cache популярными продуктами. Никогда не бросает
+    исключений и не длится дольше timeout; незавершённые пачки отменяются
+    (уже начатые запросы к LLM сохранят результат в кэш сами).
+    """
+    stats = {'popular': 0, 'in_memory': 0, 'cached': 0, 'resolved': 0, 'skipped': 0}
+    if limit <= 0:
+        return stats
+    started = time.perf_counter()
+    deadline = started + timeout
+
+    async def warm():
+        names = await load_popular_foods(limit)
+        stats['popular'] = len(names)
+        pending = [name for name in names if not resolved_in_memory(name)]
+        stats['in_memory'] = len(names) - len(pending)
+
+        cached = await nutrition_cache.get_many(pending)
+        stats['cached'] = len(cached)
+        pending = [name for name in pending if name not in cached]
+        stats['skipped'] = len(pending)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def resolve(batch: List[str]):
+            async with semaphore:
+                if time.perf_counter() >= deadline:
+                    return
+                try:
+                    await resolve_batch(batch)
+                except Exception as e:
+                    logger.warning(f"Прогрев пачки из {len(batch)} продуктов не удался: {e}")
+                    return
+                stats['resolved'] += len(batch)
+                stats['skipped'] -= len(batch)
+
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        await asyncio.gather(*(resolve(batch) for batch in batches))
+
+    try:
+        # Прогрев не должен занимать очередь к LLM раньше запросов пользователей
+        with llm_priority(PRIORITY_BACKGROUND):
+            await asyncio.wait_for(warm(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Прогрев кэша питания прерван по времени ({timeout:.0f} с)")
+    except Exception as e:
+        logger.error(f"Ошибка прогрева кэша питания: {e}")
+    logger.info(f"Кэш питания прогрет за {time.perf_counter() - started:.1f} с: {stats}")
+    return stats
+
+
+async def food_popularity_task(stop_event: asyncio.Event, interval: float = POPULARITY_INTERVAL) -> None:
+    """Фоновая задача: периодически пересчитывает food_popularity до остановки сервера"""
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            try:
+                await refresh_food_popularity()
+            except Exception as e:
+                logger.error(f"Ошибка пересчёта популярности продуктов: {e}")
@@ -0,0 +1,167 @@
+"""
+Частые продукты пользователя (таблица recent_food) для добавления в одно нажатие.
+
+Строка на пару (пользователь, продукт): значения на 100г, типичная порция
+и частота с затуханием. Обновляется одним UPSERT в той же транзакции, что
+и запись в meals, поэтому повторное добавление не требует поиска продукта.
+
+Частота хранится в логарифмической шкале: score = log2(сумма 2^(t_i / T))
+по всем использованиям, где T - период полураспада. Использование неделю
+назад весит вдвое меньше сегодняшнего (при T = 7 дней), а сравнение
+score разных продуктов не зависит от текущего времени.
+"""
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from api.ai_api.nutrition_cache import NUTRIENT_FIELDS, normalize_food_key
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE_DAYS = float(os.getenv('RECENT_FOODS_HALF_LIFE_DAYS', 7))
+# Сколько продуктов хранить на пользователя и сколько показывать
+MAX_PER_USER = int(os.getenv('RECENT_FOODS_PER_USER', 50))
+DEFAULT_LIMIT = 10
+# Доля нового веса в типичной порции (экспоненциальное сглаживание)
+WEIGHT_SMOOTHING = 0.3
+
+# score хранится в log2: новое = max + log2(1 + 2^-|разница|)
+UPSERT_SQL = f"""
+    INSERT INTO recent_food (user_id, food_key, food_name, fdc_id, {', '.join(NUTRIENT_FIELDS)},
+                             weight_grams, uses, score, last_used_at)
+    VALUES (:user_id, :food_key, :food_name, :fdc_id, {', '.join(':' + field for field in NUTRIENT_FIELDS)},
+            :weight_grams, 1, :score, now())
+    ON CONFLICT (user_id, food_key) DO UPDATE SET
+        food_name = EXCLUDED.food_name,
+        fdc_id = COALESCE(EXCLUDED.fdc_id, recent_food.fdc_id),
+        {', '.join(f'{field} = COALESCE(EXCLUDED.{field}, recent_food.{field})' for field in NUTRIENT_FIELDS)},
+        weight_grams = round(CAST(recent_food.weight_grams * {1 - WEIGHT_SMOOTHING}
+                                  + EXCLUDED.weight_grams * {WEIGHT_SMOOTHING} AS numeric), 0),
+        uses = recent_food.uses + 1,
+        score = GREATEST(recent_food.score, EXCLUDED.score)
+                + ln(1 + exp(-abs(recent_food.score - EXCLUDED.score) * ln(2))) / ln(2),
+        last_used_at = now()
+    RETURNING (xmax = 0) AS inserted
+"""
+
+# Лишние продукты пользователя с наименьшим score
+TRIM_SQL = """
+    DELETE FROM recent_food
+    WHERE id IN (
+        SELECT id FROM recent_food
+        WHERE user_id = :user_id
+        ORDER BY score DESC
+        OFFSET :keep
+    )
+"""
+
+SELECT_SQL = f"""
+    SELECT id, food_name, fdc_id, {', '.join(NUTRIENT_FIELDS)}, weight_grams, uses, last_used_at
+    FROM recent_food
+    WHERE user_id = :user_id {{condition}}
+    ORDER BY score DESC
+    LIMIT :limit
+"""
+
+
+def _now_score() -> float:
+    return time.time() / (HALF_LIFE_DAYS * 24 * 3600)
+
+
+def per_100g_from_meal(nutrition: Dict, weight_grams: float) -> Optional[Dict]:
+    """Значения на 100г из значений на порцию; None для порции без веса или калорий"""
+    if not weight_grams or weight_grams <= 0 or nutrition.get('calories') is None:
+        return None
+    multiplier = 100.0 / weight_grams
+    return {
+        field: round(float(nutrition[field]) * multiplier, 2) if nutrition.get(field) is not None else None
+        for field in NUTRIENT_FIELDS
+    }
+
+
+async def record_recent_food(session, user_id: int, food_name: str, weight_grams: float,
+                             nutrition: Dict, fdc_id: Optional[int] = None) -> None:
+    """
+    Учитывает приём пищи в частых продуктах. Выполняется в транзакции
+    вызывающего (AsyncSession) и фиксируется вместе с записью meals;
+    ошибка откатывает только точку сохранения, но не сам приём пищи.
+    """
+    per_100g = per_100g_from_meal(nutrition, float(weight_grams or 0))
+    food_key = normalize_food_key(food_name or '')
+    if per_100g is None or not food_key or not user_id:
+        return
+    params = {
+        'user_id': user_id,
+        'food_key': food_key,
+        'food_name': food_name,
+        'fdc_id': fdc_id,
+        **per_100g,
+        'weight_grams': float(weight_grams),
+        'score': _now_score(),
+    }
+    try:
+        async with session.begin_nested():
+            result = await session.execute(text(UPSERT_SQL), params)
+            # Обрезаем список только когда добавился новый продукт
+            if result.scalar():
+                await session.execute(text(TRIM_SQL), {'user_id': user_id, 'keep': MAX_PER_USER})
+    except Exception as e:
+        logger.error(f"Ошибка обновления частых продуктов пользователя {user_id}: {e}")
+
+
+def _row_to_dict(row) -> Dict:
+    mapping = row._mapping
+    item = {
+        'id': mapping['id'],
+        'food_name': mapping['food_name'],
+        'fdc_id': mapping['fdc_id'],
+        'weight_grams': float(mapping['weight_grams']),
+        'uses': mapping['uses'],
+        'last_used_at': mapping['last_used_at'].isoformat() if mapping['last_used_at'] else None,
+    }
+    item['per_100g'] = {
+        field: float(mapping[field]) if mapping[field] is not None else None
+        for field in NUTRIENT_FIELDS
+    }
+    return item
+
+
+async def get_recent_foods(user_id: int, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+    """Частые продукты пользователя, самые востребованные первыми"""
+    from database.init_database import engine
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(SELECT_SQL.format(condition='')),
+            {'user_id': user_id, 'limit': limit},
+        )
+        return [_row_to_dict(row) for row in result]
+
+
+async def get_recent_food(user_id: int, recent_id: int) -> Optional[Dict]:
+    """Один частый продукт пользователя по id или None"""
+    from database.init_database import engine
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(SELECT_SQL.format(condition='AND id = :id')),
+            {'user_id': user_id, 'id': recent_id, 'limit': 1},
+        )
+        row = result.first()
+    return _row_to_dict(row) if row is not None else None
+
+
+async def init_recent_foods() -> bool:
+    """Создаёт таблицу recent_food, если её ещё нет"""
+    from database.init_database import RecentFood, engine
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: RecentFood.__table__.create(sync_conn, checkfirst=True))
+    except Exception as e:
+        logger.error(f"Ошибка создания таблицы частых продуктов: {e}")
+        return False
+    return True
@@ -0,0 +1,123 @@
+"""
+Постепенный вывод потокового ответа LLM в сообщение Telegram.
+
+Пока идёт генерация, сообщение-заглушка ("⏳ ...") редактируется накопленным
+текстом без разметки: незакрытые * или ``` в середине ответа ломают Markdown.
+Правки идут не чаще EDIT_INTERVAL и только при заметном приросте текста,
+а на 429 (TelegramRetryAfter) пауза увеличивается, но чтение ответа LLM
+не останавливается. В конце ответ выводится целиком с разметкой; если
+Telegram её не принял - тем же текстом без разметки, а длинный ответ
+разбивается на несколько сообщений.
+"""
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup, Message
+
+logger = logging.getLogger(__name__)
+
+# Telegram ограничивает правки одного чата примерно одной в секунду
+EDIT_INTERVAL = 1.2
+# Не правим сообщение ради пары символов
+MIN_EDIT_CHARS = 30
+MESSAGE_LIMIT = 4096
+CURSOR = ' ▌'
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Делит текст на части не длиннее limit, по возможности по переносам строк"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= limit // 2:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+class StreamingReply:
+    """
+    Ответ LLM, который постепенно проявляется в сообщении-заглушке.
+    consume() читает поток и обновляет заглушку, finish() выводит итоговый текст.
+    """
+
+    def __init__(self, placeholder: Message, preview_header: str = ''):
+        self.placeholder = placeholder
+        self.preview_header = preview_header
+        self.text = ''
+        self._shown = 0
+        # Первый фрагмент показываем сразу - это и есть время до первого ответа
+        self._next_edit_at = 0.0
+        self._previews = True
+
+    async def _edit_preview(self) -> None:
+        preview = f"{self.preview_header}{self.text}{CURSOR}"
+        if len(preview) > MESSAGE_LIMIT:
+            # Дальше ответ не помещается в одно сообщение - ждём итогового вывода
+            self._previews = False
+            return
+        try:
+            await self.placeholder.edit_text(preview, parse_mode=None)
+            self._shown = len(self.text)
+            self._next_edit_at = time.monotonic() + EDIT_INTERVAL
+        except TelegramRetryAfter as e:
+            self._next_edit_at = time.monotonic() + e.retry_after
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                logger.warning(f"Промежуточный вывод ответа остановлен: {e}")
+                self._previews = False
+
+    async def consume(self, chunks: AsyncIterator[str]) -> str:
+        """Читает поток фрагментов, обновляя заглушку; возвращает весь текст"""
+        async for delta in chunks:
+            self.text += delta
+            if (
+                self._previews
+                and time.monotonic() >= self._next_edit_at
+                and len(self.text) - self._shown >= MIN_EDIT_CHARS
+            ):
+                await self._edit_preview()
+        return self.text
+
+    async def _send(self, text: str, parse_mode: Optional[str], reply_markup, edit: bool) -> None:
+        for attempt in range(2):
+            try:
+                if edit:
+                    await self.placeholder.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+                else:
+                    await self.placeholder.answer(text, parse_mode=parse_mode, reply_markup=reply_markup)
+                return
+            except TelegramRetryAfter as e:
+                # Итоговый ответ терять нельзя: ждём, сколько просит Telegram
+                if attempt:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    async def finish(self, text: str, parse_mode: Optional[str] = None, reply_markup=None) -> None:
+        """
+        Итоговый вывод с разметкой. Обычная клавиатура (ReplyKeyboardMarkup)
+        не прикрепляется к правке, поэтому с ней ответ отправляется новым
+        сообщением вместо заглушки.
+        """
+        edit_placeholder = reply_markup is None or isinstance(reply_markup, InlineKeyboardMarkup)
+        if not edit_placeholder:
+            try:
+                await self.placeholder.delete()
+            except TelegramBadRequest:
+                pass
+
+        parts = split_message(text)
+        for i, part in enumerate(parts):
+            markup = reply_markup if i == len(parts) - 1 else None
+            edit = edit_placeholder and i == 0
+            try:
+                await self._send(part, parse_mode, markup, edit)
+            except TelegramBadRequest:
+                # Разметка не разобралась (обрезанный блок кода, лишняя *) - выводим как есть
+                await self._send(part, None, markup, edit)
@@ -10,6 +10,8 @@ import asyncio
 import logging
 from dotenv import load_dotenv
 from api.ai_api.generate_text import translate, generate_text_with_gigachat
+from api.ai_api.nutrition_cache import nutrition_cache, scale_nutrition
+from utils.reference_nutrition import reference_nutrition
 import re
 import json
 import aiohttp
@@ -35,23 +37,6 @@ app.add_middleware(
 
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
-# Кэш для быстрого доступа к данным о продуктах
-NUTRITION_CACHE: Dict[str, Dict] = {}
-
-# База данных продуктов для быстрого fallback
-COMMON_FOODS = {
-    "яблоко": {"calories": 52, "protein": 0.3, "fat": 0.2, "carbs": 14, "fiber": 2.4, "sugar": 10, "sodium": 1},
-    "банан": {"calories": 89, "protein": 1.1, "fat": 0.3, "carbs": 23, "fiber": 2.6, "sugar": 12, "sodium": 1},
-    "курица": {"calories": 165, "protein": 31, "fat": 3.6, "carbs": 0, "fiber": 0, "sugar": 0, "sodium": 74},
-    "рис": {"calories": 130, "protein": 2.7, "fat": 0.3, "carbs": 28, "fiber": 0.4, "sugar": 0.1, "sodium": 1},
-    "хлеб": {"calories": 265, "protein": 9, "fat": 3.2, "carbs": 49, "fiber": 2.7, "sugar": 5, "sodium": 491},
-    "молоко": {"calories": 42, "protein": 3.4, "fat": 1, "carbs": 5, "fiber": 0, "sugar": 5, "sodium": 44},
-    "яйцо": {"calories": 155, "protein": 13, "fat": 11, "carbs": 1.1, "fiber": 0, "sugar": 1.1, "sodium": 124},
-    "картофель": {"calories": 77, "protein": 2, "fat": 0.1, "carbs": 17, "fiber": 2.2, "sugar": 0.8, "sodium": 6},
-    "морковь": {"calories": 41, "protein": 0.9, "fat": 0.2, "carbs": 10, "fiber": 2.8, "sugar": 4.7, "sodium": 69},
-    "огурцы": {"calories": 16, "protein": 0.7, "fat": 0.1, "carbs": 3.6, "fiber": 0.5, "sugar": 1.7, "sodium": 2},
-}
-
 def get_moscow_time():
     """Получает текущее время в Москве"""
     moscow_tz = pytz.timezone('Europe/Moscow')
@@ -140,62 +125,38 @@ class WaterIn(BaseModel):
     user_id: int
     ml: int
 
+# Значения по умолчанию, если продукт не удалось определить (на 100г)
+DEFAULT_NUTRITION = {
+    "calories": 100,
+    "protein": 5,
+    "fat": 2,
+    "carbs": 15,
+    "fiber": 1,
+    "sugar": 2,
+    "sodium": 50
+}
+
 async def get_nutrition_info_fast(food_name: str, weight_grams: float):
     """Быстрое получение информации о калорийности с кэшированием"""
     
-    # Нормализуем название продукта
-    food_lower = food_name.lower().strip()
-    
-    # Проверяем кэш
-    if food_lower in NUTRITION_CACHE:
-        base_nutrition = NUTRITION_CACHE[food_lower]
-    else:
-        # Проверяем базу данных продуктов
-        if food_lower in COMMON_FOODS:
-            base_nutrition = COMMON_FOODS[food_lower]
-            NUTRITION_CACHE[food_lower] = base_nutrition
-        else:
-            # Fallback значения
-            base_nutrition = {
-                "calories": 100,
-                "protein": 5,
-                "fat": 2,
-                "carbs": 15,
-                "fiber": 1,
-                "sugar": 2,
-                "sodium": 50
-            }
-            NUTRITION_CACHE[food_lower] = base_nutrition
+    # Проверяем общий справочник продуктов, затем общий кэш (без обращения к LLM)
+    reference_food = reference_nutrition.get(food_name)
+    if reference_food:
+        return reference_food.scale(weight_grams)
     
-    # Рассчитываем для указанного веса
-    ratio = weight_grams / 100  # базовые значения на 100г
+    cached = await nutrition_cache.get(food_name)
+    base_nutrition = cached[0] if cached and cached[0] else DEFAULT_NUTRITION
     
-    return {
-        "calories": round(base_nutrition["calories"] * ratio, 1),
-        "protein": round(base_nutrition["protein"] * ratio, 1),
-        "fat": round(base_nutrition["fat"] * ratio, 1),
-        "carbs": round(base_nutrition["carbs"] * ratio, 1),
-        "fiber": round(base_nutrition["fiber"] * ratio, 1),
-        "sugar": round(base_nutrition["sugar"] * ratio, 1),
-        "sodium": round(base_nutrition["sodium"] * ratio, 1)
-    }
+    # Рассчитываем для указанного веса (базовые значения на 100г)
+    return scale_nutrition(base_nutrition, weight_grams)
 
-async def get_nutrition_info(food_name: str, weight_grams: float):
-    """Получение информации о калорийности через GigaChat (медленно, но точно)"""
-    
-    # Сначала пробуем быстрое решение
-    fast_result = await get_nutrition_info_fast(food_name, weight_grams)
-    
-    # Если продукт не найден в базе, используем GigaChat (но с таймаутом)
-    food_lower = food_name.lower().strip()
-    if food_lower not in COMMON_FOODS:
-        try:
-            # Устанавливаем таймаут 5 секунд для GigaChat
-            prompt = f"""
+async def request_nutrition_per_100g(food_name: str) -> Optional[Dict]:
+    """Запрашивает у GigaChat пищевую ценность на 100г; None, если ответ не разобран"""
+    prompt = f"""
 Ты профессиональный диетолог. Проанализируй продукт и предоставь точную информацию о его пищевой ценности.
 
 Продукт: {food_name}
-Вес: {weight_grams} грамм
+Вес: 100 грамм
 
 Пожалуйста, предоставь информацию в следующем JSON формате:
 {{
@@ -208,33 +169,43 @@ async def get_nutrition_info(food_name: str, weight_grams: float):
     "sodium": натрий_в_мг
 }}
 
-Учти указанный вес продукта. Отвечай только JSON, без дополнительного текста.
+Отвечай только JSON, без дополнительного текста.
 """
 
-            # Используем asyncio.wait_for для таймаута
-            response = await asyncio.wait_for(
-                generate_text_with_gigachat(prompt), 
-                timeout=5.0
-            )
-            
-            # Пытаемся извлечь JSON из ответа
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                nutrition_data = json.loads(json_match.group())
-                
-                # Проверяем, что все необходимые поля присутствуют
-                required_fields = ['calories', 'protein', 'fat', 'carbs']
-                if all(field in nutrition_data and nutrition_data[field] is not None for field in required_fields):
-                    # Сохраняем в кэш
-                    NUTRITION_CACHE[food_lower] = nutrition_data
-                    return nutrition_data
-        
-        except asyncio.TimeoutError:
-            logging.warning(f"Таймаут при получении данных о {food_name}, используем fallback")
+    # Используем asyncio.wait_for для таймаута
+    response = await asyncio.wait_for(
+        generate_text_with_gigachat(prompt), 
+        timeout=5.0
+    )
+    
+    # Пытаемся извлечь JSON из ответа
+    json_match = re.search(r'\{.*\}', response, re.DOTALL)
+    if not json_match:
+        return None
+    nutrition_data = json.loads(json_match.group())
+    
+    # Проверяем, что все необходимые поля присутствуют
+    required_fields = ['calories', 'protein', 'fat', 'carbs']
+    if not all(field in nutrition_data and nutrition_data[field] is not None for field in required_fields):
+        return None
+    return {
+        field: float(nutrition_data.get(field) or 0)
+        for field in DEFAULT_NUTRITION
+    }
+
+async def get_nutrition_info(food_name: str, weight_grams: float):
+    """Получение информации о калорийности через GigaChat (медленно, но точно)"""
+    
+    # Если продукт не найден в базе, используем GigaChat через общий кэш
+    if reference_nutrition.get(food_name) is None:
+        try:
+            per_100g = await nutrition_cache.get_or_resolve(food_name, request_nutrition_per_100g)
+            if per_100g:
+                return scale_nutrition(per_100g, weight_grams)
         except Exception as e:
             logging.error(f"Ошибка при получении данных о питании: {e}")
     
-    return fast_result
+    return await get_nutrition_info_fast(food_name, weight_grams)
 
 @app.post("/api/meal")
 async def add_meal(meal: MealIn):
@@ -496,7 +467,7 @@ async def add_water(water: WaterIn):
             session.add(user)
         else:
             # Добавляем к существующему количеству
-        user.water_ml = (user.water_ml or 0) + water.ml
+            user.water_ml = (user.water_ml or 0) + water.ml
         
         await session.commit()
         return {"water_ml": user.water_ml, "added": water.ml} 
\ No newline at end of file
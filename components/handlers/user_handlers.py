@@ -3,12 +3,12 @@ from aiogram.types import Message, CallbackQuery, ContentType, InlineKeyboardMar
 from aiogram.enums.parse_mode import ParseMode
 from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy import select
 import os
 import requests
 import json
+import re
 from datetime import datetime, timedelta
 import asyncio
 import logging
@@ -16,9 +16,18 @@ import logging
 from database.crud import add_user_if_not_exists, reset_context, add_to_context, save_fsm_state, get_fsm_state, clear_fsm_state, get_user_profile
 import components.keyboards.user_kb as kb
 from components.states.user_states import Chat, Image
-from api.ai_api.generate_text import translate
-from api.ai_api.gigachat_api import generate_text_gigachat
+from api.ai_api.generate_text import translate, stream_view_prompt
+from api.ai_api.llm_router import generate_text, stream_text
+from api.ai_api.stream_renderer import StreamingReply
+from api.ai_api.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_MENU, PRIORITY_PREMIUM_CHAT
 from components.keyboards.user_kb import main_menu_kb
+from api.ai_api.nutrition_cache import nutrition_cache, scale_nutrition, validate_per_100g
+from api.ai_api.food_alias import get_alias_per_100g
+from api.ai_api.dish_nutrition import dish_nutrition
+from api.ai_api.barcode_products import barcode_products
+from utils.reference_nutrition import reference_nutrition
+from utils.portion_parser import parse_portion
+from utils.barcode import parse_barcode_input
 
 # --- Импортируем async_session ---
 from database.init_database import async_session, User, Meal, Preset
@@ -27,6 +36,15 @@ from database.init_database import async_session, User, Meal, Preset
 REQUEST_TIMEOUT = 30  # Увеличенный таймаут для всех запросов
 CONNECTION_TIMEOUT = 10  # Таймаут подключения
 
+# Ниже этой уверенности разбора порции вес показывается как приблизительный
+APPROXIMATE_PORTION_CONFIDENCE = 0.8
+
+# Сколько частых продуктов показывать кнопками при добавлении еды
+RECENT_FOODS_BUTTONS = 6
+
+# Вес порции после штрихкода: "150", "150 г"
+GRAMS_PATTERN = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*(?:г|гр|грамм\w*|g)?\s*$', re.IGNORECASE)
+
 # API URL для обращения к серверу
 API_URL = os.getenv('API_BASE_URL', 'http://localhost:8000')
 
@@ -207,8 +225,9 @@ async def chat_active(message: Message, state: FSMContext):
             
             full_prompt = f"{DIETOLOG_PROMPT}\n\n{profile_context}Клиент: {message.text}\n\nДиетолог:"
             
-            # Используем GigaChat для ответа диетолога
-            ai_response = await generate_text_gigachat(prompt=full_prompt)
+            # Ответ диетолога проявляется в сообщении ожидания по мере генерации
+            reply = StreamingReply(waiting_message)
+            ai_response = await reply.consume(stream_text(prompt=full_prompt, task='chat', priority=PRIORITY_PREMIUM_CHAT))
             
             # Добавляем подпись с /stop
             ai_response += "\n\n💡 Если хотите завершить приём, нажмите /stop"
@@ -217,13 +236,9 @@ async def chat_active(message: Message, state: FSMContext):
             await add_to_context(tg_id=message.from_user.id, message=f"Пользователь: {message.text}")
             await add_to_context(tg_id=message.from_user.id, message=f"Ассистент: {ai_response}")
             
-            try:
-                await message.answer(ai_response, parse_mode=ParseMode.MARKDOWN)
-            except TelegramBadRequest:
-                await message.answer(ai_response[:4050], parse_mode=None)
+            await reply.finish(ai_response, parse_mode=ParseMode.MARKDOWN)
             await state.set_state(Chat.active)
             await save_fsm_state(message.from_user.id, 'Chat:active')
-            await waiting_message.delete()
         elif message.content_type == ContentType.PHOTO:
             from components.payment_system.payment_operations import check_premium
             access = check_premium(tg_id=message.from_user.id)
@@ -233,15 +248,13 @@ async def chat_active(message: Message, state: FSMContext):
             waiting_message = await message.answer('<b><i>⏳ Ответ генерируется...</i></b>')
             await state.set_state(Chat.waiting)
             await save_fsm_state(message.from_user.id, 'Chat:waiting')
-            ai_response = await answer_to_view_prompt(message=message)
+            from api.ai_api.text_formatting import style_changer
+            reply = StreamingReply(waiting_message)
+            ai_response = await reply.consume(stream_view_prompt(message=message))
             ai_response = await style_changer(latex_code=ai_response)
-            try:
-                await message.answer(ai_response, parse_mode=ParseMode.MARKDOWN)
-            except TelegramBadRequest:
-                await message.answer(ai_response[:4050], parse_mode=None)
+            await reply.finish(ai_response, parse_mode=ParseMode.MARKDOWN)
             await state.set_state(Chat.active)
             await save_fsm_state(message.from_user.id, 'Chat:active')
-            await waiting_message.delete()
         else: 
             await message.answer('<b>Поддерживаются только текстовые сообщения и изображения</b>')
 
@@ -592,6 +605,7 @@ async def edit_profile_waiting(message: Message, state: FSMContext):
 # --- FSM группы для пользовательских сценариев ---
 class AddMealFSM(StatesGroup):
     waiting = State()
+    barcode_weight = State()
 
 class PresetFSM(StatesGroup):
     name = State()
@@ -603,47 +617,13 @@ class SimplePresetFSM(StatesGroup):
 class WaterFSM(StatesGroup):
     add = State()
 
-# --- Добавление еды ---
-@router.message(Command('addmeal'))
-@router.message(lambda message: message.text == 'Добавить еду')
-async def addmeal_command(message: Message, state: FSMContext):
-    # Устанавливаем состояние для добавления еды
-    await state.set_state(AddMealFSM.waiting)
-    
-    message_text = (
-        "🍽️ <b>Добавление еды</b>\n\n"
-        "📝 Введите название блюда и вес в граммах\n"
-        "💡 <i>Пример: Яблоко 150</i>\n\n"
-        "Или выберите готовый шаблон ниже 👇"
-    )
-    
-    await message.answer(message_text, reply_markup=kb.add_food_kb, parse_mode='HTML')
-    await save_fsm_state(message.from_user.id, 'AddMealFSM:waiting')
-
-@router.message(AddMealFSM.waiting)
-async def addmeal_waiting(message: Message, state: FSMContext):
-    if message.text.lower() == 'назад':
-        await state.clear()
-        await clear_fsm_state(message.from_user.id)
-        await message.answer("Действие отменено", reply_markup=kb.main_menu_kb)
-        return
-        
-    parts = message.text.strip().rsplit(' ', 1)
-    if len(parts) != 2 or not parts[1].isdigit():
-        await message.answer("Формат: название и вес в граммах.\nПример: Яблоко 150")
-        return
-    food_name, weight = parts[0], float(parts[1])
-    
-    # Получаем текущее время и дату
-    now = datetime.now()
-    date = now.strftime('%Y-%m-%d')
-    time = now.strftime('%H:%M')
-    
+async def resolve_addmeal_nutrition(food_name: str):
+    """Пищевая ценность на 100г от GigaChat; None, если ответ не удалось разобрать или он неразумный"""
     # Используем GigaChat для анализа калорий с жестким промптом
     prompt = f"""
 КРИТИЧЕСКИ ВАЖНО: Ты эксперт-диетолог с 20-летним опытом. Анализируй ТОЛЬКО реальную пищевую ценность продуктов. НЕ ФАНТАЗИРУЙ И НЕ ЗАВЫШАЙ калории!
 
-ЗАДАЧА: Рассчитай точную пищевую ценность для "{food_name}" весом {weight} грамм.
+ЗАДАЧА: Рассчитай точную пищевую ценность для "{food_name}" на 100 грамм.
 
 СТРОГИЕ ПРАВИЛА:
 1. Используй ТОЛЬКО достоверные данные о калорийности на 100г
@@ -669,100 +649,210 @@ async def addmeal_waiting(message: Message, state: FSMContext):
 }}
 
 Продукт: "{food_name}"
-Вес: {weight}г
-Рассчитай пропорционально от стандартных значений на 100г.
+Вес: 100г
 """
+    ai_response = await generate_text(prompt=prompt, task='nutrition')
+    
+    # Ищем JSON в ответе
+    json_match = re.search(r'\{.*\}', ai_response or '', re.DOTALL)
+    if not json_match:
+        return None
+    # Та же проверка разумности, что и у ответов LLM в API
+    return validate_per_100g(json.loads(json_match.group()))
+
+async def save_addmeal(message: Message, food_name: str, weight: float, weight_label: str,
+                       nutrition_data: dict, fdc_id=None, analyzing_msg=None):
+    """Сохраняет приём пищи через API и показывает пищевую ценность"""
+    # Получаем текущее время и дату
+    now = datetime.now()
+    
+    calories = nutrition_data.get('calories', 0)
+    protein = nutrition_data.get('protein', 0)
+    fat = nutrition_data.get('fat', 0)
+    carbs = nutrition_data.get('carbs', 0)
+    
+    # Отправляем запрос на backend для сохранения еды
+    payload = {
+        'user_id': message.from_user.id,
+        'food_name': food_name,
+        'weight_grams': weight,
+        'date': now.strftime('%Y-%m-%d'),
+        'time': now.strftime('%H:%M'),
+        'calories': calories,
+        'protein': protein,
+        'fat': fat,
+        'carbs': carbs,
+        # Без значений (средняя оценка) API досчитает их по продукту FoodData Central
+        'fiber': nutrition_data.get('fiber'),
+        'sugar': nutrition_data.get('sugar'),
+        'sodium': nutrition_data.get('sodium'),
+        'fdc_id': fdc_id
+    }
+    
+    r = requests.post(f'{API_URL}/api/meal', json=payload, timeout=REQUEST_TIMEOUT)
+    
+    # Удаляем сообщение об анализе
+    if analyzing_msg:
+        await analyzing_msg.delete()
+    
+    if r.status_code == 200:
+        await message.answer(
+            f"✅ <b>{food_name.title()} ({weight_label}) добавлено!</b>\n\n"
+            f"📊 <b>Пищевая ценность:</b>\n"
+            f"🔥 Калории: {calories:.1f} ккал\n"
+            f"🥩 Белки: {protein:.1f} г\n"
+            f"🧈 Жиры: {fat:.1f} г\n"
+            f"🍞 Углеводы: {carbs:.1f} г",
+            reply_markup=kb.main_menu_kb
+        )
+    else:
+        await message.answer("❌ Ошибка сохранения еды", reply_markup=kb.main_menu_kb)
+
+async def addmeal_barcode(message: Message, state: FSMContext, ean: int, weight=None):
+    """Продукт по штрихкоду: сразу сохраняем, если вес указан, иначе спрашиваем вес"""
+    product = await barcode_products.get(ean)
+    if product is None:
+        await message.answer(
+            "🔍 Продукт с таким штрихкодом не найден.\n"
+            "Введите название и вес, например: Кефир 200"
+        )
+        return
+    
+    title = f"{product['name']} ({product['brand']})" if product.get('brand') else product['name']
+    if weight is None:
+        await state.set_state(AddMealFSM.barcode_weight)
+        await state.update_data(barcode=ean)
+        await save_fsm_state(message.from_user.id, 'AddMealFSM:barcode_weight', {'barcode': ean})
+        await message.answer(
+            f"📦 <b>{title}</b>\n"
+            f"🔥 {product['calories']:.0f} ккал на 100 г\n\n"
+            f"⚖️ Сколько граммов? Например: 150"
+        )
+        return
+    
+    try:
+        await save_addmeal(message, product['name'], weight, f"{weight:g} г", scale_nutrition(product, weight))
+    except Exception as e:
+        await message.answer(
+            f"❌ Произошла ошибка при добавлении еды: {str(e)[:100]}...",
+            reply_markup=kb.main_menu_kb
+        )
+    await state.clear()
+    await clear_fsm_state(message.from_user.id)
+
+async def addmeal_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура добавления еды: сверху частые продукты пользователя, ниже шаблоны"""
+    try:
+        # Без повторов: клавиатура не должна задерживать ответ
+        r = await safe_api_request(
+            'GET', f'{API_URL}/api/foods/recent',
+            max_retries=1, timeout=CONNECTION_TIMEOUT,
+            params={'user_id': user_id, 'limit': RECENT_FOODS_BUTTONS}
+        )
+        foods = r.json().get('foods', []) if r.status_code == 200 else []
+    except Exception as e:
+        logging.warning(f"Не удалось получить частые продукты: {e}")
+        foods = []
+    if not foods:
+        return kb.add_food_kb
+    
+    buttons = [
+        InlineKeyboardButton(
+            text=f"🔁 {food['food_name'][:24]} {food['weight_grams']:g} г",
+            callback_data=f"recent_add_{food['id']}"
+        )
+        for food in foods
+    ]
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    return InlineKeyboardMarkup(inline_keyboard=rows + kb.add_food_kb.inline_keyboard)
+
+# --- Добавление еды ---
+@router.message(Command('addmeal'))
+@router.message(lambda message: message.text == 'Добавить еду')
+async def addmeal_command(message: Message, state: FSMContext):
+    # Устанавливаем состояние для добавления еды
+    await state.set_state(AddMealFSM.waiting)
+    
+    message_text = (
+        "🍽️ <b>Добавление еды</b>\n\n"
+        "📝 Введите название блюда и вес в граммах или количество\n"
+        "💡 <i>Примеры: Яблоко 150, 2 яйца, стакан кефира</i>\n"
+        "🏷️ Или отправьте цифры штрихкода с упаковки\n\n"
+        "Или выберите готовый шаблон ниже 👇"
+    )
+    
+    await message.answer(message_text, reply_markup=await addmeal_keyboard(message.from_user.id), parse_mode='HTML')
+    await save_fsm_state(message.from_user.id, 'AddMealFSM:waiting')
+
+@router.message(AddMealFSM.waiting)
+async def addmeal_waiting(message: Message, state: FSMContext):
+    if message.text.lower() == 'назад':
+        await state.clear()
+        await clear_fsm_state(message.from_user.id)
+        await message.answer("Действие отменено", reply_markup=kb.main_menu_kb)
+        return
+        
+    # Штрихкод упаковки: "4607001234567" или сразу с весом "4607001234567 150"
+    barcode = parse_barcode_input(message.text)
+    if barcode is not None:
+        await addmeal_barcode(message, state, barcode.ean, barcode.grams)
+        return
+        
+    # Количество и единицы разбираем локально: "Яблоко 150", "2 яйца", "стакан кефира"
+    portion = parse_portion(message.text)
+    if portion is None:
+        await message.answer(
+            "Формат: название и количество.\n"
+            "Примеры: Яблоко 150, 2 яйца, стакан кефира, 150г курицы"
+        )
+        return
+    food_name, weight = portion.canonical_food, portion.grams
+    # Вес по типичной единице продукта - приблизительный
+    weight_label = f"{weight:g} г" if portion.confidence >= APPROXIMATE_PORTION_CONFIDENCE else f"≈{weight:g} г"
     
     try:
         # Показываем сообщение об анализе
         analyzing_msg = await message.answer("🤖 <b>Анализирую продукт...</b>")
         
-        # Fallback значения для популярных продуктов (кэш) - точные данные на 1г
-        fallback_foods = {
-            "яблоко": {"calories": 0.52, "protein": 0.003, "fat": 0.002, "carbs": 0.14},
-            "банан": {"calories": 0.89, "protein": 0.011, "fat": 0.003, "carbs": 0.23},
-            "хлеб": {"calories": 2.64, "protein": 0.089, "fat": 0.033, "carbs": 0.491},
-            "курица": {"calories": 1.65, "protein": 0.31, "fat": 0.036, "carbs": 0.0},
-            "рис": {"calories": 1.30, "protein": 0.028, "fat": 0.003, "carbs": 0.28},
-            "кофе": {"calories": 0.02, "protein": 0.0002, "fat": 0.0, "carbs": 0.0},
-            "растворимый кофе": {"calories": 0.02, "protein": 0.0002, "fat": 0.0, "carbs": 0.0},
-            "чай": {"calories": 0.01, "protein": 0.0, "fat": 0.0, "carbs": 0.0},
-            "вода": {"calories": 0.0, "protein": 0.0, "fat": 0.0, "carbs": 0.0}
-        }
-        
-        # Проверяем есть ли продукт в кэше
-        food_lower = food_name.lower()
-        for key, values in fallback_foods.items():
-            if key in food_lower:
-                nutrition_data = {
-                    "calories": values["calories"] * weight,
-                    "protein": values["protein"] * weight,
-                    "fat": values["fat"] * weight,
-                    "carbs": values["carbs"] * weight
-                }
-                await analyzing_msg.edit_text("✅ <b>Продукт найден в базе!</b>")
-                break
+        # Составное блюдо по локальному рецепту, затем общий справочник (точное совпадение названия)
+        dish_per_100g = dish_nutrition.get(food_name)
+        reference_food = None if dish_per_100g else reference_nutrition.get(food_name)
+        alias_per_100g = None if dish_per_100g or reference_food else await get_alias_per_100g(food_name)
+        if dish_per_100g:
+            nutrition_data = scale_nutrition(dish_per_100g, weight)
+            await analyzing_msg.edit_text("✅ <b>Блюдо найдено в базе рецептов!</b>")
+        elif reference_food:
+            nutrition_data = reference_food.scale(weight)
+            await analyzing_msg.edit_text("✅ <b>Продукт найден в базе!</b>")
+        elif alias_per_100g:
+            # Название уже встречалось и связано с продуктом FoodData Central
+            nutrition_data = scale_nutrition(alias_per_100g, weight)
+            await analyzing_msg.edit_text("✅ <b>Продукт найден в базе!</b>")
         else:
-            # Получаем анализ от GigaChat только если нет в кэше
-            try:
-                ai_response = await generate_text_gigachat(prompt=prompt)
-                
-                # Парсим JSON ответ
-                import json
-                import re
-                
-                # Ищем JSON в ответе
-                json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-                if json_match:
-                    nutrition_data = json.loads(json_match.group())
-                    await analyzing_msg.edit_text("✅ <b>Анализ завершен!</b>")
+            # Получаем анализ от GigaChat через общий кэш (Redis + память процесса)
+            per_100g = await nutrition_cache.get_or_resolve(food_name, resolve_addmeal_nutrition)
+            if per_100g:
+                nutrition_data = scale_nutrition(per_100g, weight)
+                await analyzing_msg.edit_text("✅ <b>Анализ завершен!</b>")
+            else:
+                # Fallback при ошибке GigaChat: похожий продукт из справочника или средние значения
+                reference_food = reference_nutrition.match(food_name)
+                if reference_food:
+                    nutrition_data = reference_food.scale(weight)
                 else:
-                    raise ValueError("Нет JSON в ответе")
-            except Exception as e:
-                # Fallback значения при ошибке GigaChat
-                nutrition_data = {
-                    "calories": weight * 1.5,  # Средние значения
-                    "protein": weight * 0.05,
-                    "fat": weight * 0.02,
-                    "carbs": weight * 0.15
-                }
+                    nutrition_data = {
+                        "calories": weight * 1.5,  # Средние значения
+                        "protein": weight * 0.05,
+                        "fat": weight * 0.02,
+                        "carbs": weight * 0.15
+                    }
                 await analyzing_msg.edit_text("⚠️ <b>Использованы приблизительные данные</b>")
         
-        calories = nutrition_data.get('calories', 0)
-        protein = nutrition_data.get('protein', 0)
-        fat = nutrition_data.get('fat', 0)
-        carbs = nutrition_data.get('carbs', 0)
-        
-        # Отправляем запрос на backend для сохранения еды
-        payload = {
-            'user_id': message.from_user.id,
-            'food_name': food_name,
-            'weight_grams': weight,
-            'date': date,
-            'time': time,
-            'calories': calories,
-            'protein': protein,
-            'fat': fat,
-            'carbs': carbs
-        }
-        
-        r = requests.post(f'{API_URL}/api/meal', json=payload, timeout=REQUEST_TIMEOUT)
-        
-        # Удаляем сообщение об анализе
-        await analyzing_msg.delete()
-        
-        if r.status_code == 200:
-            await message.answer(
-                f"✅ <b>{food_name.title()} ({weight} г) добавлено!</b>\n\n"
-                f"📊 <b>Пищевая ценность:</b>\n"
-                f"🔥 Калории: {calories:.1f} ккал\n"
-                f"🥩 Белки: {protein:.1f} г\n"
-                f"🧈 Жиры: {fat:.1f} г\n"
-                f"🍞 Углеводы: {carbs:.1f} г",
-                reply_markup=kb.main_menu_kb
-            )
-        else:
-            await message.answer("❌ Ошибка сохранения еды", reply_markup=kb.main_menu_kb)
+        await save_addmeal(
+            message, food_name, weight, weight_label, nutrition_data,
+            fdc_id=alias_per_100g['fdc_id'] if alias_per_100g else None,
+            analyzing_msg=analyzing_msg
+        )
         
         await state.clear()
         await clear_fsm_state(message.from_user.id)
@@ -775,6 +865,29 @@ async def addmeal_waiting(message: Message, state: FSMContext):
         await state.clear()
         await clear_fsm_state(message.from_user.id)
 
+@router.message(AddMealFSM.barcode_weight)
+async def addmeal_barcode_weight(message: Message, state: FSMContext):
+    if message.text.lower() == 'назад':
+        await state.clear()
+        await clear_fsm_state(message.from_user.id)
+        await message.answer("Действие отменено", reply_markup=kb.main_menu_kb)
+        return
+    
+    match = GRAMS_PATTERN.match(message.text or '')
+    weight = float(match.group(1).replace(',', '.')) if match else 0
+    if not weight:
+        await message.answer("Введите вес в граммах, например: 150")
+        return
+    
+    data = await state.get_data()
+    if not data.get('barcode'):
+        # Состояние восстановлено без данных - начинаем добавление заново
+        await state.set_state(AddMealFSM.waiting)
+        await save_fsm_state(message.from_user.id, 'AddMealFSM:waiting')
+        await message.answer("Отправьте штрихкод ещё раз или введите название и вес")
+        return
+    await addmeal_barcode(message, state, data['barcode'], weight)
+
 # --- Preset FSM ---
 @router.callback_query(F.data == 'food_templates')
 async def food_templates_callback(callback: CallbackQuery, state: FSMContext):
@@ -876,15 +989,50 @@ async def back_to_add_food_callback(callback: CallbackQuery, state: FSMContext):
     
     message_text = (
         "🍽️ <b>Добавление еды</b>\n\n"
-        "📝 Введите название блюда и вес в граммах\n"
-        "💡 <i>Пример: Яблоко 150</i>\n\n"
+        "📝 Введите название блюда и вес в граммах или количество\n"
+        "💡 <i>Примеры: Яблоко 150, 2 яйца, стакан кефира</i>\n"
+        "🏷️ Или отправьте цифры штрихкода с упаковки\n\n"
         "Или выберите готовый шаблон ниже 👇"
     )
     
-    await callback.message.edit_text(message_text, reply_markup=kb.add_food_kb, parse_mode='HTML')
+    await callback.message.edit_text(message_text, reply_markup=await addmeal_keyboard(callback.from_user.id), parse_mode='HTML')
     await state.set_state(AddMealFSM.waiting)
     await save_fsm_state(callback.from_user.id, 'AddMealFSM:waiting')
 
+@router.callback_query(F.data.startswith('recent_add_'))
+async def recent_add_callback(callback: CallbackQuery, state: FSMContext):
+    """Добавление частого продукта в одно нажатие (типичная порция, без поиска продукта)"""
+    await callback.answer()
+    recent_id = int(callback.data.split('_')[-1])
+    user_id = callback.from_user.id
+    
+    try:
+        r = await safe_api_request('POST', f'{API_URL}/api/foods/recent/add',
+                                 json={'user_id': user_id, 'recent_id': recent_id})
+        if r.status_code == 200:
+            meal = r.json().get('meal', {})
+            await callback.message.edit_text(
+                f"✅ <b>{meal.get('food_name', '').title()} ({meal.get('weight_grams', 0):g} г) добавлено!</b>\n\n"
+                f"📊 <b>Пищевая ценность:</b>\n"
+                f"🔥 Калории: {meal.get('calories', 0):.1f} ккал\n"
+                f"🥩 Белки: {meal.get('protein', 0):.1f} г\n"
+                f"🧈 Жиры: {meal.get('fat', 0):.1f} г\n"
+                f"🍞 Углеводы: {meal.get('carbs', 0):.1f} г",
+                parse_mode='HTML'
+            )
+            await state.clear()
+            await clear_fsm_state(user_id)
+        else:
+            await callback.message.edit_text(
+                "❌ Продукт не найден. Введите название и вес вручную.",
+                reply_markup=kb.back_kb
+            )
+    except Exception as e:
+        await callback.message.edit_text(
+            "❌ Ошибка соединения. Попробуйте позже.",
+            reply_markup=kb.back_kb
+        )
+
 @router.callback_query(F.data == 'presets')
 async def presets_callback(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
@@ -1167,9 +1315,8 @@ async def menu_callback(callback: CallbackQuery, state: FSMContext):
 """
         
         waiting_msg = await callback.message.answer("🍽️ <b>Генерирую персональное меню с учетом вашей статистики...</b>")
-        menu_response = await generate_text_gigachat(prompt=prompt)
-        
-        await waiting_msg.delete()
+        reply = StreamingReply(waiting_msg, preview_header=f"🍽️ Персональное меню для {user_data['name']}\n\n")
+        menu_response = await reply.consume(stream_text(prompt=prompt, task='menu', priority=PRIORITY_MENU))
         
         # Добавляем краткую статистику к ответу
         stats_summary = ""
@@ -1181,8 +1328,9 @@ async def menu_callback(callback: CallbackQuery, state: FSMContext):
             stats_summary += f"🍞 Средние углеводы: {avg_carbs:.1f} г/день\n"
             stats_summary += f"📈 Целевые калории: {tdee:.0f} ккал/день"
         
-        await callback.message.answer(
-            f"🍽️ <b>Персональное меню для {user_data['name']}</b>\n\n{menu_response}{stats_summary}", 
+        await reply.finish(
+            f"🍽️ <b>Персональное меню для {user_data['name']}</b>\n\n{menu_response}{stats_summary}",
+            parse_mode=ParseMode.HTML,
             reply_markup=kb.main_menu_kb
         )
         
@@ -1322,7 +1470,7 @@ async def presets_command(message: Message, state: FSMContext):
 """
             
             try:
-                analysis = await generate_text_gigachat(prompt=prompt)
+                analysis = await generate_text(prompt=prompt, task='recommendations', priority=PRIORITY_BACKGROUND)
                 
                 text = "<b>📋 Ваши шаблоны:</b>\n\n"
                 for i, p in enumerate(presets, 1):
@@ -1573,11 +1721,12 @@ async def menu_command(message: Message, state: FSMContext):
 """
         
         waiting_msg = await message.answer("🍽️ <b>Генерирую персональное меню...</b>")
-        menu_response = await generate_text_gigachat(prompt=prompt)
+        reply = StreamingReply(waiting_msg, preview_header=f"🍽️ Персональное меню для {user_data['name']}\n\n")
+        menu_response = await reply.consume(stream_text(prompt=prompt, task='menu', priority=PRIORITY_MENU))
         
-        await waiting_msg.delete()
-        await message.answer(
-            f"🍽️ <b>Персональное меню для {user_data['name']}</b>\n\n{menu_response}", 
+        await reply.finish(
+            f"🍽️ <b>Персональное меню для {user_data['name']}</b>\n\n{menu_response}",
+            parse_mode=ParseMode.HTML,
             reply_markup=kb.main_menu_kb
         )
         
@@ -1867,18 +2016,17 @@ async def help_command(message: Message):
     await message.answer(help_text, parse_mode='HTML', reply_markup=kb.main_menu_kb)
 
 # Функция для безопасных API запросов с retry
-async def safe_api_request(method, url, **kwargs):
-    """Безопасный API запрос с повторными попытками"""
-    import time
-    max_retries = 3
+async def safe_api_request(method, url, max_retries=3, timeout=REQUEST_TIMEOUT, **kwargs):
+    """
+    Безопасный API запрос с повторными попытками.
+    requests выполняется в отдельном потоке, чтобы не блокировать цикл событий бота.
+    """
     base_delay = 1
     
     for attempt in range(max_retries):
         try:
-            if method == 'GET':
-                response = requests.get(url, timeout=REQUEST_TIMEOUT, **kwargs)
-            else:
-                response = requests.post(url, timeout=REQUEST_TIMEOUT, **kwargs)
+            send = requests.get if method == 'GET' else requests.post
+            response = await asyncio.to_thread(send, url, timeout=timeout, **kwargs)
             
             if response.status_code == 200:
                 return response
@@ -0,0 +1,191 @@
+"""
+Инкрементальное обновление справочника до нового релиза FoodData Central.
+
+Новый релиз загружается в staging-таблицы тем же потоковым COPY, что и
+полный импорт (database/fdc_import.py). Затем для каждого fdc_id сравниваются
+хэши строк food и food_nutrient со снимком текущих данных (food_fingerprint),
+и применяются только вставки, обновления и удаления изменившихся продуктов.
+Применённые релизы записываются в food_release.
+
+Запуск: python -m database.fdc_delta --data-dir fooddata_tmp/FoodData_Central_csv_2025-10-30
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import psycopg2
+from dotenv import load_dotenv
+
+from database.fdc_import import DEFAULT_CHUNK_ROWS, TABLES, get_dsn, load_file_to_staging, reset_import
+from database.food_macros import macros_insert_sql
+
+FOOD_HASH_SQL = "md5(concat_ws('|', description, food_category_id, data_type))"
+NUTRIENT_HASH_SQL = "md5(string_agg(nutrient_id || ':' || amount, ',' ORDER BY nutrient_id, id))"
+
+
+def fingerprint_sql(food_table: str, nutrient_table: str) -> str:
+    """Выборка (fdc_id, food_hash, nutrient_hash) по паре таблиц food/food_nutrient"""
+    return f"""
+        SELECT f.fdc_id, f.food_hash, COALESCE(n.nutrient_hash, '') AS nutrient_hash
+        FROM (
+            SELECT DISTINCT ON (fdc_id) fdc_id, {FOOD_HASH_SQL} AS food_hash
+            FROM {food_table}
+            ORDER BY fdc_id
+        ) f
+        LEFT JOIN (
+            SELECT fdc_id, {NUTRIENT_HASH_SQL} AS nutrient_hash
+            FROM (SELECT DISTINCT ON (id) * FROM {nutrient_table} ORDER BY id) rows
+            GROUP BY fdc_id
+        ) n ON n.fdc_id = f.fdc_id
+    """
+
+
+def ensure_delta_tables(cur) -> None:
+    """Создаёт служебные таблицы; при первом запуске снимает хэши текущих данных"""
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    from database.init_database import FoodFingerprint, FoodMacros, FoodRelease
+
+    for model in (FoodFingerprint, FoodRelease, FoodMacros):
+        cur.execute(str(CreateTable(model.__table__, if_not_exists=True).compile(dialect=postgresql.dialect())))
+
+    cur.execute("SELECT EXISTS (SELECT 1 FROM food_fingerprint)")
+    if not cur.fetchone()[0]:
+        print("🔐 Первый запуск: считаем хэши текущих данных...")
+        cur.execute(f"""
+            INSERT INTO food_fingerprint (fdc_id, food_hash, nutrient_hash)
+            {fingerprint_sql('food', 'food_nutrient')}
+        """)
+
+
+def apply_release_delta(dsn: str, release: str) -> Dict[str, int]:
+    """
+    Сравнивает staging с текущими данными и применяет разницу одной транзакцией:
+    читатели видят либо старый, либо новый релиз целиком.
+    """
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            ensure_delta_tables(cur)
+            cur.execute("SELECT 1 FROM food_release WHERE release = %s", (release,))
+            if cur.fetchone():
+                raise RuntimeError(f"Релиз {release} уже применён")
+
+            cur.execute(f"""
+                CREATE TEMP TABLE fdc_new_fingerprint ON COMMIT DROP AS
+                {fingerprint_sql('food_staging', 'food_nutrient_staging')}
+            """)
+            cur.execute("ALTER TABLE fdc_new_fingerprint ADD PRIMARY KEY (fdc_id)")
+
+            # Изменившиеся продукты: новые, удалённые и с другими хэшами
+            cur.execute("""
+                CREATE TEMP TABLE fdc_delta ON COMMIT DROP AS
+                SELECT COALESCE(n.fdc_id, o.fdc_id) AS fdc_id,
+                       CASE
+                           WHEN o.fdc_id IS NULL THEN 'insert'
+                           WHEN n.fdc_id IS NULL THEN 'delete'
+                           ELSE 'update'
+                       END AS action,
+                       o.food_hash IS DISTINCT FROM n.food_hash AS food_changed,
+                       o.nutrient_hash IS DISTINCT FROM n.nutrient_hash AS nutrients_changed
+                FROM fdc_new_fingerprint n
+                FULL JOIN food_fingerprint o ON o.fdc_id = n.fdc_id
+                WHERE o.fdc_id IS NULL OR n.fdc_id IS NULL
+                   OR o.food_hash <> n.food_hash OR o.nutrient_hash <> n.nutrient_hash
+            """)
+            cur.execute("ALTER TABLE fdc_delta ADD PRIMARY KEY (fdc_id)")
+            cur.execute("ANALYZE fdc_delta")
+
+            cur.execute("SELECT action, COUNT(*) FROM fdc_delta GROUP BY action")
+            counts = {'insert': 0, 'update': 0, 'delete': 0}
+            counts.update(dict(cur.fetchall()))
+
+            # Нутриенты изменившихся и удалённых продуктов заменяем целиком
+            cur.execute("""
+                DELETE FROM food_nutrient
+                WHERE fdc_id IN (SELECT fdc_id FROM fdc_delta WHERE action = 'delete' OR nutrients_changed)
+            """)
+            cur.execute("DELETE FROM food WHERE fdc_id IN (SELECT fdc_id FROM fdc_delta WHERE action = 'delete')")
+            cur.execute("""
+                INSERT INTO food (fdc_id, description, food_category_id, data_type)
+                SELECT DISTINCT ON (s.fdc_id) s.fdc_id, s.description, s.food_category_id, s.data_type
+                FROM food_staging s
+                JOIN fdc_delta d ON d.fdc_id = s.fdc_id AND d.action <> 'delete' AND d.food_changed
+                ORDER BY s.fdc_id
+                ON CONFLICT (fdc_id) DO UPDATE
+                SET description = EXCLUDED.description,
+                    food_category_id = EXCLUDED.food_category_id,
+                    data_type = EXCLUDED.data_type
+            """)
+            cur.execute("""
+                INSERT INTO food_nutrient (id, fdc_id, nutrient_id, amount)
+                SELECT DISTINCT ON (s.id) s.id, s.fdc_id, s.nutrient_id, s.amount
+                FROM food_nutrient_staging s
+                JOIN fdc_delta d ON d.fdc_id = s.fdc_id AND d.action <> 'delete' AND d.nutrients_changed
+                ORDER BY s.id
+                ON CONFLICT (id) DO UPDATE
+                SET fdc_id = EXCLUDED.fdc_id,
+                    nutrient_id = EXCLUDED.nutrient_id,
+                    amount = EXCLUDED.amount
+            """)
+
+            # Хэши и food_macros обновляем только для затронутых продуктов
+            cur.execute("DELETE FROM food_fingerprint WHERE fdc_id IN (SELECT fdc_id FROM fdc_delta)")
+            cur.execute("""
+                INSERT INTO food_fingerprint (fdc_id, food_hash, nutrient_hash)
+                SELECT n.fdc_id, n.food_hash, n.nutrient_hash
+                FROM fdc_new_fingerprint n
+                JOIN fdc_delta d ON d.fdc_id = n.fdc_id
+            """)
+            cur.execute("""
+                DELETE FROM food_macros
+                WHERE fdc_id IN (SELECT fdc_id FROM fdc_delta WHERE action = 'delete' OR nutrients_changed)
+            """)
+            cur.execute(macros_insert_sql(
+                "fdc_id IN (SELECT fdc_id FROM fdc_delta WHERE action <> 'delete' AND nutrients_changed)"
+            ))
+
+            cur.execute(
+                "INSERT INTO food_release (release, applied_at, inserted, updated, deleted) VALUES (%s, now(), %s, %s, %s)",
+                (release, counts['insert'], counts['update'], counts['delete']),
+            )
+        conn.commit()
+        return counts
+    finally:
+        conn.close()
+
+
+def run_delta_sync(data_dir: str, release: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, int]:
+    """Загружает релиз в staging (параллельно и с контрольными точками) и применяет разницу"""
+    dsn = get_dsn()
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=len(TABLES)) as pool:
+        for future in [pool.submit(load_file_to_staging, dsn, data_dir, spec, chunk_rows) for spec in TABLES]:
+            future.result()
+    print(f"📥 Релиз {release} загружен в staging за {time.perf_counter() - started:.0f} с")
+
+    counts = apply_release_delta(dsn, release)
+    reset_import(dsn)
+    print(
+        f"✅ Релиз {release} применён за {time.perf_counter() - started:.0f} с: "
+        f"добавлено {counts['insert']:,}, изменено {counts['update']:,}, удалено {counts['delete']:,}"
+    )
+    return counts
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Инкрементальное обновление до нового релиза FoodData Central")
+    parser.add_argument('--data-dir', required=True, help="Папка с CSV нового релиза")
+    parser.add_argument('--release', help="Имя релиза (по умолчанию - имя папки)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args()
+    run_delta_sync(args.data_dir, args.release or os.path.basename(os.path.normpath(args.data_dir)), args.chunk_rows)
+
+    # Ингредиенты рецептов могли измениться или исчезнуть - пересчитываем блюда
+    import asyncio
+    from api.ai_api.dish_nutrition import rebuild_dish_nutrition
+    print(f"🍲 Блюда по рецептам пересчитаны: {asyncio.run(rebuild_dish_nutrition())}")
@@ -0,0 +1,308 @@
+"""
+Потоковый импорт CSV FoodData Central в PostgreSQL через COPY.
+
+- Файлы читаются построчно и частями загружаются в UNLOGGED staging-таблицы
+  через COPY ... FROM STDIN (без executemany и без предварительного подсчёта строк).
+- Разные файлы грузятся параллельно в отдельных процессах.
+- После каждой части в той же транзакции сохраняется контрольная точка,
+  поэтому после сбоя импорт продолжается с места остановки.
+- Перенос в рабочие таблицы идёт одним INSERT ... SELECT, вторичные индексы
+  удаляются перед переносом и строятся заново после него.
+"""
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+DEFAULT_DATA_DIR = os.getenv('FDC_DATA_DIR', 'fooddata_tmp/FoodData_Central_csv_2025-04-24')
+DEFAULT_CHUNK_ROWS = 200_000
+
+CHECKPOINT_TABLE = 'fdc_import_checkpoint'
+
+
+class TableSpec:
+    """Описание загружаемого файла: CSV-колонки, типы и целевая таблица"""
+
+    def __init__(self, file_name: str, table: str, key: str, columns: Sequence[Tuple[str, str, Callable]]):
+        self.file_name = file_name
+        self.table = table
+        self.key = key
+        # (имя колонки, тип в PostgreSQL, функция разбора значения из CSV)
+        self.columns = columns
+
+    @property
+    def staging(self) -> str:
+        return f'{self.table}_staging'
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _, _ in self.columns]
+
+
+def _optional_str(value: str) -> Optional[str]:
+    return value or None
+
+
+TABLES = (
+    TableSpec('food.csv', 'food', 'fdc_id', (
+        ('fdc_id', 'BIGINT', int),
+        ('description', 'VARCHAR', str),
+        ('food_category_id', 'VARCHAR', _optional_str),
+        ('data_type', 'VARCHAR', _optional_str),
+    )),
+    TableSpec('food_nutrient.csv', 'food_nutrient', 'id', (
+        ('id', 'BIGINT', int),
+        ('fdc_id', 'BIGINT', int),
+        ('nutrient_id', 'BIGINT', int),
+        ('amount', 'DOUBLE PRECISION', float),
+    )),
+)
+
+
+def get_dsn() -> str:
+    """Строка подключения psycopg2 из DATABASE_URL"""
+    db_url = os.getenv('DATABASE_URL')
+    if not db_url:
+        raise RuntimeError('DATABASE_URL не задан в .env!')
+    for prefix in ('postgres://', 'postgresql+asyncpg://'):
+        if db_url.startswith(prefix):
+            db_url = db_url.replace(prefix, 'postgresql://', 1)
+    return db_url
+
+
+def ensure_import_tables(cur, spec: TableSpec) -> None:
+    """Создаёт staging-таблицу файла и таблицу контрольных точек"""
+    columns = ', '.join(f'{name} {sql_type}' for name, sql_type, _ in spec.columns)
+    cur.execute(f'CREATE UNLOGGED TABLE IF NOT EXISTS {spec.staging} ({columns})')
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            file_name VARCHAR PRIMARY KEY,
+            rows_read BIGINT NOT NULL DEFAULT 0,
+            rows_loaded BIGINT NOT NULL DEFAULT 0,
+            finished BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def read_checkpoint(cur, file_name: str) -> Tuple[int, int, bool]:
+    """(прочитано строк CSV, загружено строк, файл загружен полностью)"""
+    cur.execute(f'SELECT rows_read, rows_loaded, finished FROM {CHECKPOINT_TABLE} WHERE file_name = %s', (file_name,))
+    row = cur.fetchone()
+    return (row[0], row[1], row[2]) if row else (0, 0, False)
+
+
+def save_checkpoint(cur, file_name: str, rows_read: int, rows_loaded: int, finished: bool) -> None:
+    cur.execute(f"""
+        INSERT INTO {CHECKPOINT_TABLE} (file_name, rows_read, rows_loaded, finished, updated_at)
+        VALUES (%s, %s, %s, %s, now())
+        ON CONFLICT (file_name) DO UPDATE
+        SET rows_read = EXCLUDED.rows_read, rows_loaded = EXCLUDED.rows_loaded,
+            finished = EXCLUDED.finished, updated_at = now()
+    """, (file_name, rows_read, rows_loaded, finished))
+
+
+def iter_csv_chunks(path: str, spec: TableSpec, skip_rows: int, chunk_rows: int) -> Iterator[Tuple[int, int, io.StringIO]]:
+    """
+    Читает CSV потоково, начиная после skip_rows строк данных.
+    Выдаёт (прочитано строк, принято строк, буфер для COPY); битые строки пропускаются.
+    """
+    parsers = [(name, parse) for name, _, parse in spec.columns]
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for _ in range(skip_rows):
+            if next(reader, None) is None:
+                return
+
+        buffer, writer = io.StringIO(), None
+        read = accepted = 0
+        for row in reader:
+            read += 1
+            try:
+                values = [parse(row[name]) for name, parse in parsers]
+            except (ValueError, KeyError, TypeError):
+                values = None
+            if values is not None:
+                if writer is None:
+                    writer = csv.writer(buffer)
+                writer.writerow(['' if value is None else value for value in values])
+                accepted += 1
+            if read >= chunk_rows:
+                buffer.seek(0)
+                yield read, accepted, buffer
+                buffer, writer = io.StringIO(), None
+                read = accepted = 0
+        if read:
+            buffer.seek(0)
+            yield read, accepted, buffer
+
+
+def load_file_to_staging(dsn: str, data_dir: str, spec: TableSpec, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict:
+    """
+    Загружает один CSV в staging-таблицу, продолжая с контрольной точки.
+    Выполняется в отдельном процессе, поэтому возвращает простой словарь.
+    """
+    path = os.path.join(data_dir, spec.file_name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл {path} не найден!")
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            ensure_import_tables(cur, spec)
+            rows_read, rows_loaded, finished = read_checkpoint(cur, spec.file_name)
+            conn.commit()
+            if finished:
+                print(f"⏭️ {spec.file_name}: уже загружен ({rows_loaded:,} строк)")
+                return {'file': spec.file_name, 'rows': rows_loaded, 'seconds': 0.0}
+            if rows_read:
+                print(f"↩️ {spec.file_name}: продолжаем с строки {rows_read:,}")
+
+            copy_sql = f"COPY {spec.staging} ({', '.join(spec.column_names)}) FROM STDIN WITH (FORMAT csv)"
+            started = time.perf_counter()
+            session_rows = 0
+            for read, accepted, buffer in iter_csv_chunks(path, spec, rows_read, chunk_rows):
+                cur.copy_expert(copy_sql, buffer)
+                rows_read += read
+                rows_loaded += accepted
+                session_rows += accepted
+                # Данные части и контрольная точка фиксируются одной транзакцией
+                save_checkpoint(cur, spec.file_name, rows_read, rows_loaded, False)
+                conn.commit()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"📥 {spec.file_name}: {rows_loaded:,} строк, "
+                    f"{session_rows / max(elapsed, 1e-9):,.0f} строк/с"
+                )
+
+            save_checkpoint(cur, spec.file_name, rows_read, rows_loaded, True)
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            return {'file': spec.file_name, 'rows': rows_loaded, 'seconds': elapsed}
+    finally:
+        conn.close()
+
+
+def _secondary_indexes(spec: TableSpec) -> List[Tuple[str, str]]:
+    """(имя, CREATE INDEX) вторичных индексов рабочей таблицы из моделей SQLAlchemy"""
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+    from database.init_database import Base
+
+    table = Base.metadata.tables[spec.table]
+    return [
+        (index.name, str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect())))
+        for index in table.indexes
+    ]
+
+
+def merge_staging(dsn: str, spec: TableSpec) -> int:
+    """
+    Переносит staging в рабочую таблицу одной транзакцией: вторичные индексы
+    удаляются, строки вставляются INSERT ... SELECT, индексы строятся заново.
+    """
+    indexes = _secondary_indexes(spec)
+    columns = ', '.join(spec.column_names)
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            for name, _ in indexes:
+                cur.execute(f'DROP INDEX IF EXISTS {name}')
+            cur.execute(f"""
+                INSERT INTO {spec.table} ({columns})
+                SELECT DISTINCT ON ({spec.key}) {columns} FROM {spec.staging}
+                ON CONFLICT ({spec.key}) DO NOTHING
+            """)
+            inserted = cur.rowcount
+            for _, create_sql in indexes:
+                cur.execute(create_sql)
+            cur.execute(f'DROP TABLE {spec.staging}')
+            cur.execute(f'DELETE FROM {CHECKPOINT_TABLE} WHERE file_name = %s', (spec.file_name,))
+        conn.commit()
+        # ANALYZE после коммита, чтобы планировщик сразу видел новые данные
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'ANALYZE {spec.table}')
+        return inserted
+    finally:
+        conn.close()
+
+
+def reset_import(dsn: str, specs: Sequence[TableSpec] = TABLES) -> None:
+    """Удаляет staging-таблицы и контрольные точки, чтобы начать импорт заново"""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            for spec in specs:
+                cur.execute(f'DROP TABLE IF EXISTS {spec.staging}')
+            cur.execute(f"""
+                DO $$ BEGIN
+                    IF to_regclass('{CHECKPOINT_TABLE}') IS NOT NULL THEN
+                        DELETE FROM {CHECKPOINT_TABLE};
+                    END IF;
+                END $$
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def forget_fingerprints(dsn: str) -> None:
+    """
+    Сбрасывает хэши продуктов для инкрементальных обновлений (database/fdc_delta.py):
+    после полного импорта они пересчитываются при следующем обновлении
+    """
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DO $$ BEGIN
+                    IF to_regclass('food_fingerprint') IS NOT NULL THEN
+                        DELETE FROM food_fingerprint;
+                    END IF;
+                END $$
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_import(
+    data_dir: str = DEFAULT_DATA_DIR,
+    workers: int = len(TABLES),
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    specs: Sequence[TableSpec] = TABLES,
+) -> Dict[str, int]:
+    """
+    Полный импорт: параллельная загрузка файлов в staging, затем перенос
+    в рабочие таблицы. Возвращает число новых строк по таблицам.
+    """
+    dsn = get_dsn()
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(load_file_to_staging, dsn, data_dir, spec, chunk_rows) for spec in specs]
+        for future in as_completed(futures):
+            result = future.result()
+            if result['seconds']:
+                print(
+                    f"✅ {result['file']}: {result['rows']:,} строк за {result['seconds']:.0f} с "
+                    f"({result['rows'] / result['seconds']:,.0f} строк/с)"
+                )
+
+    inserted = {}
+    forget_fingerprints(dsn)
+    for spec in specs:
+        merge_started = time.perf_counter()
+        inserted[spec.table] = merge_staging(dsn, spec)
+        print(
+            f"🗂️ {spec.table}: добавлено {inserted[spec.table]:,} строк, "
+            f"индексы построены за {time.perf_counter() - merge_started:.0f} с"
+        )
+
+    print(f"⏱️ Импорт завершён за {time.perf_counter() - started:.0f} с")
+    return inserted
@@ -0,0 +1,185 @@
+"""
+Материализованная таблица food_macros: калорийность и нутриенты на 100г
+по одной строке на продукт, собранная из food_nutrient.
+
+Пересборка: python -m database.food_macros
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Идентификаторы нутриентов FoodData Central (таблица nutrient.csv)
+ENERGY_KCAL_ID = 1008
+ENERGY_ATWATER_GENERAL_ID = 2047
+ENERGY_ATWATER_SPECIFIC_ID = 2048
+PROTEIN_ID = 1003
+FAT_ID = 1004
+CARBS_ID = 1005
+FIBER_ID = 1079
+SUGARS_NLEA_ID = 2000
+SUGARS_TOTAL_ID = 1063
+SODIUM_ID = 1093
+
+MACRO_FIELDS = ('kcal', 'protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')
+
+# Для каждой колонки - nutrient_id в порядке предпочтения
+_FIELD_NUTRIENTS = {
+    'kcal': (ENERGY_KCAL_ID, ENERGY_ATWATER_GENERAL_ID, ENERGY_ATWATER_SPECIFIC_ID),
+    'protein': (PROTEIN_ID,),
+    'fat': (FAT_ID,),
+    'carbs': (CARBS_ID,),
+    'fiber': (FIBER_ID,),
+    'sugar': (SUGARS_NLEA_ID, SUGARS_TOTAL_ID),
+    'sodium': (SODIUM_ID,),
+}
+
+
+def _field_expression(field: str) -> str:
+    options = [
+        f"MAX(amount) FILTER (WHERE nutrient_id = {nutrient_id})"
+        for nutrient_id in _FIELD_NUTRIENTS[field]
+    ]
+    return options[0] if len(options) == 1 else f"COALESCE({', '.join(options)})"
+
+
+_ALL_NUTRIENT_IDS = ', '.join(str(i) for ids in _FIELD_NUTRIENTS.values() for i in ids)
+
+
+def macros_insert_sql(condition: str = '') -> str:
+    """
+    Одна агрегирующая выборка по food_nutrient в food_macros; продукты без
+    энергии пропускаем. condition ограничивает набор fdc_id (SQL-условие).
+    """
+    return f"""
+        INSERT INTO food_macros (fdc_id, {', '.join(MACRO_FIELDS)})
+        SELECT fdc_id, {', '.join(_field_expression(field) for field in MACRO_FIELDS)}
+        FROM food_nutrient
+        WHERE nutrient_id IN ({_ALL_NUTRIENT_IDS}) AND amount IS NOT NULL
+        {'AND ' + condition if condition else ''}
+        GROUP BY fdc_id
+        HAVING {_field_expression('kcal')} IS NOT NULL
+    """
+
+
+REBUILD_SQL = macros_insert_sql()
+
+# Лучший продукт для каждого названия одним запросом: совпадение по началу
+# описания через индекс ix_food_description_prefix, сначала точное совпадение,
+# затем более надёжный тип данных и более короткое описание
+FIND_BY_NAMES_SQL = f"""
+    SELECT q.name, best.fdc_id, best.description, {', '.join('best.' + field for field in MACRO_FIELDS)}
+    FROM unnest(CAST(:names AS text[])) AS q(name)
+    CROSS JOIN LATERAL (
+        SELECT f.fdc_id, f.description, {', '.join('m.' + field for field in MACRO_FIELDS)}
+        FROM food f
+        JOIN food_macros m ON m.fdc_id = f.fdc_id
+        WHERE lower(f.description) ~>=~ q.name
+          AND lower(f.description) ~<~ q.name || chr(1114111)
+        ORDER BY lower(f.description) = q.name DESC,
+                 CASE f.data_type
+                     WHEN 'foundation_food' THEN 0
+                     WHEN 'sr_legacy_food' THEN 1
+                     WHEN 'survey_fndds_food' THEN 2
+                     ELSE 3
+                 END,
+                 length(f.description)
+        LIMIT 1
+    ) AS best
+"""
+
+
+def _row_to_dict(row) -> Dict:
+    mapping = row._mapping
+    result = {field: float(mapping[field]) if mapping[field] is not None else 0.0 for field in MACRO_FIELDS}
+    result['fdc_id'] = int(mapping['fdc_id'])
+    if 'description' in mapping:
+        result['description'] = mapping['description']
+    return result
+
+
+async def ensure_food_macros_schema(conn) -> None:
+    """Создаёт таблицу food_macros и индексы справочника, если их ещё нет"""
+    from database.init_database import Food, FoodMacros, FoodNutrient
+
+    def create(sync_conn):
+        FoodMacros.__table__.create(sync_conn, checkfirst=True)
+        for model in (Food, FoodNutrient):
+            for index in model.__table__.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+    await conn.run_sync(create)
+
+
+async def rebuild_food_macros() -> int:
+    """
+    Пересобирает food_macros из food_nutrient.
+    Замена идёт в одной транзакции: читатели до коммита видят старые данные.
+    """
+    from database.init_database import engine
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await ensure_food_macros_schema(conn)
+        await conn.execute(text("DELETE FROM food_macros"))
+        result = await conn.execute(text(REBUILD_SQL))
+        rows = result.rowcount
+    # ANALYZE нельзя выполнять внутри транзакции вместе с пересборкой
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE food_macros"))
+        await conn.commit()
+
+    logger.info(f"food_macros пересобрана: {rows:,} продуктов за {time.perf_counter() - started:.1f} с")
+    return rows
+
+
+async def get_macros_by_fdc_ids(fdc_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Нутриенты на 100г для списка fdc_id одним запросом по первичному ключу"""
+    from database.init_database import engine
+
+    ids = sorted({int(fdc_id) for fdc_id in fdc_ids})
+    if not ids:
+        return {}
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(f"SELECT fdc_id, {', '.join(MACRO_FIELDS)} FROM food_macros WHERE fdc_id = ANY(:ids)"),
+            {'ids': ids},
+        )
+        return {int(row.fdc_id): _row_to_dict(row) for row in result}
+
+
+async def find_macros_by_names(names: List[str]) -> List[Optional[Dict]]:
+    """
+    Лучшее совпадение в food_macros для каждого английского названия одним запросом.
+    Возвращает список в порядке names (None, если продукт не найден).
+    """
+    from database.init_database import engine
+
+    normalized = [' '.join(name.lower().split()) for name in names]
+    unique = [name for name in dict.fromkeys(normalized) if name]
+    if not unique:
+        return [None] * len(names)
+
+    async with engine.connect() as conn:
+        result = await conn.execute(text(FIND_BY_NAMES_SQL), {'names': unique})
+        found = {row.name: _row_to_dict(row) for row in result}
+    return [found.get(name) for name in normalized]
+
+
+async def main():
+    from database.init_database import engine
+
+    print("🔄 Пересборка таблицы food_macros...")
+    start_time = time.time()
+    rows = await rebuild_food_macros()
+    await engine.dispose()
+    print(f"✅ food_macros готова: {rows:,} продуктов за {time.time() - start_time:.1f} с")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
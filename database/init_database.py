@@ -1,11 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
-from sqlalchemy import BigInteger, JSON, Float, String, Integer, ForeignKey, Column, DateTime, text, Boolean
+from sqlalchemy import BigInteger, JSON, Float, String, Integer, ForeignKey, Column, DateTime, text, Boolean, Index
 from dotenv import load_dotenv
 from sqlalchemy.orm import relationship
 import os
-import psycopg2
-import csv
 from datetime import datetime
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -53,7 +51,8 @@ class Meal(Base):
     carbs = Column(Float, nullable=True, default=0)    # Углеводы
     fiber = Column(Float, nullable=True, default=0)    # Клетчатка
     sugar = Column(Float, nullable=True, default=0)    # Сахар
-    sodium = Column(Float, nullable=True, default=0)   # Натрий
+    sodium = Column(Float, nullable=True, default=0)   # Натрий, мг
+    fdc_id = Column(BigInteger, nullable=True, index=True)  # Продукт FoodData Central, если определён
     date = Column(String, nullable=False)
     time = Column(String, nullable=False)
     meal_type = Column(String, nullable=True, default='other')  # breakfast, lunch, dinner, snack, other
@@ -112,6 +111,10 @@ class Subscription(Base):
 
 class Food(Base):
     __tablename__ = 'food'
+    __table_args__ = (
+        # Поиск по началу названия без учёта регистра (LIKE 'chicken%')
+        Index('ix_food_description_prefix', text('lower(description) text_pattern_ops')),
+    )
     fdc_id = mapped_column(BigInteger, primary_key=True)
     description = mapped_column(String)
     food_category_id = mapped_column(String, nullable=True)
@@ -119,11 +122,117 @@ class Food(Base):
 
 class FoodNutrient(Base):
     __tablename__ = 'food_nutrient'
+    __table_args__ = (
+        Index('ix_food_nutrient_fdc_nutrient', 'fdc_id', 'nutrient_id'),
+    )
     id = mapped_column(BigInteger, primary_key=True)
     fdc_id = mapped_column(BigInteger)
     nutrient_id = mapped_column(BigInteger)
     amount = mapped_column(Float)
 
+class FoodMacros(Base):
+    """Материализованные макронутриенты на 100г: одна строка на продукт (см. database/food_macros.py)"""
+    __tablename__ = 'food_macros'
+    fdc_id = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    kcal = mapped_column(Float, nullable=False)
+    protein = mapped_column(Float, nullable=True)
+    fat = mapped_column(Float, nullable=True)
+    carbs = mapped_column(Float, nullable=True)
+    fiber = mapped_column(Float, nullable=True)
+    sugar = mapped_column(Float, nullable=True)
+    sodium = mapped_column(Float, nullable=True)  # мг
+
+class FoodFingerprint(Base):
+    """Хэши строк food и food_nutrient по продукту для сравнения релизов FDC"""
+    __tablename__ = 'food_fingerprint'
+    fdc_id = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    food_hash = mapped_column(String(32), nullable=False)
+    nutrient_hash = mapped_column(String(32), nullable=False)
+
+class FoodRelease(Base):
+    """Применённые релизы FoodData Central"""
+    __tablename__ = 'food_release'
+    id = mapped_column(Integer, primary_key=True)
+    release = mapped_column(String, nullable=False, unique=True)
+    applied_at = mapped_column(DateTime, default=datetime.utcnow)
+    inserted = mapped_column(Integer, default=0)
+    updated = mapped_column(Integer, default=0)
+    deleted = mapped_column(Integer, default=0)
+
+class DishRecipe(Base):
+    """Состав блюда: доли ингредиентов FoodData Central по весу (см. api/ai_api/dish_nutrition.py)"""
+    __tablename__ = 'dish_recipe'
+    id = mapped_column(Integer, primary_key=True)
+    dish = mapped_column(String, nullable=False, index=True)
+    ingredient = mapped_column(String, nullable=False)  # Название для поиска в FDC, 'water' - без нутриентов
+    fdc_id = mapped_column(BigInteger, nullable=True)
+    fraction = mapped_column(Float, nullable=False)  # Доля в весе готового блюда
+
+class FoodAlias(Base):
+    """Выученные соответствия названий продуктов и fdc_id (см. api/ai_api/food_alias.py)"""
+    __tablename__ = 'food_alias'
+    __table_args__ = (
+        # Список неуверенных соответствий для проверки администратором
+        Index('ix_food_alias_confidence', 'confidence'),
+    )
+    normalized_text = mapped_column(String, primary_key=True)
+    sample_text = mapped_column(String, nullable=False)  # Исходное название для перенормализации
+    fdc_id = mapped_column(BigInteger, nullable=False)
+    confidence = mapped_column(Float, nullable=False)
+    hits = mapped_column(Integer, nullable=False, default=0)
+    source = mapped_column(String, nullable=True)  # local, database, search, llm, admin
+    created_at = mapped_column(DateTime, default=datetime.utcnow)
+    last_seen_at = mapped_column(DateTime, default=datetime.utcnow)
+
+class RecentFood(Base):
+    """Частые продукты пользователя для быстрого добавления (см. api/ai_api/recent_foods.py)"""
+    __tablename__ = 'recent_food'
+    __table_args__ = (
+        Index('ux_recent_food_user_key', 'user_id', 'food_key', unique=True),
+        # Верхние N продуктов пользователя без сортировки
+        Index('ix_recent_food_user_score', 'user_id', 'score'),
+    )
+    id = mapped_column(Integer, primary_key=True)
+    user_id = mapped_column(BigInteger, nullable=False)
+    food_key = mapped_column(String, nullable=False)  # normalize_food_key(food_name)
+    food_name = mapped_column(String, nullable=False)
+    fdc_id = mapped_column(BigInteger, nullable=True)
+    # Значения на 100г
+    calories = mapped_column(Float, nullable=False)
+    protein = mapped_column(Float, nullable=True)
+    fat = mapped_column(Float, nullable=True)
+    carbs = mapped_column(Float, nullable=True)
+    fiber = mapped_column(Float, nullable=True)
+    sugar = mapped_column(Float, nullable=True)
+    sodium = mapped_column(Float, nullable=True)  # мг
+    weight_grams = mapped_column(Float, nullable=False)  # Типичная порция (сглаженная)
+    uses = mapped_column(Integer, nullable=False, default=1)
+    score = mapped_column(Float, nullable=False)  # Частота с затуханием по времени, log2
+    last_used_at = mapped_column(DateTime, default=datetime.utcnow)
+
+class FoodPopularity(Base):
+    """Самые частые продукты в meals по нормализованному названию (см. api/ai_api/nutrition_warmup.py)"""
+    __tablename__ = 'food_popularity'
+    food_key = mapped_column(String, primary_key=True)  # normalize_food_key(food_name)
+    food_name = mapped_column(String, nullable=False)  # Самое частое написание
+    meals = mapped_column(Integer, nullable=False)
+    users = mapped_column(Integer, nullable=False)
+    updated_at = mapped_column(DateTime, default=datetime.utcnow)
+
+class ProductBarcode(Base):
+    """Упакованные продукты Open Food Facts по штрихкоду, значения на 100г (см. database/off_import.py)"""
+    __tablename__ = 'product_barcode'
+    ean = mapped_column(BigInteger, primary_key=True, autoincrement=False)  # GTIN как число (utils/barcode.py)
+    name = mapped_column(String, nullable=False)
+    brand = mapped_column(String, nullable=True)
+    kcal = mapped_column(Float, nullable=False)
+    protein = mapped_column(Float, nullable=True)
+    fat = mapped_column(Float, nullable=True)
+    carbs = mapped_column(Float, nullable=True)
+    fiber = mapped_column(Float, nullable=True)
+    sugar = mapped_column(Float, nullable=True)
+    sodium = mapped_column(Float, nullable=True)  # мг
+
 class WebUser(Base):
     """Модель пользователей веб-приложения (замена Supabase)"""
     __tablename__ = 'web_users'
@@ -233,6 +342,18 @@ async_session_maker = async_session
 
 default_metadata = Base.metadata
 
+async def migrate_meals_table():
+    """
+    Добавляет в существующую таблицу meals колонки, появившиеся позже
+    (create_all не меняет уже созданные таблицы)
+    """
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE meals ADD COLUMN IF NOT EXISTS fdc_id BIGINT"))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_meals_fdc_id ON meals (fdc_id)"))
+    except Exception as e:
+        print(f"Ошибка обновления таблицы meals: {e}")
+
 async def init_db():
     """Инициализация базы данных с оптимизированными настройками"""
     try:
@@ -258,50 +379,4 @@ async def init_db():
         # Создаем таблицы в любом случае
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-
-def import_food_csv():
-    import os
-    db_url = os.getenv('DATABASE_URL')
-    if db_url.startswith('postgres://'):
-        db_url = db_url.replace('postgres://', 'postgresql://', 1)
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    with open('fooddata_tmp/FoodData_Central_csv_2025-04-24/food.csv', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        batch = []
-        for row in reader:
-            batch.append((int(row['fdc_id']), row['description'], row.get('food_category_id'), row.get('data_type')))
-            if len(batch) >= 10000:
-                cur.executemany('INSERT INTO food (fdc_id, description, food_category_id, data_type) VALUES (%s, %s, %s, %s) ON CONFLICT (fdc_id) DO NOTHING', batch)
-                batch = []
-        if batch:
-            cur.executemany('INSERT INTO food (fdc_id, description, food_category_id, data_type) VALUES (%s, %s, %s, %s) ON CONFLICT (fdc_id) DO NOTHING', batch)
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def import_food_nutrient_csv():
-    import os
-    db_url = os.getenv('DATABASE_URL')
-    if db_url.startswith('postgres://'):
-        db_url = db_url.replace('postgres://', 'postgresql://', 1)
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    with open('fooddata_tmp/FoodData_Central_csv_2025-04-24/food_nutrient.csv', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        batch = []
-        for row in reader:
-            try:
-                batch.append((int(row['id']), int(row['fdc_id']), int(row['nutrient_id']), float(row['amount'])))
-            except Exception:
-                continue
-            if len(batch) >= 10000:
-                cur.executemany('INSERT INTO food_nutrient (id, fdc_id, nutrient_id, amount) VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO NOTHING', batch)
-                batch = []
-        if batch:
-            cur.executemany('INSERT INTO food_nutrient (id, fdc_id, nutrient_id, amount) VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO NOTHING', batch)
-    conn.commit()
-    cur.close()
-    conn.close()
-
-
+    await migrate_meals_table()
@@ -0,0 +1,306 @@
+"""
+Потоковый импорт дампа Open Food Facts в таблицу product_barcode.
+
+Поддерживаются CSV-экспорт (en.openfoodfacts.org.products.csv[.gz], колонки
+через табуляцию) и JSONL-дамп (openfoodfacts-products.jsonl[.gz]). Файл
+читается построчно (gzip распаковывается на лету), в таблицу попадают только
+продукты с корректным штрихкодом и калорийностью: штрихкод, название, бренд
+и нутриенты на 100г. Части загружаются через COPY в UNLOGGED staging-таблицу
+с контрольными точками (как в database/fdc_import.py), затем переносятся
+в product_barcode одним INSERT ... ON CONFLICT.
+
+Запуск: python -m database.off_import --dump fooddata_tmp/openfoodfacts-products.jsonl.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+from database.fdc_import import (
+    CHECKPOINT_TABLE, DEFAULT_CHUNK_ROWS, TableSpec, ensure_import_tables, get_dsn, read_checkpoint, save_checkpoint,
+)
+from utils.barcode import normalize_barcode
+
+DEFAULT_DUMP = os.getenv('OFF_DUMP_PATH', 'fooddata_tmp/openfoodfacts-products.jsonl.gz')
+
+MAX_NAME_LENGTH = 200
+KJ_PER_KCAL = 4.184
+# Соль (NaCl) в 2.5 раза тяжелее содержащегося в ней натрия
+SALT_PER_SODIUM = 2.5
+
+OFF_TABLE = TableSpec('openfoodfacts', 'product_barcode', 'ean', (
+    ('ean', 'BIGINT', int),
+    ('name', 'VARCHAR', str),
+    ('brand', 'VARCHAR', str),
+    ('kcal', 'DOUBLE PRECISION', float),
+    ('protein', 'DOUBLE PRECISION', float),
+    ('fat', 'DOUBLE PRECISION', float),
+    ('carbs', 'DOUBLE PRECISION', float),
+    ('fiber', 'DOUBLE PRECISION', float),
+    ('sugar', 'DOUBLE PRECISION', float),
+    ('sodium', 'DOUBLE PRECISION', float),
+))
+
+# Поля Open Food Facts на 100г и допустимый диапазон значения
+_NUTRIMENTS = (
+    ('protein', 'proteins_100g', 100.0),
+    ('fat', 'fat_100g', 100.0),
+    ('carbs', 'carbohydrates_100g', 100.0),
+    ('fiber', 'fiber_100g', 100.0),
+    ('sugar', 'sugars_100g', 100.0),
+)
+_NAME_FIELDS = ('product_name_ru', 'product_name', 'generic_name_ru', 'generic_name')
+
+Getter = Callable[[str], object]
+
+
+def _number(value, upper: float) -> Optional[float]:
+    """Число из поля дампа в диапазоне [0, upper] или None"""
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if number != number or number < 0 or number > upper:
+        return None
+    return round(number, 3)
+
+
+def _text(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    value = ' '.join(value.split())
+    return value[:MAX_NAME_LENGTH] or None
+
+
+def parse_product(code, get_field: Getter, get_nutriment: Getter) -> Optional[List]:
+    """
+    Строка product_barcode из полей продукта или None, если продукт
+    бесполезен для поиска по штрихкоду (нет кода, названия или калорий)
+    """
+    ean = normalize_barcode(code)
+    if ean is None:
+        return None
+    name = next((text for text in map(_text, map(get_field, _NAME_FIELDS)) if text), None)
+    if name is None:
+        return None
+
+    kcal = _number(get_nutriment('energy-kcal_100g'), 900.0)
+    if kcal is None:
+        kj = _number(get_nutriment('energy_100g'), 900.0 * KJ_PER_KCAL)
+        kcal = round(kj / KJ_PER_KCAL, 1) if kj is not None else None
+    if kcal is None:
+        return None
+
+    values = {field: _number(get_nutriment(key), upper) for field, key, upper in _NUTRIMENTS}
+    sodium = _number(get_nutriment('sodium_100g'), 100.0)
+    if sodium is None:
+        salt = _number(get_nutriment('salt_100g'), 100.0)
+        sodium = salt / SALT_PER_SODIUM if salt is not None else None
+    # В дампе натрий в граммах, в справочнике - в миллиграммах
+    values['sodium'] = round(sodium * 1000.0, 1) if sodium is not None else None
+
+    brand = _text(get_field('brands'))
+    if brand:
+        brand = brand.split(',')[0].strip() or None
+    return [ean, name, brand, kcal] + [values[field] for field in ('protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')]
+
+
+def _open_text(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    return open(path, encoding='utf-8', errors='replace', newline='')
+
+
+def iter_jsonl_products(f, skip_rows: int = 0) -> Iterator[Optional[List]]:
+    """По элементу на строку дампа: строка product_barcode или None"""
+    for line in itertools.islice(f, skip_rows, None):
+        # Дешёвая проверка до разбора JSON: без энергии продукт не нужен
+        if '"energy' not in line:
+            yield None
+            continue
+        try:
+            product = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        nutriments = product.get('nutriments') or {}
+        yield parse_product(product.get('code'), product.get, nutriments.get)
+
+
+def iter_csv_products(f, skip_rows: int = 0) -> Iterator[Optional[List]]:
+    """По элементу на строку CSV-экспорта (табуляция, без кавычек): строка product_barcode или None"""
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+    reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+    header = next(reader, None)
+    if not header:
+        return
+    columns = {name: i for i, name in enumerate(header)}
+    code_column = columns.get('code')
+    if code_column is None:
+        raise ValueError("В CSV Open Food Facts нет колонки code")
+
+    for row in itertools.islice(reader, skip_rows, None):
+        if len(row) != len(header):
+            yield None
+            continue
+        get = lambda name: row[columns[name]] if name in columns else None
+        yield parse_product(row[code_column], get, get)
+
+
+def iter_dump_chunks(path: str, skip_rows: int, chunk_rows: int) -> Iterator[Tuple[int, int, io.StringIO]]:
+    """
+    Читает дамп потоково, начиная после skip_rows продуктов.
+    Выдаёт (прочитано продуктов, принято, буфер для COPY).
+    """
+    with _open_text(path) as f:
+        is_jsonl = '.json' in os.path.basename(path)
+        # Пропущенные при продолжении строки не разбираются
+        products = iter_jsonl_products(f, skip_rows) if is_jsonl else iter_csv_products(f, skip_rows)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        read = accepted = 0
+        for values in products:
+            read += 1
+            if values is not None:
+                writer.writerow(['' if value is None else value for value in values])
+                accepted += 1
+            if read >= chunk_rows:
+                buffer.seek(0)
+                yield read, accepted, buffer
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                read = accepted = 0
+        if read:
+            buffer.seek(0)
+            yield read, accepted, buffer
+
+
+def load_dump_to_staging(dsn: str, path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """Загружает дамп в staging-таблицу, продолжая с контрольной точки. Возвращает число продуктов"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл {path} не найден!")
+    spec = OFF_TABLE
+    checkpoint = os.path.basename(path)
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            ensure_import_tables(cur, spec)
+            rows_read, rows_loaded, finished = read_checkpoint(cur, checkpoint)
+            conn.commit()
+            if finished:
+                print(f"⏭️ {checkpoint}: уже загружен ({rows_loaded:,} продуктов)")
+                return rows_loaded
+            if rows_read:
+                print(f"↩️ {checkpoint}: продолжаем с продукта {rows_read:,}")
+
+            copy_sql = f"COPY {spec.staging} ({', '.join(spec.column_names)}) FROM STDIN WITH (FORMAT csv)"
+            started = time.perf_counter()
+            session_rows = 0
+            for read, accepted, buffer in iter_dump_chunks(path, rows_read, chunk_rows):
+                cur.copy_expert(copy_sql, buffer)
+                rows_read += read
+                rows_loaded += accepted
+                session_rows += read
+                save_checkpoint(cur, checkpoint, rows_read, rows_loaded, False)
+                conn.commit()
+                elapsed = time.perf_counter() - started
+                print(
+                    f"📥 {checkpoint}: прочитано {rows_read:,}, с калориями и штрихкодом {rows_loaded:,}, "
+                    f"{session_rows / max(elapsed, 1e-9):,.0f} продуктов/с"
+                )
+
+            save_checkpoint(cur, checkpoint, rows_read, rows_loaded, True)
+            conn.commit()
+            return rows_loaded
+    finally:
+        conn.close()
+
+
+def merge_products(dsn: str, checkpoint: str) -> int:
+    """
+    Переносит staging в product_barcode одной транзакцией: читатели видят
+    либо старые данные, либо новые целиком. Продукты, исчезнувшие из дампа,
+    остаются - пользователи могли уже сохранить их штрихкоды.
+    """
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    from database.init_database import ProductBarcode
+
+    spec = OFF_TABLE
+    columns = spec.column_names
+    updates = ', '.join(f'{name} = EXCLUDED.{name}' for name in columns if name != spec.key)
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(str(CreateTable(ProductBarcode.__table__, if_not_exists=True).compile(dialect=postgresql.dialect())))
+            cur.execute(f"""
+                INSERT INTO {spec.table} ({', '.join(columns)})
+                SELECT DISTINCT ON ({spec.key}) {', '.join(columns)} FROM {spec.staging}
+                ORDER BY {spec.key}
+                ON CONFLICT ({spec.key}) DO UPDATE SET {updates}
+            """)
+            merged = cur.rowcount
+            cur.execute(f'DROP TABLE {spec.staging}')
+            cur.execute(f'DELETE FROM {CHECKPOINT_TABLE} WHERE file_name = %s', (checkpoint,))
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'ANALYZE {spec.table}')
+        return merged
+    finally:
+        conn.close()
+
+
+def run_off_import(path: str = DEFAULT_DUMP, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, int]:
+    dsn = get_dsn()
+    started = time.perf_counter()
+    loaded = load_dump_to_staging(dsn, path, chunk_rows)
+    merged = merge_products(dsn, os.path.basename(path))
+    print(f"⏱️ Импорт Open Food Facts завершён за {time.perf_counter() - started:.0f} с")
+    return {'loaded': loaded, 'merged': merged}
+
+
+def reset_off_import(dsn: str, checkpoint: str) -> None:
+    """Удаляет staging-таблицу и контрольную точку дампа (контрольные точки FDC не трогает)"""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            ensure_import_tables(cur, OFF_TABLE)
+            cur.execute(f'DROP TABLE {OFF_TABLE.staging}')
+            cur.execute(f'DELETE FROM {CHECKPOINT_TABLE} WHERE file_name = %s', (checkpoint,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Импорт дампа Open Food Facts (штрихкоды) в PostgreSQL")
+    parser.add_argument('--dump', default=DEFAULT_DUMP, help="CSV или JSONL дамп, можно .gz")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Продуктов в одной части COPY")
+    parser.add_argument('--restart', action='store_true', help="Начать заново, игнорируя контрольные точки")
+    args = parser.parse_args()
+
+    if args.restart:
+        reset_off_import(get_dsn(), os.path.basename(args.dump))
+        print("🧹 Контрольные точки и staging-таблица удалены")
+    try:
+        counts = run_off_import(args.dump, args.chunk_rows)
+    except Exception as e:
+        print(f"\n❌ Импорт прерван: {e}")
+        print("↩️ Повторный запуск продолжит загрузку с последней контрольной точки")
+        raise SystemExit(1)
+    print(f"✅ Загружено продуктов со штрихкодом: {counts['loaded']:,}, в product_barcode: {counts['merged']:,}")
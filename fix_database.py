@@ -37,6 +37,14 @@ async def fix_database():
             except Exception as e:
                 print(f"Ошибка при добавлении колонки в meals {column}: {e}")
         
+        # Связь приёма пищи с продуктом FoodData Central (заполняет api/ai_api/meal_nutrients.py)
+        try:
+            await conn.execute(text("ALTER TABLE meals ADD COLUMN IF NOT EXISTS fdc_id BIGINT"))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_meals_fdc_id ON meals (fdc_id)"))
+            print("Добавлена колонка в meals: fdc_id")
+        except Exception as e:
+            print(f"Ошибка при добавлении колонки в meals fdc_id: {e}")
+        
         # Создаем таблицу daily_stats
         try:
             await conn.execute(text("""
@@ -1,193 +1,63 @@
-import os
-import csv
-import psycopg2
-from dotenv import load_dotenv
+import argparse
+import asyncio
 import time
-from tqdm import tqdm
+from dotenv import load_dotenv
+
+from database.fdc_import import DEFAULT_CHUNK_ROWS, DEFAULT_DATA_DIR, TABLES, get_dsn, reset_import, run_import
 
 load_dotenv()
 
-def get_file_line_count(file_path):
-    """Подсчитывает количество строк в файле"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return sum(1 for _ in f) - 1  # -1 для заголовка
+def parse_args():
+    parser = argparse.ArgumentParser(description="Импорт данных FoodData Central в PostgreSQL через COPY")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Папка с распакованными CSV FoodData Central")
+    parser.add_argument('--workers', type=int, default=len(TABLES), help="Сколько файлов загружать параллельно")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Строк в одной части COPY (шаг контрольной точки)")
+    parser.add_argument('--restart', action='store_true', help="Начать заново, игнорируя контрольные точки")
+    parser.add_argument('--skip-macros', action='store_true', help="Не пересобирать food_macros после импорта")
+    return parser.parse_args()
 
-def import_food_csv():
-    """Импортирует данные из food.csv с прогресс-баром"""
-    print("🍽️ Начинаем импорт таблицы food...")
-    
-    db_url = os.getenv('DATABASE_URL')
-    if db_url.startswith('postgres://'):
-        db_url = db_url.replace('postgres://', 'postgresql://', 1)
-    
-    file_path = 'fooddata_tmp/FoodData_Central_csv_2025-04-24/food.csv'
-    
-    if not os.path.exists(file_path):
-        print(f"❌ Файл {file_path} не найден!")
-        return False
-    
-    total_lines = get_file_line_count(file_path)
-    print(f"📊 Всего строк для импорта: {total_lines:,}")
-    
-    try:
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        
-        with open(file_path, encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            batch = []
-            imported = 0
-            
-            with tqdm(total=total_lines, desc="Импорт food") as pbar:
-                for row in reader:
-                    try:
-                        batch.append((
-                            int(row['fdc_id']), 
-                            row['description'], 
-                            row.get('food_category_id'), 
-                            row.get('data_type')
-                        ))
-                    except (ValueError, KeyError) as e:
-                        print(f"⚠️ Ошибка в строке: {e}")
-                        continue
-                    
-                    if len(batch) >= 1000:  # Уменьшил размер батча для стабильности
-                        try:
-                            cur.executemany(
-                                'INSERT INTO food (fdc_id, description, food_category_id, data_type) VALUES (%s, %s, %s, %s) ON CONFLICT (fdc_id) DO NOTHING', 
-                                batch
-                            )
-                            imported += len(batch)
-                            conn.commit()
-                            pbar.update(len(batch))
-                            batch = []
-                        except Exception as e:
-                            print(f"❌ Ошибка при вставке батча: {e}")
-                            conn.rollback()
-                            batch = []
-                
-                # Вставляем оставшиеся записи
-                if batch:
-                    try:
-                        cur.executemany(
-                            'INSERT INTO food (fdc_id, description, food_category_id, data_type) VALUES (%s, %s, %s, %s) ON CONFLICT (fdc_id) DO NOTHING', 
-                            batch
-                        )
-                        imported += len(batch)
-                        conn.commit()
-                        pbar.update(len(batch))
-                    except Exception as e:
-                        print(f"❌ Ошибка при вставке последнего батча: {e}")
-                        conn.rollback()
-        
-        print(f"✅ Импорт food завершён! Импортировано: {imported:,} записей")
-        cur.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Критическая ошибка при импорте food: {e}")
-        return False
+async def rebuild_derived_tables():
+    """
+    Пересборка food_macros и блюд по рецептам в одном цикле событий: пул
+    соединений engine привязан к циклу, поэтому в конце он закрывается
+    """
+    from database.init_database import engine
+    from database.food_macros import rebuild_food_macros
+    from api.ai_api.dish_nutrition import rebuild_dish_nutrition
 
-def import_food_nutrient_csv():
-    """Импортирует данные из food_nutrient.csv с прогресс-баром"""
-    print("🥗 Начинаем импорт таблицы food_nutrient...")
-    
-    db_url = os.getenv('DATABASE_URL')
-    if db_url.startswith('postgres://'):
-        db_url = db_url.replace('postgres://', 'postgresql://', 1)
-    
-    file_path = 'fooddata_tmp/FoodData_Central_csv_2025-04-24/food_nutrient.csv'
-    
-    if not os.path.exists(file_path):
-        print(f"❌ Файл {file_path} не найден!")
-        return False
-    
-    total_lines = get_file_line_count(file_path)
-    print(f"📊 Всего строк для импорта: {total_lines:,}")
-    
     try:
-        conn = psycopg2.connect(db_url)
-        cur = conn.cursor()
-        
-        with open(file_path, encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            batch = []
-            imported = 0
-            
-            with tqdm(total=total_lines, desc="Импорт food_nutrient") as pbar:
-                for row in reader:
-                    try:
-                        batch.append((
-                            int(row['id']), 
-                            int(row['fdc_id']), 
-                            int(row['nutrient_id']), 
-                            float(row['amount'])
-                        ))
-                    except (ValueError, KeyError) as e:
-                        print(f"⚠️ Ошибка в строке: {e}")
-                        continue
-                    
-                    if len(batch) >= 1000:  # Уменьшил размер батча
-                        try:
-                            cur.executemany(
-                                'INSERT INTO food_nutrient (id, fdc_id, nutrient_id, amount) VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO NOTHING', 
-                                batch
-                            )
-                            imported += len(batch)
-                            conn.commit()
-                            pbar.update(len(batch))
-                            batch = []
-                        except Exception as e:
-                            print(f"❌ Ошибка при вставке батча: {e}")
-                            conn.rollback()
-                            batch = []
-                
-                # Вставляем оставшиеся записи
-                if batch:
-                    try:
-                        cur.executemany(
-                            'INSERT INTO food_nutrient (id, fdc_id, nutrient_id, amount) VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO NOTHING', 
-                            batch
-                        )
-                        imported += len(batch)
-                        conn.commit()
-                        pbar.update(len(batch))
-                    except Exception as e:
-                        print(f"❌ Ошибка при вставке последнего батча: {e}")
-                        conn.rollback()
-        
-        print(f"✅ Импорт food_nutrient завершён! Импортировано: {imported:,} записей")
-        cur.close()
-        conn.close()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Критическая ошибка при импорте food_nutrient: {e}")
-        return False
+        print("\n🔄 Пересборка food_macros...")
+        rows = await rebuild_food_macros()
+        print(f"✅ food_macros: {rows:,} продуктов")
+
+        try:
+            dishes = await rebuild_dish_nutrition()
+            print(f"✅ Блюда по рецептам пересчитаны: {dishes}")
+        except Exception as e:
+            # Импорт уже завершён - блюда можно пересчитать отдельно: python -m api.ai_api.dish_nutrition
+            print(f"⚠️ Не удалось пересчитать блюда по рецептам: {e}")
+    finally:
+        await engine.dispose()
 
 if __name__ == "__main__":
-    print("🚀 Запуск импорта данных FoodData Central в Neon PostgreSQL")
+    args = parse_args()
+    print("🚀 Запуск импорта данных FoodData Central в PostgreSQL")
     print("=" * 60)
-    
+
     start_time = time.time()
-    
-    # Импортируем food.csv
-    food_success = import_food_csv()
-    
-    if food_success:
-        print("\n" + "=" * 60)
-        # Импортируем food_nutrient.csv
-        nutrient_success = import_food_nutrient_csv()
-        
-        if nutrient_success:
-            end_time = time.time()
-            duration = end_time - start_time
-            print(f"\n🎉 Импорт завершён успешно за {duration:.2f} секунд")
-        else:
-            print("\n❌ Импорт food_nutrient не удался")
-    else:
-        print("\n❌ Импорт food не удался")
-    
-    print("\n📊 Проверяем результат...")
-    os.system("python check_db_status.py") 
\ No newline at end of file
+
+    if args.restart:
+        reset_import(get_dsn())
+        print("🧹 Контрольные точки и staging-таблицы удалены")
+
+    try:
+        run_import(args.data_dir, workers=args.workers, chunk_rows=args.chunk_rows)
+    except Exception as e:
+        print(f"\n❌ Импорт прерван: {e}")
+        print("↩️ Повторный запуск продолжит загрузку с последней контрольной точки")
+        raise SystemExit(1)
+
+    if not args.skip_macros:
+        asyncio.run(rebuild_derived_tables())
+
+    print(f"\n🎉 Импорт завершён успешно за {time.time() - start_time:.2f} секунд")
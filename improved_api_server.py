@@ -4,7 +4,7 @@ from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import select, text
-from database.init_database import Base, engine, User, Meal, Preset, Food, FoodNutrient
+from database.init_database import Base, engine, User, Meal, Preset, Food, FoodNutrient, migrate_meals_table
 import os
 import requests
 import asyncio
@@ -16,8 +16,22 @@ from api.ai_api.generate_text import translate
 import re
 from typing import List, Dict, Optional
 from food_search_helper import get_search_variants, get_fallback_nutrition, translate_food_name
-from api.ai_api.gigachat_api import GigaChatAPI, generate_text_gigachat
+from api.ai_api.gigachat_api import gigachat, generate_text_gigachat
+from api.ai_api.llm_router import llm_router
+from api.ai_api.llm_scheduler import llm_scheduler
 from api.ai_api.nutrition_api import NutritionAPI
+from api.ai_api.local_nutrition import local_nutrition
+from api.ai_api.food_search_index import food_search_index
+from api.ai_api.nutrition_snapshot import init_nutrition_reference
+from api.ai_api.food_alias import food_aliases, food_alias_task, REVIEW_CONFIDENCE
+from api.ai_api.meal_nutrients import MICRO_FIELDS, link_food, micronutrients_for
+from api.ai_api.dish_nutrition import init_dish_nutrition
+from api.ai_api.barcode_products import barcode_products
+from api.ai_api.nutrition_warmup import food_popularity_task, warm_up_nutrition_cache
+from api.ai_api.recent_foods import DEFAULT_LIMIT as RECENT_FOODS_LIMIT, MAX_PER_USER as RECENT_FOODS_MAX, get_recent_food, get_recent_foods, init_recent_foods, record_recent_food
+from api.ai_api.nutrition_cache import scale_nutrition
+from utils.barcode import normalize_barcode
+from api.ai_api.food_autocomplete import food_autocomplete, refresh_food_autocomplete, food_autocomplete_refresh_task
 from datetime import datetime, timedelta
 import pytz
 from api.auth_api import register_user, login_user, confirm_user, get_current_user, UserRegister, UserLogin, UserConfirm
@@ -50,7 +64,7 @@ app.add_middleware(
 )
 
 # Инициализируем API
-gigachat_api = GigaChatAPI()
+gigachat_api = gigachat
 nutrition_api = NutritionAPI()
 
 # Создаем сессию после инициализации engine
@@ -135,15 +149,34 @@ async def daily_reset_task():
 @app.on_event("startup")
 async def startup_event():
     logging.info("🚀 API сервер запущен!")
-    # Запускаем фоновую задачу
+    # Колонки meals, добавленные после создания таблицы
+    await migrate_meals_table()
+    # Пул соединений к GigaChat на всё время работы процесса
+    await gigachat.startup()
+    # Справочник FoodData Central: офлайн-снимок через mmap, при его отсутствии - из БД
+    await init_nutrition_reference()
+    await init_dish_nutrition()
+    await init_recent_foods()
+    await food_aliases.load()
+    await refresh_food_autocomplete()
+    # Популярные продукты определяем до приёма запросов (ограничено по времени и параллельности)
+    await warm_up_nutrition_cache(
+        lambda names: nutrition_api.get_nutrition_batch([(name, 100) for name in names])
+    )
+    # Запускаем фоновые задачи
     asyncio.create_task(daily_reset_task())
+    asyncio.create_task(food_autocomplete_refresh_task(shutdown_event))
+    asyncio.create_task(food_alias_task(shutdown_event))
+    asyncio.create_task(food_popularity_task(shutdown_event))
 
 @app.on_event("shutdown")
 async def shutdown_event_handler():
     logging.info("🛑 API сервер останавливается...")
     shutdown_event.set()
+    await food_aliases.flush()
     # Даем время на завершение операций
     await asyncio.sleep(2)
+    await gigachat.close()
     logging.info("✅ API сервер остановлен")
 
 # Модели данных
@@ -199,6 +232,13 @@ async def add_meal(meal: dict):
         fat = meal.get('fat', 0)
         carbs = meal.get('carbs', 0)
         
+        # Связываем с продуктом FoodData Central и досчитываем клетчатку, сахар и натрий
+        fdc_id = meal.get('fdc_id') or link_food(food_name)
+        micro = {field: meal.get(field) for field in MICRO_FIELDS}
+        if any(value is None for value in micro.values()):
+            computed = micronutrients_for(fdc_id, float(weight_grams)) or {}
+            micro = {field: value if value is not None else computed.get(field, 0) for field, value in micro.items()}
+        
         # Создаем запись в базе данных
         async with async_session() as session:
             new_meal = Meal(
@@ -210,11 +250,20 @@ async def add_meal(meal: dict):
                 protein=protein,
                 fat=fat,
                 carbs=carbs,
+                fiber=micro['fiber'],
+                sugar=micro['sugar'],
+                sodium=micro['sodium'],
+                fdc_id=fdc_id,
                 date=date,
                 time=time,
                 meal_type=meal_type
             )
             session.add(new_meal)
+            # Частые продукты обновляются в той же транзакции
+            await record_recent_food(
+                session, user_id, food_name, weight_grams,
+                {'calories': calories, 'protein': protein, 'fat': fat, 'carbs': carbs, **micro}, fdc_id
+            )
             await session.commit()
             
             # Обновляем счетчик пользователя
@@ -233,6 +282,8 @@ async def add_meal(meal: dict):
                 "protein": protein,
                 "fat": fat,
                 "carbs": carbs,
+                **micro,
+                "fdc_id": fdc_id,
                 "source": "GigaChat"
             }
         }
@@ -383,65 +434,55 @@ async def add_preset_meals(data: dict):
             if not preset:
                 raise HTTPException(status_code=404, detail="Шаблон не найден")
             
-            # Добавляем каждое блюдо из шаблона
+            # Рассчитываем все блюда шаблона одним пакетным запросом
+            food_items = [item for item in (preset.food_items or []) if item.get('food_name')]
+            nutrition_list = await nutrition_api.get_nutrition_batch(
+                [(item['food_name'], float(item.get('weight', 100))) for item in food_items]
+            )
+            
             total_calories = 0
             total_protein = 0
             total_fat = 0
             total_carbs = 0
             meals_count = 0
+            now = datetime.now()
             
-            for food_item in preset.food_items:
-                food_name = food_item.get('food_name')
-                weight = food_item.get('weight', 100)
+            for nutrition in nutrition_list:
+                # Клетчатка, сахар, натрий и продукт FoodData Central - как при добавлении одного блюда
+                fdc_id = nutrition.get('fdc_id') or link_food(nutrition['food_name'])
+                micro = {field: nutrition.get(field) for field in MICRO_FIELDS}
+                if any(value is None for value in micro.values()):
+                    computed = micronutrients_for(fdc_id, float(nutrition['weight_grams'])) or {}
+                    micro = {field: value if value is not None else computed.get(field, 0) for field, value in micro.items()}
                 
-                # Ищем продукт в базе
-                food_result = await session.execute(
-                    select(Food).where(Food.name.ilike(f"%{food_name}%"))
+                # Создаем запись о приеме пищи
+                meal = Meal(
+                    user_id=user_id,
+                    food_name=nutrition['food_name'],
+                    food_name_en=nutrition.get('food_name_en'),
+                    weight_grams=nutrition['weight_grams'],
+                    calories=nutrition['calories'],
+                    protein=nutrition['protein'],
+                    fat=nutrition['fat'],
+                    carbs=nutrition['carbs'],
+                    fiber=micro['fiber'],
+                    sugar=micro['sugar'],
+                    sodium=micro['sodium'],
+                    fdc_id=fdc_id,
+                    date=now.strftime('%Y-%m-%d'),
+                    time=now.strftime('%H:%M')
+                )
+                session.add(meal)
+                await record_recent_food(
+                    session, user_id, nutrition['food_name'], nutrition['weight_grams'],
+                    dict(nutrition, **micro), fdc_id
                 )
-                food = food_result.scalar_one_or_none()
                 
-                if food:
-                    # Получаем питательные вещества
-                    nutrients_result = await session.execute(
-                        select(FoodNutrient).where(FoodNutrient.food_id == food.id)
-                    )
-                    nutrients = nutrients_result.scalars().all()
-                    
-                    # Рассчитываем калории и БЖУ
-                    calories = 0
-                    protein = 0
-                    fat = 0
-                    carbs = 0
-                    
-                    for nutrient in nutrients:
-                        if nutrient.nutrient_name == 'Calories':
-                            calories = (nutrient.value * weight) / 100
-                        elif nutrient.nutrient_name == 'Protein':
-                            protein = (nutrient.value * weight) / 100
-                        elif nutrient.nutrient_name == 'Total lipid (fat)':
-                            fat = (nutrient.value * weight) / 100
-                        elif nutrient.nutrient_name == 'Carbohydrate, by difference':
-                            carbs = (nutrient.value * weight) / 100
-                    
-                    # Создаем запись о приеме пищи
-                    meal = Meal(
-                        user_id=user_id,
-                        food_name=food_name,
-                        weight_grams=weight,
-                        calories=calories,
-                        protein=protein,
-                        fat=fat,
-                        carbs=carbs,
-                        date=datetime.now().date(),
-                        time=datetime.now().time()
-                    )
-                    session.add(meal)
-                    
-                    total_calories += calories
-                    total_protein += protein
-                    total_fat += fat
-                    total_carbs += carbs
-                    meals_count += 1
+                total_calories += nutrition['calories']
+                total_protein += nutrition['protein']
+                total_fat += nutrition['fat']
+                total_carbs += nutrition['carbs']
+                meals_count += 1
             
             await session.commit()
             
@@ -560,10 +601,35 @@ async def search_food(data: dict):
     """Поиск продуктов для веб-приложения"""
     try:
         query = data.get('query', '')
+        limit = min(int(data.get('limit', 10)), 50)
         if not query:
             return {"foods": []}
-            
-        # Получаем данные о продукте
+        
+        # Ранжированные кандидаты из локального триграммного индекса
+        candidates = food_search_index.search(query, limit)
+        foods = []
+        for candidate in candidates:
+            if candidate['fdc_id'] is not None:
+                per_100g = local_nutrition.get_by_fdc_id(candidate['fdc_id'])
+            else:
+                per_100g = local_nutrition.lookup(candidate['name'])
+            if not per_100g:
+                continue
+            foods.append({
+                "name": candidate['name'],
+                "name_en": candidate['name_en'],
+                "fdc_id": per_100g['fdc_id'],
+                "calories_per_100g": per_100g['calories'],
+                "protein_per_100g": per_100g['protein'],
+                "fat_per_100g": per_100g['fat'],
+                "carbs_per_100g": per_100g['carbs'],
+                "score": candidate['score'],
+                "source": "fooddata_central"
+            })
+        if foods:
+            return {"foods": foods}
+        
+        # Локально ничего не нашли - спрашиваем GigaChat
         nutrition_data = await nutrition_api.get_nutrition_data(query, 100)
         
         return {
@@ -583,6 +649,87 @@ async def search_food(data: dict):
         print(f"Ошибка поиска продукта: {e}")
         return {"foods": []}
 
+@app.get("/api/foods/autocomplete")
+async def foods_autocomplete(q: str = Query("", max_length=100), limit: int = Query(10, ge=1, le=20)):
+    """Подсказки названий продуктов по введённому началу (без LLM и запросов к БД)"""
+    return {"query": q, "suggestions": food_autocomplete.complete(q, limit)}
+
+@app.get("/api/foods/barcode/{ean}")
+async def food_by_barcode(ean: str, weight_grams: Optional[float] = Query(None, gt=0, le=10000)):
+    """Упакованный продукт по штрихкоду (Open Food Facts): значения на 100г и, если задан вес, на порцию"""
+    barcode = normalize_barcode(ean)
+    if barcode is None:
+        raise HTTPException(status_code=400, detail="Неверный штрихкод")
+    product = await barcode_products.get(barcode)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Продукт не найден")
+    result = {"product": product, "source": "openfoodfacts"}
+    if weight_grams:
+        result["weight_grams"] = weight_grams
+        result["nutrition"] = scale_nutrition(product, weight_grams)
+    return result
+
+@app.get("/api/foods/recent")
+async def recent_foods(user_id: int = Query(...), limit: int = Query(RECENT_FOODS_LIMIT, ge=1, le=RECENT_FOODS_MAX)):
+    """Частые продукты пользователя: значения на 100г и типичная порция"""
+    try:
+        return {"foods": await get_recent_foods(user_id, limit)}
+    except Exception as e:
+        print(f"Ошибка получения частых продуктов: {e}")
+        return {"foods": []}
+
+@app.post("/api/foods/recent/add")
+async def add_recent_food(data: dict):
+    """Повторное добавление частого продукта без поиска: {user_id, recent_id, weight_grams?}"""
+    try:
+        user_id = int(data['user_id'])
+        recent_id = int(data['recent_id'])
+        weight_grams = float(data['weight_grams']) if data.get('weight_grams') else None
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Необходимы user_id и recent_id")
+    
+    food = await get_recent_food(user_id, recent_id)
+    if food is None:
+        raise HTTPException(status_code=404, detail="Продукт не найден")
+    weight_grams = weight_grams or food['weight_grams']
+    now = datetime.now()
+    return await add_meal({
+        'user_id': user_id,
+        'food_name': food['food_name'],
+        'weight_grams': weight_grams,
+        'date': now.strftime('%Y-%m-%d'),
+        'time': now.strftime('%H:%M'),
+        'fdc_id': food['fdc_id'],
+        **scale_nutrition(food['per_100g'], weight_grams)
+    })
+
+@app.post("/api/nutrition/batch")
+async def nutrition_batch(data: dict):
+    """Пакетный расчет калорий: [{food_name, weight_grams}, ...] за один запрос к LLM"""
+    items = data.get('items') or []
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Необходим непустой список items")
+    if len(items) > 50:
+        raise HTTPException(status_code=400, detail="Не более 50 продуктов за запрос")
+    
+    try:
+        pairs = [(str(item['food_name']), float(item.get('weight_grams', 100))) for item in items]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Каждый элемент должен содержать food_name и weight_grams")
+    
+    try:
+        nutrition_list = await nutrition_api.get_nutrition_batch(pairs)
+        return {
+            "items": nutrition_list,
+            "total": {
+                field: round(sum(n[field] for n in nutrition_list), 1)
+                for field in ('calories', 'protein', 'fat', 'carbs')
+            }
+        }
+    except Exception as e:
+        print(f"Ошибка пакетного расчета калорий: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка пакетного расчета калорий: {str(e)}")
+
 @app.post("/api/calculate_calories")
 async def calculate_calories(data: dict):
     """Вычисляет калории для продукта с заданным весом"""
@@ -882,6 +1029,40 @@ async def get_telegram_users(current_user: WebUser = Depends(get_current_user)):
             ]
         }
  
+@app.get("/api/admin/food-aliases")
+async def get_food_aliases_for_review(
+    max_confidence: float = Query(REVIEW_CONFIDENCE, ge=0, le=1),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: WebUser = Depends(get_current_user)
+):
+    """Неуверенные соответствия названий продуктов и fdc_id для проверки"""
+    if (current_user.email or "").lower() != ADMIN_EMAIL.lower():
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    aliases = await food_aliases.list_for_review(max_confidence, limit, offset)
+    return {"aliases": aliases, "max_confidence": max_confidence, "limit": limit, "offset": offset}
+
+@app.post("/api/admin/food-aliases/review")
+async def review_food_aliases(request: dict, current_user: WebUser = Depends(get_current_user)):
+    """Пакетная проверка соответствий: approve (можно с новым fdc_id) или delete"""
+    if (current_user.email or "").lower() != ADMIN_EMAIL.lower():
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    decisions = request.get("decisions")
+    if not isinstance(decisions, list) or not decisions:
+        raise HTTPException(status_code=400, detail="Нужен непустой список decisions")
+    try:
+        counts = await food_aliases.review(decisions)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Неверные параметры")
+    return {"success": True, **counts}
+
+@app.get("/api/admin/llm-scheduler")
+async def get_llm_scheduler_stats(current_user: WebUser = Depends(get_current_user)):
+    """Глубина очередей к LLM по приоритетам, состояние провайдеров и хеджирование"""
+    if (current_user.email or "").lower() != ADMIN_EMAIL.lower():
+        raise HTTPException(status_code=403, detail="Доступ запрещен")
+    return {"providers": llm_scheduler.stats(), "routing": llm_router.snapshot()}
+
 @app.post("/api/admin/toggle-premium")
 async def toggle_user_premium(
     request: dict,
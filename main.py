@@ -12,6 +12,13 @@ from components.handlers.admin_handlers import admin_router
 from components.handlers.fat_tracker_handlers import router as fat_tracker_router
 from components.payment_system.payment_handlers import router as payment_router
 from database.init_database import init_db
+from api.ai_api.nutrition_snapshot import init_nutrition_reference
+from api.ai_api.food_alias import food_aliases, food_alias_task
+from api.ai_api.dish_nutrition import init_dish_nutrition
+from api.ai_api.nutrition_cache import nutrition_cache
+from api.ai_api.gigachat_api import gigachat
+from api.ai_api.nutrition_warmup import warm_up_nutrition_cache
+from components.handlers.user_handlers import resolve_addmeal_nutrition
 from utils.logger import init_default_logging, get_bot_logger, log_exception, log_performance
 
 
@@ -147,6 +154,25 @@ async def main():
         logger.info("📊 Инициализация базы данных...")
         await init_db()
         logger.info("✅ База данных готова")
+
+        # Справочник FoodData Central из офлайн-снимка (общие с API страницы mmap).
+        # Без снимка бот обращается к food_macros по запросу, как и раньше
+        if await init_nutrition_reference(with_search_index=False, db_fallback=False):
+            logger.info("✅ Справочник питания открыт из снимка")
+        await init_dish_nutrition()
+        await food_aliases.load()
+        # Пул соединений к GigaChat на всё время работы бота
+        await gigachat.startup()
+        
+        # Прогрев кэша питания популярными продуктами: бот берёт их из Redis,
+        # уже прогретого API, в GigaChat уходят только отсутствующие там
+        logger.info("🔥 Прогрев кэша питания...")
+        await warm_up_nutrition_cache(
+            lambda names: asyncio.gather(*(
+                nutrition_cache.get_or_resolve(name, resolve_addmeal_nutrition) for name in names
+            )),
+            batch_size=1
+        )
         
         # Создание диспетчера с Redis storage для FSM
         logger.info("🔧 Инициализация FSM storage...")
@@ -180,7 +206,9 @@ async def main():
         # Запуск фоновых задач
         heartbeat_task = asyncio.create_task(keep_alive.heartbeat())
         monitor_task = asyncio.create_task(keep_alive.activity_monitor())
-        tasks = [heartbeat_task, monitor_task]
+        # Соответствия названий продуктов: запись пачками и подгрузка выученных API
+        alias_task = asyncio.create_task(food_alias_task(asyncio.Event()))
+        tasks = [heartbeat_task, monitor_task, alias_task]
         
         logger.info("🚀 Бот запущен и готов к работе!")
         logger.info("💡 Система keep-alive активирована")
@@ -209,6 +237,7 @@ async def main():
     finally:
         if keep_alive and tasks:
             await graceful_shutdown(keep_alive, tasks)
+        await gigachat.close()
 
 def signal_handler(signum, frame):
     """Обработчик сигналов для корректного завершения"""
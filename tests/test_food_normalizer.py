@@ -0,0 +1,57 @@
+"""Нормализация названий продуктов для ключей кэша и алиасов"""
+import pytest
+
+from utils.food_normalizer import extract_cooking_method, normalize_food_name, stem_boundaries
+
+
+@pytest.mark.parametrize('first, second', [
+    ('Гречка варёная', 'вареная гречка'),
+    ('жареная картошка', 'картошка жареная'),
+    ('курица гриль', 'курица на гриле'),
+    ('Яблоки', 'яблоко'),
+])
+def test_same_key(first, second):
+    assert normalize_food_name(first) == normalize_food_name(second)
+
+
+@pytest.mark.parametrize('text, methods, base', [
+    ('вареный горох', ['boiled'], 'горох'),
+    ('жаренные грибы', ['fried'], 'грибы'),
+    ('отварной картофель', ['boiled'], 'картофель'),
+    ('запечённая курица', ['baked'], 'курица'),
+    ('рыба на пару', ['steamed'], 'рыба'),
+    ('сырой рис', ['raw'], 'рис'),
+])
+def test_cooking_method(text, methods, base):
+    assert extract_cooking_method(text) == (methods, base)
+
+
+@pytest.mark.parametrize('noun', ['варенье', 'печенье', 'жаркое', 'тушенка', 'вареники', 'печень'])
+def test_noun_is_not_cooking_method(noun):
+    methods, base = extract_cooking_method(noun)
+    assert methods == []
+    assert base == noun
+    assert '@' not in normalize_food_name(noun)
+
+
+@pytest.mark.parametrize('first, second', [
+    ('варенье', 'вареное'),
+    ('варенье', 'вареный горох'),
+    ('печенье', 'печеное'),
+    ('жаркое', 'жареное'),
+])
+def test_no_key_collision(first, second):
+    assert normalize_food_name(first) != normalize_food_name(second)
+
+
+def test_only_adjective_keeps_word():
+    assert normalize_food_name('жареное') == 'жареное'
+
+
+def test_stem_boundaries():
+    assert stem_boundaries('Зелёные яблоки') == '|зелен|яблок|'
+
+
+def test_stem_boundaries_marks_cooking_method():
+    assert stem_boundaries('вареный горох') == '|@boiled|горох|'
+    assert '|варен|' not in stem_boundaries('вареное')
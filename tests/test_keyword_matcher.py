@@ -0,0 +1,40 @@
+"""Автомат Ахо-Корасик для поиска ключей словаря в тексте"""
+from utils.keyword_matcher import KeywordMatcher, fold_text
+
+
+def test_fold_text_keeps_length():
+    assert fold_text('Ёжик') == 'ежик'
+    assert len(fold_text('ЁЁ')) == 2
+
+
+def test_find_all_overlapping():
+    matcher = KeywordMatcher({'he': 1, 'she': 2, 'hers': 3})
+    assert sorted(matcher.find_all('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+
+
+def test_longest_key_wins():
+    matcher = KeywordMatcher({'масло': 'oil', 'сливочное масло': 'butter'})
+    assert matcher.get('Сливочное масло 82%') == 'butter'
+    assert matcher.get('масло') == 'oil'
+
+
+def test_word_start_beats_length():
+    # "рис" в начале слова важнее более длинного ключа внутри слова
+    matcher = KeywordMatcher({'рис': 'rice', 'арбуз': 'watermelon', 'ирис': 'iris'})
+    assert matcher.find_best('бирис рис')[0] == 'рис'
+
+
+def test_result_does_not_depend_on_key_order():
+    keys = {'сыр': 'cheese', 'сырок': 'curd snack', 'творожный сырок': 'glazed curd'}
+    forward = KeywordMatcher(keys)
+    backward = KeywordMatcher(dict(reversed(list(keys.items()))))
+    for text in ('творожный сырок', 'сырок', 'сыр косичка'):
+        assert forward.get(text) == backward.get(text)
+
+
+def test_reload_and_default():
+    matcher = KeywordMatcher({'чай': 'tea'})
+    assert len(matcher) == 1
+    matcher.reload({'кофе': 'coffee'})
+    assert matcher.get('чай', 'нет') == 'нет'
+    assert matcher.get('кофе с молоком') == 'coffee'
@@ -0,0 +1,113 @@
+"""Планировщик запросов к LLM: приоритеты, лимиты и отказ при перегрузке"""
+import asyncio
+
+import pytest
+
+from api.ai_api.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_MENU,
+    LLMOverloaded,
+    LLMScheduler,
+    TokenBucket,
+    current_priority,
+    llm_priority,
+)
+
+
+def make_scheduler(concurrency=1, rate=1000.0, burst=1000):
+    return LLMScheduler({'test': {'concurrency': concurrency, 'rate': rate, 'burst': burst}})
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+    bucket.pause(1.0)
+    assert bucket.try_acquire() >= 1.0
+
+
+def test_priority_order():
+    scheduler = make_scheduler()
+    order = []
+
+    async def job(name, hold=0.0):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+    async def scenario():
+        # Первый запрос занимает единственный слот, остальные ждут в очереди
+        first = asyncio.create_task(scheduler.run('test', lambda: job('first', 0.02)))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(scheduler.run('test', lambda name=name: job(name), priority=priority))
+            for name, priority in (('background', PRIORITY_BACKGROUND), ('menu', PRIORITY_MENU),
+                                   ('interactive', PRIORITY_INTERACTIVE))
+        ]
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(scenario())
+    assert order == ['first', 'interactive', 'menu', 'background']
+
+
+def test_concurrency_limit():
+    scheduler = make_scheduler(concurrency=2)
+    running, peak = 0, 0
+
+    async def job():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def scenario():
+        await asyncio.gather(*(scheduler.run('test', job) for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert scheduler.stats()['test']['completed'] == 6
+
+
+def test_rejects_when_wait_exceeds_deadline():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        busy = asyncio.create_task(scheduler.run('test', lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0)
+        # Оценка ожидания (средняя длительность запроса 3 с) больше допустимой
+        with pytest.raises(LLMOverloaded):
+            await scheduler.run('test', lambda: asyncio.sleep(0), deadline=0.5)
+        await busy
+
+    asyncio.run(scenario())
+    assert scheduler.stats()['test']['rejected'] == 1
+
+
+def test_cancelled_waiter_frees_queue():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        busy = asyncio.create_task(scheduler.run('test', lambda: asyncio.sleep(0.02)))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.run('test', lambda: asyncio.sleep(0), deadline=30))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await busy
+        # Слот не потерян: следующий запрос выполняется
+        return await scheduler.run('test', lambda: asyncio.sleep(0, result='ok'))
+
+    assert asyncio.run(scenario()) == 'ok'
+    snapshot = scheduler.stats()['test']
+    assert snapshot['in_flight'] == 0
+    assert sum(snapshot['queued'].values()) == 0
+
+
+def test_llm_priority_context():
+    assert current_priority() == PRIORITY_INTERACTIVE
+    with llm_priority(PRIORITY_BACKGROUND):
+        assert current_priority() == PRIORITY_BACKGROUND
+    assert current_priority() == PRIORITY_INTERACTIVE
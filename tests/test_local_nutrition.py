@@ -0,0 +1,46 @@
+"""Локальный справочник FoodData Central: поиск только по названию целиком"""
+import numpy as np
+import pytest
+
+from api.ai_api.local_nutrition import LocalNutritionEngine
+from database.food_macros import CARBS_ID, ENERGY_KCAL_ID, FAT_ID, PROTEIN_ID
+
+
+@pytest.fixture
+def engine():
+    engine = LocalNutritionEngine()
+    nutrients = [(ENERGY_KCAL_ID, 0), (PROTEIN_ID, 1), (FAT_ID, 2), (CARBS_ID, 3)]
+    foods = {
+        1: ('Sugars, granulated', (387, 0, 0, 100)),
+        2: ('Buckwheat, cooked', (92, 3.4, 0.6, 19.9)),
+        3: ('Tea, black, brewed', (1, 0, 0, 0.3)),
+    }
+    fdc_ids, nutrient_ids, amounts = [], [], []
+    for fdc_id, (_, values) in foods.items():
+        for nutrient_id, column in nutrients:
+            fdc_ids.append(fdc_id)
+            nutrient_ids.append(nutrient_id)
+            amounts.append(values[column])
+    engine.build(
+        np.array(fdc_ids, dtype=np.int64),
+        np.array(nutrient_ids, dtype=np.int64),
+        np.array(amounts, dtype=np.float32),
+        [(fdc_id, description, 'sr_legacy_food') for fdc_id, (description, _) in foods.items()],
+    )
+    return engine
+
+
+@pytest.mark.parametrize('name, fdc_id', [
+    ('сахар', 1),
+    ('гречка', 2),
+    ('гречкой', 2),
+    ('Sugars', 1),
+    ('sugar', 1),
+])
+def test_whole_name(engine, name, fdc_id):
+    assert engine.lookup(name)['fdc_id'] == fdc_id
+
+
+@pytest.mark.parametrize('name', ['чай с сахаром', 'кофе с молоком', 'гречка с сахаром'])
+def test_partial_translation_is_not_used(engine, name):
+    assert engine.lookup(name) is None
@@ -0,0 +1,111 @@
+"""Кэш пищевой ценности: проверка значений и объединение одновременных промахов"""
+import asyncio
+
+import pytest
+
+from api.ai_api.nutrition_cache import NutritionCache, validate_per_100g
+
+APPLE = {'calories': 52, 'protein': 0.3, 'fat': 0.2, 'carbs': 14}
+
+
+@pytest.fixture
+def cache():
+    cache = NutritionCache()
+    # Без Redis: только память процесса
+    cache._get_redis = lambda: None
+    return cache
+
+
+@pytest.mark.parametrize('data', [
+    None,
+    'яблоко',
+    {'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0},
+    {'calories': 1200, 'protein': 10, 'fat': 100, 'carbs': 0},
+    {'calories': 100, 'protein': -1, 'fat': 1, 'carbs': 1},
+    {'calories': 'много', 'protein': 1, 'fat': 1, 'carbs': 1},
+])
+def test_invalid_values(data):
+    assert validate_per_100g(data) is None
+
+
+def test_optional_fields():
+    per_100g = validate_per_100g(dict(APPLE, fiber='2.4', sugar=None, sodium=-5, food_name_en='Apple'))
+    assert per_100g == dict(APPLE, fiber=2.4, sugar=0.0, sodium=0.0, food_name_en='Apple')
+    assert 'fiber' not in validate_per_100g(APPLE)
+
+
+def test_unreasonable_resolver_result_is_cached_as_negative(cache):
+    calls = []
+
+    async def resolver(food_name):
+        calls.append(food_name)
+        return {'calories': 5000, 'protein': 0, 'fat': 0, 'carbs': 0}
+
+    async def scenario():
+        assert await cache.get_or_resolve('чай с сахаром', resolver) is None
+        assert await cache.get('чай с сахаром') == (None, True)
+        assert await cache.get_or_resolve('чай с сахаром', resolver) is None
+
+    asyncio.run(scenario())
+    assert calls == ['чай с сахаром']
+
+
+def test_concurrent_misses_share_one_resolve(cache):
+    calls = []
+
+    async def resolver(food_name):
+        calls.append(food_name)
+        await asyncio.sleep(0.01)
+        return APPLE
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_resolve(name, resolver) for name in ('Яблоко', 'яблоки', 'яблоко')))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result['calories'] == 52 for result in results)
+
+
+class FakeRedis:
+    """Redis с заранее записанными сырыми значениями"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    async def get(self, key):
+        return self.raw
+
+    async def mget(self, keys):
+        return [self.raw] * len(keys)
+
+
+@pytest.mark.parametrize('raw', [
+    'не json',
+    '[1, 2]',
+    '"строка"',
+    '{"v": null}',
+    '{"v": null, "fresh": "завтра", "keep": 1}',
+    '{"v": {"calories": 5000, "protein": 0, "fat": 0, "carbs": 0}, "fresh": 9e12, "keep": 9e12}',
+    '{"v": "яблоко", "fresh": 9e12, "keep": 9e12}',
+])
+def test_corrupted_redis_payload_is_a_miss(raw):
+    cache = NutritionCache()
+    cache._get_redis = lambda: FakeRedis(raw)
+
+    async def scenario():
+        assert await cache.get('яблоко') is None
+        assert await cache.get_many(['яблоко', 'груша']) == {}
+
+    asyncio.run(scenario())
+
+
+def test_redis_payload_is_validated():
+    cache = NutritionCache()
+    cache._get_redis = lambda: FakeRedis('{"v": {"calories": "52", "protein": 0.3, "fat": 0.2, "carbs": 14}, "fresh": 9e12, "keep": 9e12}')
+
+    async def scenario():
+        return await cache.get('яблоко'), await cache.get('Яблоки')
+
+    (remote, fresh), (local, _) = asyncio.run(scenario())
+    assert remote == dict(APPLE, calories=52.0, protein=0.3, fat=0.2, carbs=14.0)
+    assert fresh and local == remote
@@ -0,0 +1,62 @@
+"""Разбор порции из текста пользователя"""
+import pytest
+
+from utils.portion_parser import GLASS, GRAMS, PIECE, TABLESPOON, parse_portion
+
+
+@pytest.mark.parametrize('text, canonical_food, grams, unit', [
+    ('2 яйца', 'яйцо', 110.0, PIECE),
+    ('1.5 банана', 'банан', 180.0, PIECE),
+    ('банан', 'банан', 120.0, PIECE),
+    ('Яблоко 150', 'яблоко', 150.0, GRAMS),
+    ('150г курицы', 'курица', 150.0, GRAMS),
+    ('стакан кефира', 'кефир', 257.5, GLASS),
+    ('2 столовые ложки сметаны', 'сметана', 40.0, TABLESPOON),
+    ('1,5 ст.л. сметаны', 'сметана', 30.0, TABLESPOON),
+])
+def test_reference_foods(text, canonical_food, grams, unit):
+    portion = parse_portion(text)
+    assert portion.canonical_food == canonical_food
+    assert portion.grams == grams
+    assert portion.unit == unit
+
+
+@pytest.mark.parametrize('text, food_name', [
+    ('творог 5% 200', 'творог 5%'),
+    ('молоко 3.2% 200', 'молоко 3.2%'),
+    ('молоко 3,2% 200', 'молоко 3.2%'),
+    ('200 г творога 9%', 'творога 9%'),
+])
+def test_percentage_is_part_of_name(text, food_name):
+    portion = parse_portion(text)
+    assert portion.food_name == food_name
+    assert portion.grams == 200.0
+
+
+def test_number_with_unit_wins_over_last_number():
+    portion = parse_portion('200 г сыра 45')
+    assert portion.grams == 200.0
+    assert portion.food_name == 'сыра 45'
+
+
+@pytest.mark.parametrize('text, food_name, grams', [
+    ('чай с сахаром 250', 'чай с сахаром', 250.0),
+    ('кофе с молоком 200', 'кофе с молоком', 200.0),
+])
+def test_partial_match_keeps_user_name(text, food_name, grams):
+    portion = parse_portion(text)
+    assert portion.canonical_food == food_name
+    assert portion.grams == grams
+    assert portion.confidence < 1.0
+
+
+def test_partial_match_still_gives_piece_weight():
+    # Вес штуки берётся у найденного продукта, название - пользовательское
+    portion = parse_portion('2 вареных яйца')
+    assert portion.unit == PIECE
+    assert portion.grams == 110.0
+
+
+@pytest.mark.parametrize('text', ['', '200', '0 яблок'])
+def test_unparsable(text):
+    assert parse_portion(text) is None
@@ -0,0 +1,55 @@
+"""Общий справочник пищевой ценности"""
+import pytest
+
+from utils.reference_nutrition import reference_nutrition
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('Яблоко', 'яблоко'),
+    ('яблоки', 'яблоко'),
+    ('гречки', 'гречка'),
+    ('сухая гречка', 'гречка сухая'),
+    ('варенье', 'варенье'),
+])
+def test_exact(name, expected):
+    assert reference_nutrition.get(name).name == expected
+
+
+@pytest.mark.parametrize('name', ['чай с сахаром', 'вареное', 'вареный горох'])
+def test_no_exact_match(name):
+    assert reference_nutrition.get(name) is None
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('гречка варёная', 'гречка'),
+    ('зелёное яблоко', 'яблоко'),
+    ('печёное яблоко', 'яблоко'),
+    ('вишнёвое варенье', 'варенье'),
+])
+def test_match_inside_name(name, expected):
+    assert reference_nutrition.match(name).name == expected
+
+
+@pytest.mark.parametrize('name', ['вареное', 'вареный горох', 'жареное'])
+def test_cooking_adjective_does_not_match_noun(name):
+    match = reference_nutrition.match(name)
+    assert match is None or match.name not in ('варенье', 'печенье', 'жаркое')
+
+
+@pytest.mark.parametrize('name', ['гречка', 'овсянка', 'макароны', 'рис', 'перловка'])
+def test_plain_grains_are_cooked(name):
+    assert reference_nutrition.get(name).per_100g()['calories'] < 200
+
+
+def test_values_are_plausible():
+    for food in reference_nutrition.foods:
+        per_100g = food.per_100g()
+        assert 0 <= per_100g['calories'] < 1000, food.name
+        macros_kcal = 4 * per_100g['protein'] + 9 * per_100g['fat'] + 4 * per_100g['carbs']
+        # Энергия по БЖУ не должна сильно расходиться с указанной (алкоголь и округления - в пределах)
+        assert macros_kcal <= per_100g['calories'] * 1.35 + 15, food.name
+
+
+def test_scale():
+    scaled = reference_nutrition.get('яблоко').scale(200)
+    assert scaled['calories'] == pytest.approx(104, abs=0.5)
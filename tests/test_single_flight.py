@@ -0,0 +1,71 @@
+"""Объединение одновременных одинаковых вызовов"""
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_coalesce():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'token'
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do('token', fetch) for _ in range(50)))
+
+    assert asyncio.run(scenario()) == ['token'] * 50
+    assert len(calls) == 1
+    assert flights.stats == {'calls': 1, 'coalesced': 49}
+    assert flights.in_flight() == 0
+
+
+def test_exception_reaches_all_waiters_and_key_is_released():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def scenario():
+        results = await asyncio.gather(flights.do('k', fail), flights.do('k', fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        # После ошибки следующий вызов выполняется заново
+        return await flights.do('k', lambda: asyncio.sleep(0, result='ok'))
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert flights.stats['calls'] == 2
+
+
+def test_timeout():
+    flights = SingleFlight()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do('slow', lambda: asyncio.sleep(1), timeout=0.01)
+        assert flights.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def scenario():
+        first = asyncio.create_task(flights.do('k', fetch))
+        second = asyncio.create_task(flights.do('k', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == 42
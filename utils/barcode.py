@@ -0,0 +1,58 @@
+"""
+Штрихкоды упакованных продуктов (EAN-8, UPC-A, EAN-13, GTIN-14)
+"""
+import re
+from typing import NamedTuple, Optional
+
+# Все форматы дополняются нулями слева до GTIN-14 без пересечений,
+# поэтому код хранится как одно целое число (BIGINT)
+BARCODE_LENGTHS = (8, 12, 13, 14)
+
+_BARCODE_TEXT = re.compile(
+    r'^\s*(?P<code>\d[\d -]{6,18}\d)(?:\s+(?P<weight>\d+(?:[.,]\d+)?)\s*(?:г|гр|грамм\w*|g)?)?\s*$',
+    re.IGNORECASE,
+)
+
+
+class BarcodeInput(NamedTuple):
+    ean: int
+    # Вес в граммах, если пользователь указал его после штрихкода
+    grams: Optional[float]
+
+
+def check_digit_is_valid(digits: str) -> bool:
+    """Контрольная цифра GTIN: веса 3 и 1 попеременно справа налево"""
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(reversed(digits)))
+    return total % 10 == 0
+
+
+def normalize_barcode(value) -> Optional[int]:
+    """
+    Штрихкод как целое число или None, если это не GTIN.
+    Пробелы и дефисы между цифрами допускаются, контрольная цифра проверяется.
+    """
+    if value is None:
+        return None
+    digits = re.sub(r'[\s-]', '', str(value))
+    if not digits.isdigit() or len(digits) not in BARCODE_LENGTHS:
+        return None
+    if not check_digit_is_valid(digits) or not int(digits):
+        return None
+    return int(digits)
+
+
+def format_barcode(ean: int) -> str:
+    """Запись для показа: EAN-8 - 8 цифр, остальные - EAN-13 (или GTIN-14)"""
+    return str(ean).zfill(8 if ean < 10 ** 8 else 13)
+
+
+def parse_barcode_input(text: str) -> Optional[BarcodeInput]:
+    """Сообщение из цифр штрихкода, возможно с весом: "4607001234567 150г" """
+    match = _BARCODE_TEXT.match(text or '')
+    if not match:
+        return None
+    ean = normalize_barcode(match.group('code'))
+    if ean is None:
+        return None
+    weight = match.group('weight')
+    return BarcodeInput(ean, float(weight.replace(',', '.')) if weight else None)
@@ -0,0 +1,228 @@
+"""
+Нормализация русских названий продуктов для ключей кэша, индекса и алиасов
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from utils.keyword_matcher import fold_text
+
+try:
+    # Если установлен pymorphy3, сначала приводим слово к словарной форме
+    import pymorphy3
+    _morph = pymorphy3.MorphAnalyzer()
+except Exception:
+    _morph = None
+
+# --- Стеммер Портера (Snowball) для русского языка ---
+
+_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_DERIVATIONAL_CONTEXT = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_DERIVATIONAL = re.compile(r'ость?$')
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+# Уменьшительные суффиксы: яблочко -> яблок, ложечка -> ложк, водичка -> вод
+_DIMINUTIVES = (('очк', 'ок'), ('ечк', 'к'), ('ичк', ''))
+
+_WORD = re.compile(r'[0-9a-zа-я]+')
+
+
+def stem(word: str) -> str:
+    """Основа русского слова по алгоритму Snowball (латиница возвращается как есть)"""
+    word = fold_text(word)
+    match = _RV.match(word)
+    if not match or not re.search('[а-я]', word):
+        return word
+    prefix, rv = match.groups()
+
+    temp = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        temp = _ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = _PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if _DERIVATIONAL_CONTEXT.match(rv):
+        rv = _DERIVATIONAL.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+
+    result = prefix + rv
+    for suffix, replacement in _DIMINUTIVES:
+        if result.endswith(suffix) and len(result) - len(suffix) >= 3:
+            return result[:-len(suffix)] + replacement
+    return result
+
+
+@lru_cache(maxsize=100_000)
+def lemmatize(word: str) -> str:
+    """Нормальная форма слова (мемоизировано): лемма pymorphy3, если есть, затем основа"""
+    word = fold_text(word)
+    if _morph is not None and re.search('[а-я]', word):
+        word = fold_text(_morph.parse(word)[0].normal_form)
+    return stem(word)
+
+
+# --- Способы приготовления ---
+
+# Основа причастия или прилагательного -> канонический способ приготовления.
+# Основы Snowball у "вареный" и "варенье", "печеный" и "печенье" совпадают,
+# поэтому способ распознаётся по слову целиком с окончанием прилагательного
+COOKING_METHODS = {
+    'варен': 'boiled',
+    'варенн': 'boiled',
+    'отварн': 'boiled',
+    'жарен': 'fried',
+    'жаренн': 'fried',
+    'обжарен': 'fried',
+    'обжаренн': 'fried',
+    'тушен': 'stewed',
+    'тушенн': 'stewed',
+    'запечен': 'baked',
+    'запеченн': 'baked',
+    'печен': 'baked',
+    'печенн': 'baked',
+    'паров': 'steamed',
+    'копчен': 'smoked',
+    'копченн': 'smoked',
+    'свеж': 'fresh',
+}
+# Существительное "гриль" ("курица гриль") - тоже способ приготовления
+COOKING_NOUNS = {'гриль': 'grilled'}
+
+_ADJECTIVE_ENDINGS = (
+    'ый', 'ий', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ого', 'его', 'ому', 'ему',
+    'ым', 'им', 'ом', 'ем', 'ую', 'юю', 'ых', 'их', 'ыми', 'ими',
+)
+_COOKING_WORD = re.compile(
+    '^(' + '|'.join(sorted(COOKING_METHODS, key=len, reverse=True)) + ')'
+    '(?:' + '|'.join(_ADJECTIVE_ENDINGS) + ')$'
+)
+
+# "Сырой" и "сыр" дают одну основу, поэтому сырые формы распознаём по слову целиком
+RAW_WORDS = frozenset(('сырой', 'сырая', 'сырое', 'сырые', 'сырых', 'сырую', 'сырым', 'сырого', 'сырыми'))
+
+# Предлоги, которые относятся к способу приготовления: "на пару", "на гриле"
+_COOKING_PHRASES = (
+    (re.compile(r'\bна\s+пару\b'), 'steamed'),
+    (re.compile(r'\bна\s+гриле?\b'), 'grilled'),
+    (re.compile(r'\bв\s+духовке\b'), 'baked'),
+    (re.compile(r'\bна\s+сковороде\b'), 'fried'),
+)
+
+
+def _method_for_word(word: str) -> Optional[str]:
+    if word in RAW_WORDS:
+        return 'raw'
+    if word in COOKING_NOUNS:
+        return COOKING_NOUNS[word]
+    match = _COOKING_WORD.match(word)
+    return COOKING_METHODS[match.group(1)] if match else None
+
+
+@lru_cache(maxsize=50_000)
+def _analyze(text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]:
+    methods = []
+    for pattern, method in _COOKING_PHRASES:
+        if pattern.search(text):
+            methods.append(method)
+            text = pattern.sub(' ', text)
+
+    words, lemmas, method_words = [], [], []
+    phrase_methods = len(methods)
+    for word in _WORD.findall(text):
+        method = _method_for_word(word)
+        if method:
+            methods.append(method)
+            method_words.append(word)
+            continue
+        words.append(word)
+        lemmas.append(lemmatize(word))
+    if not words and method_words:
+        # Название из одних прилагательных ("жареное") не превращаем в пустой
+        # ключ: слова остаются целиком, чтобы не совпасть с "варенье" и т.п.
+        words, lemmas = method_words, method_words
+        methods = methods[:phrase_methods]
+    return tuple(words), tuple(lemmas), tuple(dict.fromkeys(methods))
+
+
+def analyze_food_name(food_name: str) -> Dict:
+    """
+    Разбирает название продукта:
+    words - слова без способа приготовления, lemmas - их нормальные формы,
+    cooking_methods - канонические способы приготовления, key - ключ для кэша.
+    """
+    words, lemmas, methods = _analyze(fold_text(food_name))
+    return {
+        'words': list(words),
+        'lemmas': list(lemmas),
+        'cooking_methods': list(methods),
+        'base': ' '.join(words),
+        'key': _make_key(lemmas, methods),
+    }
+
+
+def _make_key(lemmas, methods) -> str:
+    key = ' '.join(sorted(lemmas))
+    if methods:
+        key += ' @' + ','.join(sorted(methods))
+    return key
+
+
+def normalize_food_name(food_name: str) -> str:
+    """
+    Канонический ключ продукта: нормальные формы слов в алфавитном порядке
+    плюс способ приготовления. "Вареная гречка" и "гречка варёная" дают один ключ.
+    """
+    _, lemmas, methods = _analyze(fold_text(food_name))
+    return _make_key(lemmas, methods)
+
+
+def extract_cooking_method(food_name: str) -> Tuple[List[str], str]:
+    """Способы приготовления и название без них"""
+    words, _, methods = _analyze(fold_text(food_name))
+    return list(methods), ' '.join(words)
+
+
+def _stem_word(word: str) -> str:
+    method = _method_for_word(word)
+    return '@' + method if method else lemmatize(word)
+
+
+def stem_text(text: str) -> str:
+    """
+    Нормальные формы всех слов с сохранением порядка (для поиска ключей словаря).
+    Способ приготовления заменяется меткой ("вареный" -> "@boiled"), чтобы
+    не совпасть с существительным той же основы ("варенье").
+    """
+    return ' '.join(_stem_word(word) for word in _WORD.findall(fold_text(text)))
+
+
+def stem_boundaries(text: str) -> str:
+    """
+    Нормальные формы слов, обрамлённые разделителем "|": ключ "|яблок|"
+    находится в "|зелен|яблок|" только как целое слово
+    """
+    return '|' + stem_text(text).replace(' ', '|') + '|'
@@ -0,0 +1,117 @@
+"""
+Поиск словарных ключей в тексте за один проход (автомат Ахо-Корасик)
+"""
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+def fold_text(text: str) -> str:
+    """Нижний регистр и ё -> е без изменения длины строки"""
+    return text.lower().replace('ё', 'е')
+
+
+class KeywordMatcher:
+    """
+    Скомпилированный автомат Ахо-Корасик над ключами словаря.
+
+    Находит все вхождения ключей в текст за O(len(text)) и выбирает
+    самое специфичное совпадение детерминированно, независимо от
+    порядка ключей в исходном словаре.
+    """
+
+    def __init__(self, patterns: Optional[Mapping[str, Any]] = None):
+        self._automaton = self._compile({})
+        if patterns:
+            self.reload(patterns)
+
+    def reload(self, patterns: Mapping[str, Any]) -> None:
+        """Пересобирает автомат; читатели видят либо старую, либо новую версию"""
+        self._automaton = self._compile(patterns)
+
+    def __len__(self) -> int:
+        return len(self._automaton[3])
+
+    @staticmethod
+    def _compile(patterns: Mapping[str, Any]) -> Tuple:
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        keys: List[str] = []
+        values: List[Any] = []
+
+        for key, value in patterns.items():
+            folded = fold_text(key.strip())
+            if not folded:
+                continue
+            node = 0
+            for char in folded:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    outputs.append([])
+                node = next_node
+            if outputs[node]:
+                # Повторный ключ после нормализации: побеждает последний, как в dict
+                values[outputs[node][0]] = value
+                continue
+            outputs[node].append(len(keys))
+            keys.append(folded)
+            values.append(value)
+
+        # Суффиксные ссылки строим обходом в ширину; у детей корня они ведут в корень
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                outputs[child] = outputs[child] + outputs[fail[child]]
+
+        return goto, fail, outputs, keys, values
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """Все вхождения ключей: (начало, конец, ключ)"""
+        goto, fail, outputs, keys, _ = self._automaton
+        matches = []
+        node = 0
+        for position, char in enumerate(fold_text(text)):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in outputs[node]:
+                key = keys[index]
+                matches.append((position + 1 - len(key), position + 1, key))
+        return matches
+
+    def find_best(self, text: str) -> Optional[Tuple[str, Any]]:
+        """
+        Самое специфичное совпадение: (ключ, значение) или None.
+        Приоритет: начало слова, затем самый длинный ключ, затем самый левый.
+        """
+        goto, fail, outputs, keys, values = self._automaton
+        folded = fold_text(text)
+        best_rank, best_index = None, None
+        node = 0
+        for position, char in enumerate(folded):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in outputs[node]:
+                start = position + 1 - len(keys[index])
+                at_word_start = start == 0 or not folded[start - 1].isalnum()
+                rank = (at_word_start, len(keys[index]), -start)
+                if best_rank is None or rank > best_rank:
+                    best_rank, best_index = rank, index
+        if best_index is None:
+            return None
+        return keys[best_index], values[best_index]
+
+    def get(self, text: str, default: Any = None) -> Any:
+        """Значение самого специфичного совпадения"""
+        match = self.find_best(text)
+        return match[1] if match else default
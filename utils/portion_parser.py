@@ -0,0 +1,294 @@
+"""
+Разбор порции из сообщения пользователя без обращения к LLM:
+"2 яйца", "стакан кефира", "150г курицы", "1.5 банана", "Яблоко 150".
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.keyword_matcher import fold_text
+from utils.reference_nutrition import reference_nutrition
+
+# Единицы и их вес в граммах по умолчанию. Объёмные единицы (ml) переводятся
+# в граммы через плотность продукта, остальные - через типичный вес продукта.
+GRAMS, KILOGRAMS, MILLILITERS, LITERS = 'g', 'kg', 'ml', 'l'
+PIECE, GLASS, TABLESPOON, TEASPOON, SLICE, PORTION = 'piece', 'glass', 'tbsp', 'tsp', 'slice', 'portion'
+
+DEFAULT_UNIT_GRAMS = {
+    GRAMS: 1.0,
+    KILOGRAMS: 1000.0,
+    PIECE: 100.0,
+    SLICE: 30.0,
+    PORTION: 250.0,
+}
+# Объём единицы в миллилитрах
+UNIT_MILLILITERS = {
+    MILLILITERS: 1.0,
+    LITERS: 1000.0,
+    GLASS: 250.0,
+    TABLESPOON: 15.0,
+    TEASPOON: 5.0,
+}
+
+_UNIT_FORMS = {
+    GRAMS: ('г', 'гр', 'грамм', 'грамма', 'граммов', 'граммы', 'g', 'gr'),
+    KILOGRAMS: ('кг', 'килограмм', 'килограмма', 'килограммов', 'кило', 'kg'),
+    MILLILITERS: ('мл', 'миллилитр', 'миллилитра', 'миллилитров', 'ml'),
+    LITERS: ('л', 'литр', 'литра', 'литров', 'l'),
+    PIECE: ('шт', 'штука', 'штуки', 'штук', 'штуку', 'pcs'),
+    GLASS: ('стакан', 'стакана', 'стаканов', 'стаканы', 'кружка', 'кружки', 'кружку', 'кружек',
+            'чашка', 'чашки', 'чашку', 'чашек'),
+    TABLESPOON: ('ложка', 'ложки', 'ложку', 'ложек', 'стл'),
+    TEASPOON: ('чл',),
+    SLICE: ('ломтик', 'ломтика', 'ломтиков', 'ломтики', 'кусок', 'куска', 'кусков', 'куски',
+            'кусочек', 'кусочка', 'кусочков', 'кусочки'),
+    PORTION: ('порция', 'порции', 'порцию', 'порций', 'тарелка', 'тарелки', 'тарелку', 'тарелок'),
+}
+UNITS: Dict[str, str] = {form: unit for unit, forms in _UNIT_FORMS.items() for form in forms}
+
+# Прилагательные перед "ложка": уточняют единицу и поглощаются вместе с ней
+_SPOON_KINDS = {
+    'столовая': TABLESPOON, 'столовой': TABLESPOON, 'столовые': TABLESPOON, 'столовых': TABLESPOON,
+    'чайная': TEASPOON, 'чайной': TEASPOON, 'чайные': TEASPOON, 'чайных': TEASPOON,
+}
+
+NUMERALS = {
+    'один': 1, 'одна': 1, 'одно': 1, 'одну': 1, 'одного': 1, 'одной': 1,
+    'два': 2, 'две': 2, 'двух': 2, 'пара': 2, 'пару': 2,
+    'три': 3, 'трех': 3, 'четыре': 4, 'четырех': 4, 'пять': 5, 'пяти': 5,
+    'шесть': 6, 'шести': 6, 'семь': 7, 'семи': 7, 'восемь': 8, 'восьми': 8,
+    'девять': 9, 'девяти': 9, 'десять': 10, 'десяти': 10,
+    'пол': 0.5, 'половина': 0.5, 'половину': 0.5, 'половинка': 0.5, 'половинку': 0.5,
+    'полтора': 1.5, 'полторы': 1.5, 'четверть': 0.25, 'треть': 1 / 3,
+}
+
+# Типичный вес единиц для продуктов справочника (г); 'ml' - плотность, г/мл
+_FOOD_UNIT_DATA = (
+    (('яйцо', 'яйца'), {PIECE: 55}),
+    (('яблоко',), {PIECE: 180, SLICE: 20}),
+    (('банан',), {PIECE: 120}),
+    (('груша',), {PIECE: 170}),
+    (('апельсин',), {PIECE: 200, SLICE: 20}),
+    (('лимон',), {PIECE: 100, SLICE: 8}),
+    (('киви',), {PIECE: 75}),
+    (('персик',), {PIECE: 150}),
+    (('абрикос',), {PIECE: 40}),
+    (('слива',), {PIECE: 30}),
+    (('хурма',), {PIECE: 200}),
+    (('манго',), {PIECE: 300}),
+    (('авокадо',), {PIECE: 170}),
+    (('гранат',), {PIECE: 250}),
+    (('помидор',), {PIECE: 120, SLICE: 15}),
+    (('огурец', 'огурцы'), {PIECE: 100, SLICE: 10}),
+    (('морковь',), {PIECE: 80}),
+    (('картофель', 'картошка'), {PIECE: 100}),
+    (('лук',), {PIECE: 90}),
+    (('чеснок',), {PIECE: 5}),
+    (('перец',), {PIECE: 150}),
+    (('кабачок',), {PIECE: 300}),
+    (('баклажан',), {PIECE: 250}),
+    (('хлеб',), {PIECE: 30, SLICE: 30}),
+    (('тост',), {PIECE: 25, SLICE: 25}),
+    (('булочка',), {PIECE: 60}),
+    (('сыр',), {SLICE: 20, PIECE: 20}),
+    (('колбаса',), {SLICE: 15}),
+    (('ветчина',), {SLICE: 20}),
+    (('бекон',), {SLICE: 15, PIECE: 15}),
+    (('сосиски',), {PIECE: 50}),
+    (('котлеты',), {PIECE: 80}),
+    (('тефтели', 'фрикадельки'), {PIECE: 30}),
+    (('сырники',), {PIECE: 50}),
+    (('блины',), {PIECE: 50}),
+    (('пельмени',), {PIECE: 12, PORTION: 200}),
+    (('вареники',), {PIECE: 25, PORTION: 200}),
+    (('манты',), {PIECE: 50}),
+    (('хинкали',), {PIECE: 70}),
+    (('голубцы',), {PIECE: 120}),
+    (('пицца',), {SLICE: 110, PIECE: 110}),
+    (('торт',), {SLICE: 120, PIECE: 120}),
+    (('пирог',), {SLICE: 100, PIECE: 100}),
+    (('запеканка',), {SLICE: 150, PIECE: 150}),
+    (('печенье',), {PIECE: 12}),
+    (('конфеты',), {PIECE: 10}),
+    (('вафли',), {PIECE: 10}),
+    (('пряники',), {PIECE: 35}),
+    (('крекеры',), {PIECE: 5}),
+    (('шоколад',), {PIECE: 100, SLICE: 5}),
+    (('мороженое',), {PIECE: 80}),
+    (('бургер', 'гамбургер'), {PIECE: 110}),
+    (('чизбургер',), {PIECE: 120}),
+    (('шаурма',), {PIECE: 300}),
+    (('бутерброд', 'сэндвич'), {PIECE: 80}),
+    (('роллы', 'суши'), {PIECE: 30}),
+    (('финики',), {PIECE: 8}),
+    (('орехи', 'грецкие орехи'), {PIECE: 5}),
+    (('суп', 'борщ', 'щи', 'солянка', 'харчо', 'окрошка', 'лагман'), {PORTION: 300}),
+    (('молоко', 'кефир'), {'ml': 1.03}),
+    (('йогурт',), {'ml': 1.05, PIECE: 125}),
+    (('сметана',), {'ml': 1.0, TABLESPOON: 20, TEASPOON: 7}),
+    (('масло', 'растительное масло', 'подсолнечное масло', 'оливковое масло'),
+     {'ml': 0.92, TABLESPOON: 17, TEASPOON: 5}),
+    (('сливочное масло',), {TABLESPOON: 17, TEASPOON: 5, SLICE: 10, PIECE: 10}),
+    (('майонез',), {TABLESPOON: 25, TEASPOON: 8}),
+    (('мед',), {'ml': 1.4, TABLESPOON: 21, TEASPOON: 7}),
+    (('сахар',), {'ml': 0.85, TABLESPOON: 25, TEASPOON: 8, PIECE: 5}),
+    (('варенье', 'джем'), {TABLESPOON: 20, TEASPOON: 8}),
+    (('кетчуп', 'соус'), {TABLESPOON: 18, TEASPOON: 6}),
+    (('творог',), {TABLESPOON: 25}),
+    (('рис', 'гречка', 'каша', 'овсянка', 'макароны', 'спагетти', 'лапша', 'пшено', 'манка', 'перловка', 'плов'),
+     {'ml': 0.8, PORTION: 200}),
+    (('рис сырой', 'гречка сухая', 'овсянка сухая', 'пшено сухое', 'манка сухая', 'перловка сухая'),
+     {'ml': 0.85, TABLESPOON: 15}),
+    (('изюм', 'курага', 'чернослив'), {TABLESPOON: 15}),
+    (('вода', 'чай', 'кофе', 'минералка', 'минеральная вода', 'энергетик'), {'ml': 1.0, PORTION: 250}),
+)
+FOOD_UNITS: Dict[str, Dict[str, float]] = {
+    name: units for names, units in _FOOD_UNIT_DATA for name in names
+}
+
+# Значение без единицы меньше этого считается числом штук ("2 яйца"),
+# если у продукта известен вес штуки; иначе это граммы ("Яблоко 150")
+MAX_BARE_COUNT = 10
+
+_NUMBER = re.compile(r'^\d+(?:\.\d+)?$|^\d+/\d+$')
+_SPOON_ABBREVIATIONS = (
+    (re.compile(r'\bст\.?\s*л\b\.?'), ' стл '),
+    (re.compile(r'\bч\.?\s*л\b\.?'), ' чл '),
+)
+_DECIMAL_COMMA = re.compile(r'(\d),(\d)')
+_NUMBER_UNIT_GLUE = re.compile(r'(\d)([a-zа-я])')
+# Число со знаком % ("творог 5%") - часть названия продукта, а не количество
+_TOKEN = re.compile(r'\d+(?:\.\d+)?%|\d+(?:\.\d+)?(?:/\d+)?|[a-zа-я]+(?:-[a-zа-я]+)*')
+
+
+class Portion(NamedTuple):
+    """Результат разбора: продукт, вес и уверенность от 0 до 1"""
+    food_name: str
+    canonical_food: str
+    grams: float
+    confidence: float
+    unit: str
+
+
+def _parse_number(token: str) -> Optional[float]:
+    if token in NUMERALS:
+        return float(NUMERALS[token])
+    if _NUMBER.match(token):
+        if '/' in token:
+            numerator, denominator = token.split('/')
+            return float(numerator) / float(denominator) if float(denominator) else None
+        return float(token)
+    return None
+
+
+def _tokenize(text: str) -> List[str]:
+    text = fold_text(text)
+    for pattern, replacement in _SPOON_ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+    text = _NUMBER_UNIT_GLUE.sub(r'\1 \2', _DECIMAL_COMMA.sub(r'\1.\2', text))
+    return _TOKEN.findall(text)
+
+
+def _amount_index(tokens: List[str]) -> Optional[int]:
+    """
+    Позиция количества: число перед единицей ("200 г"), иначе последнее
+    число в тексте ("молоко 3.2% 200", "творог 5 200")
+    """
+    numbers = [index for index, token in enumerate(tokens) if _parse_number(token) is not None]
+    for index in numbers:
+        following = tokens[index + 1] if index + 1 < len(tokens) else ''
+        if following in UNITS or following in _SPOON_KINDS:
+            return index
+    return numbers[-1] if numbers else None
+
+
+def _split_quantity(tokens: List[str]) -> Tuple[Optional[float], Optional[str], List[str]]:
+    """(количество, единица, слова продукта); остальные числа - часть названия"""
+    amount_index = _amount_index(tokens)
+    amount, unit, food_words = None, None, []
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if unit is None:
+            # "полстакана", "пол-ложки"
+            if token.startswith('пол') and token[3:].lstrip('-') in UNITS:
+                amount = (amount or 1.0) * 0.5
+                unit = UNITS[token[3:].lstrip('-')]
+                index += 1
+                continue
+            if index == amount_index:
+                amount = _parse_number(token)
+                index += 1
+                continue
+            if token in _SPOON_KINDS:
+                unit = _SPOON_KINDS[token]
+                if index + 1 < len(tokens) and UNITS.get(tokens[index + 1]) == TABLESPOON:
+                    index += 1
+                index += 1
+                continue
+            if token in UNITS:
+                unit = UNITS[token]
+                index += 1
+                continue
+        food_words.append(token)
+        index += 1
+    return amount, unit, food_words
+
+
+def _unit_grams(unit: str, units: Dict[str, float]) -> Tuple[float, bool]:
+    """(вес единицы в граммах, известен ли он для этого продукта)"""
+    if unit in (GRAMS, KILOGRAMS):
+        return DEFAULT_UNIT_GRAMS[unit], True
+    if unit in units:
+        return units[unit], True
+    if unit in UNIT_MILLILITERS:
+        density = units.get('ml')
+        return UNIT_MILLILITERS[unit] * (density or 1.0), density is not None
+    return DEFAULT_UNIT_GRAMS[unit], False
+
+
+def parse_portion(text: str) -> Optional[Portion]:
+    """
+    Разбирает "продукт + количество" в любом порядке. Возвращает None,
+    если в тексте нет названия продукта или вес определить нельзя.
+    """
+    if not text:
+        return None
+    amount, unit, food_words = _split_quantity(_tokenize(text))
+    food_name = ' '.join(food_words)
+    if not food_name or (amount is not None and amount <= 0):
+        return None
+
+    reference = reference_nutrition.get(food_name)
+    canonical_food = reference.name if reference else food_name
+    match_confidence = 1.0
+    if reference is None:
+        # Вхождение ("сахар" в "чай с сахаром") подсказывает только вес единицы,
+        # название продукта остаётся пользовательским
+        reference = reference_nutrition.match(food_name)
+        match_confidence = 0.85 if reference else 0.7
+    units = FOOD_UNITS.get(reference.name, {}) if reference else {}
+
+    if unit is None:
+        if amount is None:
+            # Просто "банан": одна штука, если её вес известен
+            if PIECE not in units:
+                return None
+            unit, amount, unit_confidence = PIECE, 1.0, 0.7
+        elif amount < MAX_BARE_COUNT and PIECE in units:
+            unit, unit_confidence = PIECE, 0.9
+        else:
+            unit, unit_confidence = GRAMS, 1.0
+    else:
+        amount = 1.0 if amount is None else amount
+        unit_confidence = 1.0
+
+    unit_grams, known = _unit_grams(unit, units)
+    if not known:
+        unit_confidence = min(unit_confidence, 0.6)
+    return Portion(
+        food_name=food_name,
+        canonical_food=canonical_food,
+        grams=round(amount * unit_grams, 1),
+        confidence=round(unit_confidence * match_confidence, 2),
+        unit=unit,
+    )
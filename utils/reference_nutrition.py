@@ -0,0 +1,264 @@
+"""
+Единый справочник пищевой ценности популярных продуктов (fallback для бота и API)
+"""
+from types import MappingProxyType
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from utils.food_normalizer import normalize_food_name, stem_boundaries
+from utils.keyword_matcher import KeywordMatcher
+
+NUTRIENT_FIELDS = ('calories', 'protein', 'fat', 'carbs', 'fiber', 'sugar', 'sodium')
+
+# Название; ккал, белки, жиры, углеводы, клетчатка, сахар (г) и натрий (мг) на 100г.
+# Рис, крупы и макароны без уточнения - в готовом виде (сваренные на воде), как их
+# обычно записывают в дневник; сухой продукт - отдельные записи "сырой"/"сухая".
+_REFERENCE_DATA = (
+    ('яблоко', 52, 0.3, 0.2, 14, 2.4, 10, 1),
+    ('банан', 89, 1.1, 0.3, 23, 2.6, 12, 1),
+    ('рис', 130, 2.7, 0.3, 28, 0.4, 0.1, 1),
+    ('рис сырой', 365, 7.1, 1, 78.9, 0, 0, 0),
+    ('курица', 165, 31, 3.6, 0, 0, 0, 74),
+    ('говядина', 250, 26, 15, 0, 0, 0, 0),
+    ('картофель', 77, 2, 0.1, 17.5, 2.2, 0.8, 6),
+    ('хлеб', 265, 9, 3.2, 49.8, 2.7, 5, 491),
+    ('молоко', 64, 3.2, 3.6, 4.8, 0, 5, 44),
+    ('яйцо', 157, 12.7, 11.5, 0.7, 0, 1.1, 124),
+    ('творог', 103, 18, 2, 3.3, 0, 0, 0),
+    ('гречка', 110, 4.2, 1.1, 21.3, 2.7, 0, 0),
+    ('гречка сухая', 343, 13.2, 3.4, 71.5, 10, 0, 0),
+    ('овсянка', 88, 3, 1.7, 15, 1.7, 0, 0),
+    ('овсянка сухая', 389, 16.9, 6.9, 66.3, 10.6, 0, 0),
+    ('картошка', 77, 2, 0.1, 17.5, 0, 0, 0),
+    ('макароны', 150, 5.3, 0.9, 30.6, 1.8, 0, 0),
+    ('макароны сухие', 371, 10.4, 1.1, 75, 3.2, 0, 0),
+    ('сыр', 363, 23.4, 30, 0, 0, 0, 0),
+    ('яйца', 157, 12.7, 11.5, 0.7, 0, 0, 0),
+    ('орехи', 654, 15.2, 65.2, 7, 0, 0, 0),
+    ('йогурт', 66, 5, 3.2, 4.1, 0, 0, 0),
+    ('мясо', 250, 26, 15, 0, 0, 0, 0),
+    ('рыба', 206, 22, 12, 0, 0, 0, 0),
+    ('борщ', 49, 1.1, 2.2, 6.7, 0, 0, 0),
+    ('щи', 32, 1.7, 1.8, 2.9, 0, 0, 0),
+    ('плов', 198, 4.2, 6, 32.7, 0, 0, 0),
+    ('пельмени', 248, 11.9, 12.4, 23.9, 0, 0, 0),
+    ('вареники', 221, 4.4, 3.9, 43.1, 0, 0, 0),
+    ('блины', 233, 6.1, 12.3, 26, 0, 0, 0),
+    ('омлет', 184, 9.6, 15.4, 2.1, 0, 0, 0),
+    ('котлеты', 221, 14.6, 11.2, 13.6, 0, 0, 0),
+    ('суп', 30, 1.5, 1.5, 3, 0, 0, 0),
+    ('салат', 15, 1.2, 0.2, 2.8, 0, 0, 0),
+    ('каша', 90, 3, 1, 17, 0, 0, 0),
+    ('бутерброд', 282, 12, 12, 30, 0, 0, 0),
+    ('пицца', 266, 11, 10.4, 33, 0, 0, 0),
+    ('гамбургер', 295, 17, 14, 24, 0, 0, 0),
+    ('чизбургер', 535, 25.2, 31, 40, 0, 0, 0),
+    ('бургер', 295, 17, 14, 24, 0, 0, 0),
+    ('сосиски', 266, 10.1, 23.9, 1.6, 0, 0, 0),
+    ('колбаса', 301, 12.2, 27.5, 1.5, 0, 0, 0),
+    ('шоколад', 534, 5.4, 31, 60.3, 0, 0, 0),
+    ('мороженое', 207, 3.7, 11, 24.4, 0, 0, 0),
+    ('торт', 344, 4.4, 15, 51, 0, 0, 0),
+    ('печенье', 417, 5.5, 13, 71, 0, 0, 0),
+    ('чипсы', 536, 6.5, 37, 46, 0, 0, 0),
+    ('попкорн', 375, 12.9, 5, 74, 0, 0, 0),
+    ('семечки', 578, 20.7, 52.9, 4, 0, 0, 0),
+    ('кефир', 59, 2.8, 3.2, 4.1, 0, 0, 0),
+    ('сметана', 206, 2.8, 20, 3.2, 0, 0, 0),
+    ('масло', 717, 0.8, 78, 1.3, 0, 0, 0),
+    ('сливочное масло', 717, 0.8, 78, 1.3, 0, 0, 0),
+    ('растительное масло', 899, 0, 99.9, 0, 0, 0, 0),
+    ('подсолнечное масло', 899, 0, 99.9, 0, 0, 0, 0),
+    ('оливковое масло', 898, 0, 99.8, 0, 0, 0, 0),
+    ('майонез', 621, 2.8, 67, 2.6, 0, 0, 0),
+    ('мед', 329, 0.8, 0, 81.5, 0, 0, 0),
+    ('сахар', 387, 0, 0, 99.8, 0, 0, 0),
+    ('варенье', 263, 0.4, 0.1, 68, 0, 0, 0),
+    ('джем', 263, 0.4, 0.1, 68, 0, 0, 0),
+    ('конфеты', 453, 2.2, 19.8, 69.3, 0, 0, 0),
+    ('вафли', 539, 3.4, 30.2, 65.1, 0, 0, 0),
+    ('пряники', 364, 4.8, 2.8, 77.7, 0, 0, 0),
+    ('крекеры', 352, 9, 3, 71, 0, 0, 0),
+    ('булочка', 339, 7.9, 9.4, 55.5, 0, 0, 0),
+    ('тост', 313, 11, 4, 59, 0, 0, 0),
+    ('сэндвич', 282, 12, 12, 30, 0, 0, 0),
+    ('роллы', 176, 7, 7, 20, 0, 0, 0),
+    ('суши', 176, 7, 7, 20, 0, 0, 0),
+    ('пирог', 344, 4.4, 15, 51, 0, 0, 0),
+    ('запеканка', 168, 17.6, 4.2, 14.2, 0, 0, 0),
+    ('сырники', 220, 18.6, 7, 18.4, 0, 0, 0),
+    ('тефтели', 217, 16, 10, 14, 0, 0, 0),
+    ('фрикадельки', 217, 16, 10, 14, 0, 0, 0),
+    ('жаркое', 142, 8.1, 6.3, 13, 0, 0, 0),
+    ('гуляш', 156, 14, 9.2, 2.6, 0, 0, 0),
+    ('рагу', 97, 5.5, 5, 8, 0, 0, 0),
+    ('яичница', 196, 12.9, 15, 0.9, 0, 0, 0),
+    ('спагетти', 150, 5.3, 0.9, 30.6, 1.8, 0, 0),
+    ('лапша', 150, 5.3, 0.9, 30.6, 1.8, 0, 0),
+    ('ветчина', 270, 22.6, 20.9, 0, 0, 0, 0),
+    ('бекон', 541, 23, 45, 1.4, 0, 0, 0),
+    ('креветки', 106, 20, 1.7, 0.9, 0, 0, 0),
+    ('икра', 263, 28, 17.9, 0, 0, 0, 0),
+    ('соус', 50, 1, 2, 8, 0, 0, 0),
+    ('кетчуп', 112, 1.8, 0.1, 27, 0, 0, 0),
+    ('горчица', 162, 10, 11, 5, 0, 0, 0),
+    ('уксус', 11, 0, 0, 3, 0, 0, 0),
+    ('специи', 251, 12, 7, 43, 0, 0, 0),
+    ('приправы', 251, 12, 7, 43, 0, 0, 0),
+    ('соль', 0, 0, 0, 0, 0, 0, 0),
+    ('мармелад', 321, 0, 0.1, 79.4, 0, 0, 0),
+    ('голубцы', 92, 6.7, 2.4, 10.9, 0, 0, 0),
+    ('манты', 223, 13.3, 11.5, 16, 0, 0, 0),
+    ('хинкали', 235, 11, 12, 22, 0, 0, 0),
+    ('лагман', 86, 3.4, 2.4, 13, 0, 0, 0),
+    ('шашлык', 324, 26, 23, 0, 0, 0, 0),
+    ('винегрет', 76, 1.6, 4.8, 6.7, 0, 0, 0),
+    ('оливье', 198, 5.5, 16.5, 7.8, 0, 0, 0),
+    ('солянка', 58, 3.4, 3.8, 2.1, 0, 0, 0),
+    ('харчо', 75, 6.2, 2.2, 7.3, 0, 0, 0),
+    ('окрошка', 60, 2.1, 3.1, 6.3, 0, 0, 0),
+    ('пшено', 119, 3.5, 1, 23.7, 1.3, 0, 0),
+    ('пшено сухое', 348, 11.5, 3.3, 69.3, 0, 0, 0),
+    ('манка', 80, 2.5, 0.2, 16.8, 0, 0, 0),
+    ('манка сухая', 328, 10.3, 1, 70.6, 0, 0, 0),
+    ('перловка', 123, 2.3, 0.4, 28.2, 3.8, 0, 0),
+    ('перловка сухая', 320, 9.3, 1.1, 66.9, 0, 0, 0),
+    ('баранина', 209, 24, 12, 0, 0, 0, 0),
+    # Индейка 2-й категории по таблицам Скурихина; 276 ккал там у жирной тушки 1-й категории
+    ('индейка', 197, 21.6, 12, 0, 0, 0, 0),
+    ('лосось', 142, 19.8, 6.3, 0, 0, 0, 0),
+    ('тунец', 296, 29.9, 10.9, 0, 0, 0, 0),
+    ('селедка', 246, 17.7, 19.5, 0, 0, 0, 0),
+    ('карп', 112, 16, 5.3, 0, 0, 0, 0),
+    ('крабы', 96, 18.1, 1.9, 0, 0, 0, 0),
+    ('морковь', 41, 0.9, 0.2, 9.6, 2.8, 4.7, 69),
+    ('капуста', 25, 1.8, 0.1, 4.7, 0, 0, 0),
+    ('лук', 40, 1.1, 0.1, 8.2, 0, 0, 0),
+    ('чеснок', 149, 6.5, 0.5, 30, 0, 0, 0),
+    ('помидор', 20, 0.6, 0.2, 4.2, 0, 0, 0),
+    ('огурец', 15, 0.8, 0.1, 2.5, 0, 0, 0),
+    ('перец', 27, 1.3, 0.1, 5.3, 0, 0, 0),
+    ('баклажан', 24, 1.2, 0.1, 4.5, 0, 0, 0),
+    ('кабачок', 24, 0.6, 0.3, 4.6, 0, 0, 0),
+    ('тыква', 22, 1, 0.1, 4.4, 0, 0, 0),
+    ('свекла', 40, 1.5, 0.1, 8.8, 0, 0, 0),
+    ('редис', 19, 1.2, 0.1, 3.4, 0, 0, 0),
+    ('груша', 57, 0.4, 0.3, 15.2, 0, 0, 0),
+    ('апельсин', 36, 0.9, 0.2, 8.1, 0, 0, 0),
+    ('лимон', 16, 0.9, 0.1, 3, 0, 0, 0),
+    ('виноград', 65, 0.6, 0.2, 16.8, 0, 0, 0),
+    ('клубника', 41, 0.8, 0.4, 7.7, 0, 0, 0),
+    ('малина', 46, 0.8, 0.5, 8.3, 0, 0, 0),
+    ('черника', 44, 1.1, 0.6, 7.6, 0, 0, 0),
+    ('вишня', 52, 0.8, 0.2, 11.3, 0, 0, 0),
+    ('слива', 42, 0.8, 0.3, 9.6, 0, 0, 0),
+    ('персик', 46, 0.9, 0.3, 11.1, 0, 0, 0),
+    ('абрикос', 44, 0.9, 0.1, 10.8, 0, 0, 0),
+    ('киви', 47, 0.8, 0.4, 10.3, 0, 0, 0),
+    ('ананас', 52, 0.4, 0.1, 13.4, 0, 0, 0),
+    ('манго', 67, 0.5, 0.2, 17, 0, 0, 0),
+    ('авокадо', 208, 2, 19.5, 6, 0, 0, 0),
+    ('гранат', 72, 0.7, 0.6, 18.7, 0, 0, 0),
+    ('арбуз', 25, 0.7, 0.1, 5.8, 0, 0, 0),
+    ('дыня', 33, 0.6, 0.3, 7.4, 0, 0, 0),
+    ('хурма', 67, 0.5, 0.4, 15.3, 0, 0, 0),
+    ('финики', 274, 1.8, 0.1, 69.2, 0, 0, 0),
+    ('изюм', 264, 2.9, 0.6, 66, 0, 0, 0),
+    ('курага', 215, 5.2, 0.3, 51, 0, 0, 0),
+    ('чернослив', 231, 2.2, 0.7, 57.5, 0, 0, 0),
+    ('грецкие орехи', 654, 15.2, 65.2, 7, 0, 0, 0),
+    ('миндаль', 645, 18.6, 57.7, 13.6, 0, 0, 0),
+    ('фундук', 704, 16.1, 66.9, 9.4, 0, 0, 0),
+    ('кешью', 600, 25.7, 54.1, 13.2, 0, 0, 0),
+    ('арахис', 622, 26.3, 45.2, 9.9, 0, 0, 0),
+    ('фисташки', 556, 20, 50, 7, 0, 0, 0),
+    ('кедровые орехи', 673, 11.6, 61, 19.3, 0, 0, 0),
+    ('бразильский орех', 659, 14.3, 67.1, 4.8, 0, 0, 0),
+    ('пекан', 691, 9.2, 72, 4.3, 0, 0, 0),
+    ('макадамия', 718, 7.9, 75.8, 5.2, 0, 0, 0),
+    ('энергетик', 45, 0, 0, 11, 0, 0, 0),
+    ('энергетический напиток', 45, 0, 0, 11, 0, 0, 0),
+    ('редбулл', 45, 0, 0, 11, 0, 0, 0),
+    ('red bull', 45, 0, 0, 11, 0, 0, 0),
+    ('вольт', 48, 0, 0, 12, 0, 0, 0),
+    ('volt', 48, 0, 0, 12, 0, 0, 0),
+    ('монстр', 47, 0, 0, 11.5, 0, 0, 0),
+    ('monster', 47, 0, 0, 11.5, 0, 0, 0),
+    ('адреналин раш', 52, 0, 0, 13, 0, 0, 0),
+    ('adrenaline rush', 52, 0, 0, 13, 0, 0, 0),
+    ('burn', 49, 0, 0, 12.2, 0, 0, 0),
+    ('flash', 46, 0, 0, 11.5, 0, 0, 0),
+    ('огурцы', 16, 0.7, 0.1, 3.6, 0.5, 1.7, 2),
+    ('вода', 0, 0, 0, 0, 0, 0, 0),
+    ('чай', 1, 0, 0, 0.2, 0, 0, 0),
+    ('кофе', 2, 0.3, 0, 0, 0, 0, 0),
+    ('шаурма', 250, 15, 12, 25, 0, 0, 0),
+    ('минералка', 0, 0, 0, 0, 0, 0, 0),
+    ('минеральная вода', 0, 0, 0, 0, 0, 0, 0),
+    ('растворимый кофе', 2, 0.02, 0, 0, 0, 0, 0),
+)
+
+
+class ReferenceFood(NamedTuple):
+    """Продукт справочника; значения пересчитаны на 1г"""
+    name: str
+    calories: float
+    protein: float
+    fat: float
+    carbs: float
+    fiber: float
+    sugar: float
+    sodium: float
+
+    def scale(self, weight_grams: float) -> Dict:
+        """Значения на заданный вес, округлённые до 0.1"""
+        return {field: round(getattr(self, field) * weight_grams, 1) for field in NUTRIENT_FIELDS}
+
+    def per_100g(self) -> Dict:
+        return self.scale(100)
+
+
+class ReferenceNutrition:
+    """
+    Неизменяемый справочник: кортеж ReferenceFood, индекс по нормализованному
+    названию и матчеры для поиска продукта внутри произвольного текста.
+    Строится один раз при импорте модуля.
+    """
+
+    __slots__ = ('foods', '_by_key', '_matcher', '_stem_matcher')
+
+    def __init__(self, rows):
+        foods = tuple(
+            ReferenceFood(name, *(value / 100 for value in values))
+            for name, *values in rows
+        )
+        by_key: Dict[str, ReferenceFood] = {}
+        for food in foods:
+            # При совпадении нормализованных названий побеждает первая запись
+            by_key.setdefault(normalize_food_name(food.name), food)
+
+        self.foods: Tuple[ReferenceFood, ...] = foods
+        self._by_key = MappingProxyType(by_key)
+        self._matcher = KeywordMatcher({food.name: food for food in foods})
+        self._stem_matcher = KeywordMatcher({stem_boundaries(food.name): food for food in reversed(foods)})
+
+    def __len__(self) -> int:
+        return len(self.foods)
+
+    def get(self, food_name: str) -> Optional[ReferenceFood]:
+        """Точное совпадение с точностью до формы слов, порядка и регистра"""
+        return self._by_key.get(normalize_food_name(food_name))
+
+    def match(self, food_name: str) -> Optional[ReferenceFood]:
+        """
+        Точное совпадение, а если его нет - самый специфичный продукт
+        справочника, упомянутый в названии (в любой форме слова)
+        """
+        return (
+            self.get(food_name)
+            or self._matcher.get(food_name)
+            or self._stem_matcher.get(stem_boundaries(food_name))
+        )
+
+
+# Глобальный экземпляр
+reference_nutrition = ReferenceNutrition(_REFERENCE_DATA)
@@ -0,0 +1,57 @@
+"""
+Объединение одновременных одинаковых асинхронных вызовов (single-flight)
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Пока по ключу выполняется вызов, остальные запросы с тем же ключом
+    не запускают свой, а ждут результат первого.
+
+    - Результат и исключение первого вызова получают все ожидающие.
+    - timeout ограничивает сам вызов (задаётся первым запросом по ключу);
+      по истечении все ожидающие получают asyncio.TimeoutError.
+    - Отмена одного ожидающего не отменяет общий вызов для остальных.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._tasks = set()
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def in_flight(self) -> int:
+        """Количество ключей, по которым сейчас идёт вызов"""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._calls[key] = future
+            self.stats['calls'] += 1
+            task = asyncio.create_task(self._run(key, func, future, timeout))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.stats['coalesced'] += 1
+        return await asyncio.shield(future)
+
+    async def _run(self, key: Hashable, func: Callable[[], Awaitable[T]], future: asyncio.Future, timeout: Optional[float]) -> None:
+        try:
+            result = await asyncio.wait_for(func(), timeout)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Помечаем исключение как полученное, даже если все ожидающие отменились
+            future.exception()
+        else:
+            future.set_result(result)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]